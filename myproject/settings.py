@@ -41,8 +41,10 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'students.instrumentation.InstrumentationMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
+    'students.replicas.ReplicaPinMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
@@ -81,9 +83,31 @@ DATABASES = {
         'PASSWORD': 'password', # <--- PUT YOUR MYSQL PASSWORD HERE
         'HOST': 'localhost',   # Or 'localhost' or your remote host
         'PORT': '3306',
-    }
+        # Keep connections open across requests (Django has no MySQL pool),
+        # and check them before reuse. Under ASGI set CONN_MAX_AGE to 0 and
+        # pool in front of MySQL (e.g. ProxySQL) instead.
+        'CONN_MAX_AGE': 60,
+        'CONN_HEALTH_CHECKS': True,
+    },
+    # A read replica of 'default', listed in STUDENT_READ_REPLICAS below.
+    # Locally a second SQLite file copied from the primary, or a second
+    # MySQL instance, can stand in for it. MIRROR makes tests use the
+    # primary's test database for it.
+    # 'replica': {
+    #     'ENGINE': 'django.db.backends.mysql',
+    #     'NAME': 'student_db',
+    #     'USER': 'example_user',
+    #     'PASSWORD': 'password',
+    #     'HOST': 'replica.localhost',
+    #     'PORT': '3306',
+    #     'CONN_MAX_AGE': 60,
+    #     'CONN_HEALTH_CHECKS': True,
+    #     'TEST': {'MIRROR': 'default'},
+    # },
 }
 
+DATABASE_ROUTERS = ['students.replicas.ReplicaRouter']
+
 
 # Password validation
 # https://docs.djangoproject.com/en/6.0/ref/settings/#auth-password-validators
@@ -146,4 +170,77 @@ LOGOUT_REDIRECT_URL = 'login'
 LOGIN_URL = 'login'
 
 # Default primary key field type
-DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
\ No newline at end of file
+DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
+
+# Dashboard statistics are cached and kept up to date incrementally;
+# this is how often (in seconds) they are fully recomputed to correct drift.
+STUDENT_STATS_REFRESH_INTERVAL = 300
+
+# Student search backend: 'fulltext' (MySQL FULLTEXT index), 'tokens'
+# (app-maintained prefix index table), 'basic' (icontains) or 'auto'.
+STUDENT_SEARCH_BACKEND = 'auto'
+
+# Bulk email queue: messages per SMTP connection, maximum messages per
+# second (0 = unlimited), and whether web processes deliver them in a
+# background thread (disable when running `manage.py process_email_queue`).
+STUDENT_EMAIL_BATCH_SIZE = 50
+STUDENT_EMAIL_RATE_LIMIT = 10
+STUDENT_EMAIL_WORKER_THREAD = True
+
+# Generate profile picture thumbnails in a background thread after upload
+# (set to False to render them synchronously after the save commits).
+STUDENT_THUMBNAILS_ASYNC = True
+
+# Per-request SQL/timing instrumentation (see students/instrumentation.py):
+# off by default; keeps the last STUDENT_METRICS_BUFFER_SIZE requests per
+# process for /metrics/ and `manage.py request_metrics`.
+STUDENT_METRICS_ENABLED = False
+STUDENT_METRICS_BUFFER_SIZE = 1000
+
+# Rendered fragments (dashboard stats, detail and print pages) are cached in
+# this cache, keyed by student/table versions. The default local-memory
+# cache is per process; point CACHES at a file-based or shared backend,
+# e.g. 'django.core.cache.backends.filebased.FileBasedCache', to share them.
+STUDENT_CACHE_ALIAS = 'default'
+STUDENT_FRAGMENT_CACHE_TIMEOUT = 3600
+
+# Serve the student list, detail, chart data and CSV exports from their
+# native async views (students/async_views.py). Turn on when running under
+# ASGI (myproject.asgi); under WSGI the sync views are cheaper.
+STUDENT_ASYNC_VIEWS = False
+
+# Background import/export jobs (students/jobs.py) are run by
+# `manage.py process_jobs --loop` with this many worker processes; run it
+# alongside the web server. STUDENT_JOB_WORKER_THREAD runs queued jobs in a
+# background thread of the web process instead (convenient in development).
+STUDENT_JOB_WORKERS = 2
+STUDENT_JOB_WORKER_THREAD = False
+
+# Change log entries younger than this many seconds are held back from the
+# incremental export until concurrent transactions have committed
+STUDENT_CHANGES_SETTLE_SECONDS = 5
+
+# Read replicas (students/replicas.py): DATABASES aliases the list, detail,
+# chart, print and export views read from; sessions that just wrote read
+# from the primary for STUDENT_REPLICA_PIN_SECONDS, and a replica that fails
+# to connect is skipped for STUDENT_REPLICA_RETRY_SECONDS.
+STUDENT_READ_REPLICAS = []
+STUDENT_REPLICA_PIN_SECONDS = 10
+STUDENT_REPLICA_RETRY_SECONDS = 30
+
+# Enrollment/age rollups (students/rollups.py): web processes refresh them in
+# a background thread every STUDENT_ROLLUP_REFRESH_INTERVAL seconds; disable
+# it when running `manage.py refresh_rollups --loop` instead.
+STUDENT_ROLLUP_THREAD = True
+STUDENT_ROLLUP_REFRESH_INTERVAL = 60
+
+# Columnar in-memory snapshot of the reporting columns (students/snapshot.py),
+# used for print rows and filtered counts. Needs NumPy; each process holds
+# one copy and rebuilds it after students change.
+STUDENT_SNAPSHOT_ENABLED = False
+
+# Deleted students are hidden at once and permanently removed by
+# `manage.py purge_students` once deleted this many days ago; the purge
+# sleeps at least STUDENT_PURGE_PAUSE seconds between chunks.
+STUDENT_PURGE_AFTER_DAYS = 30
+STUDENT_PURGE_PAUSE = 0.1
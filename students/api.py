@@ -0,0 +1,442 @@
+"""
+Versioned JSON API over Student (mounted at /api/v1/).
+
+Lists reuse the dashboard filters and keyset pagination, ``?fields=``
+limits both the columns selected from the database and the keys in the
+response, and GETs answer If-None-Match with 304 Not Modified.
+/changes/ is the incremental feed over the change log (see changes.py),
+as JSON or CSV.
+
+Requests authenticate either with the browser session or, for scripts,
+with an ``Authorization: Token <key>`` header (keys come from
+``manage.py create_api_token``). Session requests that write must pass
+Django's CSRF check: send the ``csrftoken`` cookie's value back in an
+``X-CSRFToken`` header. Token requests carry no cookies and skip it.
+"""
+import hashlib
+import json
+import secrets
+from datetime import timedelta
+
+from django.db import transaction
+from django.forms.models import model_to_dict
+from django.http import HttpResponse, JsonResponse
+from django.middleware.csrf import CsrfViewMiddleware
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+from django.utils.cache import get_conditional_response, patch_vary_headers
+from django.views.decorators.csrf import csrf_exempt
+from django.views.decorators.http import require_http_methods
+
+from .caching import bump_versions_on_commit
+from .changes import CHANGES_MAX_PAGE_SIZE, CHANGES_PAGE_SIZE, change_page, cursor_before, record_changes, with_students
+from .deletion import soft_delete_students
+from .exporters import EXPORT_COLUMNS, iter_csv
+from .filters import filter_students
+from .forms import StudentForm
+from .models import APIToken, Student, StudentChange
+from .pagination import DEFAULT_PER_PAGE, DEFAULT_SORT, clean_per_page, clean_sort, keyset_page
+from .replicas import read_replica
+from .snapshot import filtered_count
+from .search import index_students, uses_token_index
+from .stats import get_stats, record_changed, record_created, stats_batch
+from .validation import REQUIRED_FIELDS, REQUIRED_MESSAGE, error, validate_students
+
+API_FIELDS = [
+    'id', 'first_name', 'last_name', 'email', 'phone', 'address', 'gpa', 'date_of_birth',
+    'enrollment_date', 'profile_picture', 'performance_level', 'created_at', 'updated_at',
+]
+WRITABLE_FIELDS = ['first_name', 'last_name', 'email', 'phone', 'address', 'gpa', 'date_of_birth', 'enrollment_date']
+MAX_BULK_ITEMS = 1000
+TOKEN_PREFIX = 'Token '
+TOKEN_TOUCH_INTERVAL = timedelta(minutes=1)
+CHANGE_CSV_COLUMNS = [('change_id', 'Change ID'), ('action', 'Action'), ('changed_at', 'Changed At')] + EXPORT_COLUMNS
+
+
+class APIError(Exception):
+    def __init__(self, message, status=400, errors=None):
+        super().__init__(message)
+        self.message = message
+        self.status = status
+        self.errors = errors
+
+
+class CSRFCheck(CsrfViewMiddleware):
+    def _reject(self, request, reason):
+        return reason
+
+
+def csrf_failure(request):
+    # The reason a session request fails the CSRF check, or None.
+    check = CSRFCheck(lambda request: None)
+    check.process_request(request)
+    return check.process_view(request, None, (), {})
+
+
+def token_hash(key):
+    return hashlib.sha256(key.encode('utf-8')).hexdigest()
+
+
+def create_api_token(user, name=''):
+    # Returns (token, key); only the hash of the key is kept.
+    key = secrets.token_urlsafe(32)
+    return APIToken.objects.create(user=user, name=name, key_hash=token_hash(key)), key
+
+
+def token_user(key):
+    # The active user holding the key, or None.
+    token = APIToken.objects.select_related('user').filter(key_hash=token_hash(key)).first()
+    if token is None or not token.user.is_active:
+        return None
+    now = timezone.now()
+    if token.last_used_at is None or now - token.last_used_at > TOKEN_TOUCH_INTERVAL:
+        APIToken.objects.filter(id=token.id).update(last_used_at=now)
+    return token.user
+
+
+def api_view(methods):
+    # JSON view authenticated by an API token or the session: 401 instead of
+    # a login redirect, and APIError turned into a JSON error body. CSRF is
+    # checked here, for session requests only.
+    def decorator(view):
+        @csrf_exempt
+        @require_http_methods(methods)
+        def wrapper(request, *args, **kwargs):
+            header = request.headers.get('Authorization', '')
+            if header.startswith(TOKEN_PREFIX):
+                user = token_user(header[len(TOKEN_PREFIX):].strip())
+                if user is None:
+                    return JsonResponse({'error': 'Invalid API token.'}, status=401)
+                request.user = user
+            elif not request.user.is_authenticated:
+                return JsonResponse({'error': 'Authentication required.'}, status=401)
+            else:
+                reason = csrf_failure(request)
+                if reason:
+                    return JsonResponse({'error': f'CSRF check failed: {reason}'}, status=403)
+            try:
+                return view(request, *args, **kwargs)
+            except APIError as e:
+                body = {'error': e.message}
+                if e.errors is not None:
+                    body['errors'] = e.errors
+                return JsonResponse(body, status=e.status)
+        wrapper.__name__ = view.__name__
+        wrapper.__doc__ = view.__doc__
+        return wrapper
+    return decorator
+
+
+def parse_fields(request):
+    requested = request.GET.get('fields')
+    if not requested:
+        return API_FIELDS
+    fields = [f.strip() for f in requested.split(',') if f.strip()]
+    unknown = [f for f in fields if f not in API_FIELDS]
+    if unknown:
+        raise APIError(f'Unknown field(s): {", ".join(unknown)}')
+    return fields
+
+
+def db_fields(fields, *extra):
+    # Model columns needed to render `fields` (performance_level is derived from gpa).
+    columns = {'id', *extra}
+    for name in fields:
+        columns.add('gpa' if name == 'performance_level' else name)
+    return sorted(columns)
+
+
+def serialize(student, fields):
+    data = {}
+    for name in fields:
+        if name == 'performance_level':
+            # Label from gpa; the generated column is stale right after a save.
+            value = student.performance_label
+        else:
+            value = getattr(student, name)
+        if name == 'profile_picture':
+            value = value.url if value else None
+        data[name] = value
+    return data
+
+
+def parse_json(request):
+    try:
+        return json.loads(request.body or b'null')
+    except ValueError:
+        raise APIError('Request body must be valid JSON.')
+
+
+def json_response(request, data, status=200):
+    # Strong ETag over the body; clients that already hold it get a 304.
+    response = JsonResponse(data, status=status)
+    if request.method == 'GET':
+        etag = '"%s"' % hashlib.md5(response.content).hexdigest()
+        response['ETag'] = etag
+        patch_vary_headers(response, ['Cookie', 'Authorization'])
+        not_modified = get_conditional_response(request, etag=etag, response=response)
+        if not_modified is not response:
+            return not_modified
+    return response
+
+
+def payload_record(payload, instance=None):
+    # The record a payload describes (the student's current values with the
+    # payload applied), or the errors for fields that cannot be written.
+    if not isinstance(payload, dict):
+        raise APIError('Each student must be a JSON object.')
+    unknown = sorted(set(payload) - set(WRITABLE_FIELDS) - {'id'})
+    if unknown:
+        return None, {name: [{'message': 'Unknown or read-only field.', 'code': 'unknown'}] for name in unknown}
+    record = {}
+    if instance is not None:
+        record = model_to_dict(instance, fields=WRITABLE_FIELDS)
+    for name, value in payload.items():
+        if value is None and name != 'id' and Student._meta.get_field(name).has_default():
+            # Null means "use the default" for fields such as enrollment_date.
+            record.pop(name, None)
+            continue
+        record[name] = '' if value is None else value
+    return record, None
+
+
+def validate(payload, instance=None):
+    record, errors = payload_record(payload, instance)
+    if errors:
+        return None, errors
+    form = StudentForm(data=record, instance=instance)
+    if not form.is_valid():
+        return None, form.errors.get_json_data()
+    return form, None
+
+
+def validate_batch(payload, instances, errors):
+    # Cleaned data by index for every item not already in `errors`; the
+    # others are added to it. The emails of the whole batch are checked
+    # in one query.
+    records = {}
+    for index, item in enumerate(payload):
+        if index in errors:
+            continue
+        record, item_errors = payload_record(item, instances[index])
+        if item_errors:
+            errors[index] = item_errors
+        else:
+            records[index] = record
+    results = validate_students(list(records.values()), [instances[index] for index in records])
+    cleaned = {}
+    for index, (data, item_errors) in zip(records, results):
+        if item_errors:
+            errors[index] = item_errors
+        else:
+            cleaned[index] = data
+    return cleaned
+
+
+@api_view(['GET', 'POST'])
+@read_replica()
+def student_collection(request):
+    if request.method == 'POST':
+        form, errors = validate(parse_json(request))
+        if errors:
+            raise APIError('Invalid student.', errors=errors)
+        student = form.save()
+        return json_response(request, serialize(student, API_FIELDS), status=201)
+
+    fields = parse_fields(request)
+    query = request.GET.get('q', '')
+    min_gpa = request.GET.get('min_gpa', '')
+    max_gpa = request.GET.get('max_gpa', '')
+    performance = request.GET.get('performance', '')
+    sort_by = clean_sort(request.GET.get('sort', DEFAULT_SORT))
+    per_page = clean_per_page(request.GET.get('per_page', DEFAULT_PER_PAGE))
+
+    try:
+        students = filter_students(Student.objects.all(), query, min_gpa, max_gpa, performance)
+    except ValueError:
+        raise APIError('min_gpa and max_gpa must be numbers.')
+    page = keyset_page(students.only(*db_fields(fields, sort_by.lstrip('-'))), sort_by, per_page, request.GET.get('cursor'))
+    filtered = any([query, min_gpa, max_gpa, performance])
+    return json_response(request, {
+        'count': filtered_count(students, query, min_gpa, max_gpa, performance) if filtered else get_stats()['total'],
+        'next': page.next_cursor,
+        'previous': page.previous_cursor,
+        'results': [serialize(student, fields) for student in page],
+    })
+
+
+@api_view(['GET', 'PUT', 'PATCH', 'DELETE'])
+@read_replica()
+def student_resource(request, id):
+    if request.method == 'GET':
+        # Answer conditional GETs from (id, updated_at) without loading the row.
+        fields = parse_fields(request)
+        stamp = Student.objects.filter(id=id).values_list('updated_at', flat=True).first()
+        if stamp is None:
+            raise APIError('Student not found.', status=404)
+        etag = '"%s"' % hashlib.md5(f'{id}:{stamp.isoformat()}:{",".join(fields)}'.encode('utf-8')).hexdigest()
+        not_modified = get_conditional_response(request, etag=etag)
+        if not_modified is not None:
+            return not_modified
+        student = Student.objects.only(*db_fields(fields)).get(id=id)
+        response = JsonResponse(serialize(student, fields))
+        response['ETag'] = etag
+        patch_vary_headers(response, ['Cookie', 'Authorization'])
+        return response
+
+    student = Student.objects.filter(id=id).first()
+    if student is None:
+        raise APIError('Student not found.', status=404)
+    if request.method == 'DELETE':
+        soft_delete_students(Student.objects.filter(id=student.id))
+        return HttpResponse(status=204)
+
+    payload = parse_json(request)
+    if request.method == 'PUT' and isinstance(payload, dict):
+        missing = [name for name in REQUIRED_FIELDS if name not in payload]
+        if missing:
+            raise APIError('PUT requires a complete student.', errors={name: [error(REQUIRED_MESSAGE, 'required')] for name in missing})
+    form, errors = validate(payload, instance=student)
+    if errors:
+        raise APIError('Invalid student.', errors=errors)
+    student = form.save()
+    return json_response(request, serialize(student, API_FIELDS))
+
+
+@api_view(['POST', 'PATCH', 'DELETE'])
+def student_bulk(request):
+    payload = parse_json(request)
+    if not isinstance(payload, list) or not payload:
+        raise APIError('Request body must be a non-empty JSON array.')
+    if len(payload) > MAX_BULK_ITEMS:
+        raise APIError(f'At most {MAX_BULK_ITEMS} items per request.', status=413)
+
+    if request.method == 'DELETE':
+        try:
+            ids = [int(item) for item in payload]
+        except (TypeError, ValueError):
+            raise APIError('DELETE expects an array of student ids.')
+        return JsonResponse({'deleted': soft_delete_students(Student.objects.filter(id__in=ids))})
+
+    if request.method == 'POST':
+        return bulk_create_students(payload)
+    return bulk_update_students(payload)
+
+
+def bulk_create_students(payload):
+    errors = {}
+    cleaned = validate_batch(payload, [None] * len(payload), errors)
+    if errors:
+        raise APIError('Invalid students; nothing was created.', errors=dict(sorted(errors.items())))
+    students = [Student(**data) for data in cleaned.values()]
+
+    with transaction.atomic(), stats_batch():
+        Student.objects.bulk_create(students)
+        for student in students:
+            record_created(student.gpa)
+        created = list(Student.objects.filter(email__in=[s.email for s in students]).order_by('id'))
+        record_changes(StudentChange.CREATE, [s.id for s in created])
+        if uses_token_index():
+            index_students(created)
+        bump_versions_on_commit()
+    return JsonResponse({'results': [serialize(s, API_FIELDS) for s in created]}, status=201)
+
+
+def bulk_update_students(payload):
+    ids = []
+    for item in payload:
+        if not isinstance(item, dict) or not isinstance(item.get('id'), int):
+            raise APIError('PATCH expects an array of objects with an integer "id".')
+        ids.append(item['id'])
+    existing = Student.objects.in_bulk(ids)
+    instances = [existing.get(student_id) for student_id in ids]
+
+    errors = {
+        index: {'id': [{'message': 'Student not found.', 'code': 'not_found'}]}
+        for index, student in enumerate(instances) if student is None
+    }
+    cleaned = validate_batch(payload, instances, errors)
+    if errors:
+        raise APIError('Invalid students; nothing was updated.', errors=dict(sorted(errors.items())))
+
+    students, changed_fields, gpa_changes = [], set(), []
+    for index, data in cleaned.items():
+        student = instances[index]
+        gpa_changes.append((student.gpa, data['gpa']))
+        for name, value in data.items():
+            setattr(student, name, value)
+        students.append(student)
+        changed_fields.update(name for name in payload[index] if name != 'id')
+
+    now = timezone.now()
+    for student in students:
+        student.updated_at = now
+    with transaction.atomic(), stats_batch():
+        if changed_fields:
+            Student.objects.bulk_update(students, sorted(changed_fields) + ['updated_at'])
+            record_changes(StudentChange.UPDATE, [s.id for s in students])
+        for old_gpa, new_gpa in gpa_changes:
+            record_changed(old_gpa, new_gpa)
+        if uses_token_index() and changed_fields & {'first_name', 'last_name', 'email'}:
+            index_students(students)
+        bump_versions_on_commit(s.id for s in students)
+    return JsonResponse({'results': [serialize(s, API_FIELDS) for s in students]})
+
+
+@api_view(['GET'])
+@read_replica()
+def student_changes(request):
+    # ?after=<cursor> resumes from the next_cursor of the previous page;
+    # ?since=<ISO timestamp> starts at the time a full export was taken.
+    after = request.GET.get('after')
+    since = request.GET.get('since')
+    if after is not None:
+        try:
+            cursor = int(after)
+        except ValueError:
+            raise APIError('after must be an integer cursor.')
+    elif since:
+        moment = parse_datetime(since.replace(' ', '+'))
+        if moment is None:
+            raise APIError('since must be an ISO 8601 timestamp.')
+        if timezone.is_naive(moment):
+            moment = timezone.make_aware(moment)
+        cursor = cursor_before(moment)
+    else:
+        cursor = 0
+    try:
+        limit = min(max(int(request.GET.get('limit', CHANGES_PAGE_SIZE)), 1), CHANGES_MAX_PAGE_SIZE)
+    except ValueError:
+        raise APIError('limit must be an integer.')
+    entries, next_cursor, has_more = change_page(cursor, limit)
+
+    if request.GET.get('format') == 'csv':
+        names = [name for name, _ in EXPORT_COLUMNS]
+        rows = []
+        for entry, student in with_students(entries, Student.objects.only(*names)):
+            if student is None:
+                values = [entry.student_id] + [''] * (len(names) - 1)
+            else:
+                values = [getattr(student, name) for name in names]
+            rows.append([entry.id, entry.action, entry.changed_at.isoformat()] + values)
+        response = HttpResponse(b''.join(iter_csv(CHANGE_CSV_COLUMNS, rows)), content_type='text/csv')
+        response['Content-Disposition'] = 'attachment; filename="student_changes.csv"'
+        response['X-Next-Cursor'] = next_cursor
+        response['X-Has-More'] = 'true' if has_more else 'false'
+        return response
+
+    fields = parse_fields(request)
+    return json_response(request, {
+        'changes': [
+            {
+                'cursor': entry.id,
+                'action': entry.action,
+                'changed_at': entry.changed_at,
+                'student_id': entry.student_id,
+                'student': serialize(student, fields) if student is not None else None,
+            }
+            for entry, student in with_students(entries, Student.objects.only(*db_fields(fields)))
+        ],
+        'next_cursor': next_cursor,
+        'has_more': has_more,
+    })
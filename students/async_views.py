@@ -0,0 +1,109 @@
+"""
+Native async versions of the read-heavy student views.
+
+students/urls.py routes to these instead of their views.py counterparts
+when STUDENT_ASYNC_VIEWS is on, which is meant for ASGI deployments
+(myproject.asgi). They share the views.py helpers, fetch through the async
+ORM, and render only once everything a page needs has been loaded, so a
+slow query parks a coroutine instead of a worker thread. CSV exports
+stream from an async iterator when served over ASGI.
+
+Independent lookups (the list page rows and the dashboard stats) are
+awaited together. Django still runs each request's queries one at a time
+on that request's database thread, so this overlaps them only as far as
+the ORM allows; the throughput gain comes from many requests sharing one
+event loop (compare with ``benchmark_routes --driver client --driver asgi``).
+"""
+import asyncio
+
+from asgiref.sync import sync_to_async
+from django.contrib import messages
+from django.contrib.auth.decorators import login_required
+from django.core.handlers.asgi import ASGIRequest
+from django.http import JsonResponse
+from django.shortcuts import aget_object_or_404, redirect, render
+
+from .exporters import BULK_EXPORT_COLUMNS, EXPORT_COLUMNS, stream_students_csv
+from .models import Student
+from .pagination import aget_page, keyset_page
+from .replicas import read_replica
+from .snapshot import filtered_count, snapshot_enabled
+from .stats import get_stats
+from .views import chart_payload, is_filtered, list_context, list_params, list_queryset
+
+aget_stats = sync_to_async(get_stats)
+
+
+async def arender(request, template_name, context):
+    # login_required loaded the user through request.auser(); hand that to
+    # the template instead of letting request.user query it a second time.
+    request.user = await request.auser()
+    return await sync_to_async(render)(request, template_name, context)
+
+
+# READ with sorting, filtering, and pagination
+@login_required
+@read_replica()
+async def student_list(request):
+    params = list_params(request)
+    students = list_queryset(params)
+
+    filters = [params['query'], params['min_gpa'], params['max_gpa'], params['performance']]
+    if params['keyset']:
+        page = sync_to_async(keyset_page)(students, params['sort_by'], params['per_page'], params['cursor'])
+    else:
+        count = None
+        if snapshot_enabled() and not params['query']:
+            # Counted from the in-memory snapshot instead of a COUNT query
+            count = await sync_to_async(filtered_count)(students, *filters)
+        page = aget_page(students, params['per_page'], params['page_number'], count)
+    students_page, stats = await asyncio.gather(page, aget_stats())
+
+    total_count = None
+    if params['keyset']:
+        total_count = await sync_to_async(filtered_count)(students, *filters) if is_filtered(params) else stats['total']
+    return await arender(request, 'student_list.html', list_context(params, students_page, stats, total_count))
+
+# DETAIL VIEW
+@login_required
+@read_replica()
+async def student_detail(request, id):
+    student = await aget_object_or_404(Student, id=id)
+    return await arender(request, 'student_detail.html', {'student': student})
+
+# CHART DATA API
+@login_required
+@read_replica()
+async def chart_data(request):
+    return JsonResponse(chart_payload(await aget_stats()))
+
+# EXPORT TO CSV
+@login_required
+@read_replica()
+async def export_students_csv(request):
+    return stream_students_csv(
+        Student.objects.order_by('id'),
+        EXPORT_COLUMNS,
+        'students.csv',
+        gzip=request.GET.get('gzip') == '1',
+        asynchronous=isinstance(request, ASGIRequest),
+    )
+
+# BULK EXPORT
+@login_required
+@read_replica(['POST'])
+async def bulk_export(request):
+    if request.method == 'POST':
+        student_ids = request.POST.getlist('student_ids')
+        if not student_ids:
+            messages.error(request, 'No students selected.')
+            return redirect('student_list')
+
+        return stream_students_csv(
+            Student.objects.filter(id__in=student_ids).order_by('id'),
+            BULK_EXPORT_COLUMNS,
+            'selected_students.csv',
+            gzip=request.POST.get('gzip') == '1',
+            asynchronous=isinstance(request, ASGIRequest),
+        )
+    return redirect('student_list')
@@ -0,0 +1,46 @@
+"""
+Bulk edits over a selection of students or a filtered list.
+
+The new values are applied with QuerySet.update() in one transaction,
+one UPDATE per BULK_EDIT_BATCH_SIZE ids, so no row is loaded or saved
+through the model. Relative GPA changes stay a single statement through
+an F() expression. update() skips signals, so the side effects the
+signals would have had run once for the whole edit: one bulk INSERT
+into the change log, one cache version bump, and a stats recompute when
+GPAs changed.
+"""
+
+from django.db import transaction
+from django.db.models import F, Value
+from django.db.models.functions import Greatest, Least, Round
+from django.utils import timezone
+
+from .caching import bump_versions_on_commit
+from .changes import changes_batch, record_changes
+from .models import Student, StudentChange
+from .stats import invalidate_stats
+from .validation import GPA_MAX, GPA_MIN
+
+BULK_EDIT_BATCH_SIZE = 1000
+
+
+def adjusted_gpa(delta):
+    # gpa + delta, kept within the GPA scale.
+    gpa = Round(F('gpa') + Value(delta), 2)
+    return Least(Greatest(gpa, Value(GPA_MIN)), Value(GPA_MAX))
+
+
+def bulk_edit_students(queryset, updates, batch_size=BULK_EDIT_BATCH_SIZE):
+    # Applies `updates` (field name -> value or expression) to every
+    # student in `queryset` and returns how many were changed.
+    updates = dict(updates, updated_at=timezone.now())
+    with changes_batch():
+        ids = list(queryset.order_by().values_list('id', flat=True))
+        for start in range(0, len(ids), batch_size):
+            Student.objects.filter(id__in=ids[start:start + batch_size]).update(**updates)
+        record_changes(StudentChange.UPDATE, ids)
+        if ids:
+            if 'gpa' in updates:
+                transaction.on_commit(invalidate_stats)
+            bump_versions_on_commit(ids)
+    return len(ids)
@@ -0,0 +1,118 @@
+"""
+Versioned caching of rendered student fragments.
+
+Cached fragments are keyed by a version token instead of being deleted:
+a global table version that changes whenever any student changes, and a
+per-student version for fragments that only show one student. Saves and
+deletes bump them from signals once the transaction commits, and bulk
+paths that skip signals call bump_versions() themselves. Stale entries
+are simply never read again and age out of the cache.
+
+Everything goes through the STUDENT_CACHE_ALIAS cache, so it works with
+the local-memory, file-based or any shared backend. Hits and misses are
+counted per fragment name in this process (see cache_stats()).
+Fragments rendered from a read replica (see replicas.py) may predate the
+latest bump, so they are kept for REPLICA_FRAGMENT_TIMEOUT at most.
+"""
+import hashlib
+import threading
+import uuid
+from collections import Counter
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db import transaction
+
+from .replicas import REPLICA_FRAGMENT_TIMEOUT, current_replica
+
+CACHE_ALIAS = getattr(settings, 'STUDENT_CACHE_ALIAS', 'default')
+FRAGMENT_TIMEOUT = getattr(settings, 'STUDENT_FRAGMENT_CACHE_TIMEOUT', 3600)
+VERSION_TIMEOUT = None
+TABLE_VERSION_KEY = 'students:version:table'
+STUDENT_VERSION_KEY = 'students:version:student:%s'
+FRAGMENT_KEY = 'students:fragment:%s:%s'
+
+_lookups = Counter()
+_lookups_lock = threading.Lock()
+
+
+def get_cache():
+    return caches[CACHE_ALIAS]
+
+
+def new_version():
+    return uuid.uuid4().hex[:12]
+
+
+def get_version(key):
+    cache = get_cache()
+    version = cache.get(key)
+    if version is None:
+        # add() so concurrent first readers settle on the same token.
+        cache.add(key, new_version(), VERSION_TIMEOUT)
+        version = cache.get(key)
+    return version
+
+
+def table_version():
+    return get_version(TABLE_VERSION_KEY)
+
+
+def student_version(student_id):
+    return get_version(STUDENT_VERSION_KEY % student_id)
+
+
+def bump_versions(student_ids=()):
+    # New tokens for the table and the given students, in one cache call.
+    tokens = {TABLE_VERSION_KEY: new_version()}
+    for student_id in student_ids:
+        tokens[STUDENT_VERSION_KEY % student_id] = new_version()
+    get_cache().set_many(tokens, VERSION_TIMEOUT)
+
+
+def bump_versions_on_commit(student_ids=()):
+    # Bumping before commit would let a concurrent request cache the old
+    # rows under the new version.
+    student_ids = list(student_ids)
+    transaction.on_commit(lambda: bump_versions(student_ids))
+
+
+def fragment_key(name, versions, vary_on=()):
+    parts = ':'.join(str(part) for part in [*versions, *vary_on])
+    return FRAGMENT_KEY % (name, hashlib.md5(parts.encode('utf-8')).hexdigest())
+
+
+def cached_fragment(name, render, student_id=None, vary_on=(), timeout=FRAGMENT_TIMEOUT):
+    # Returns the cached rendering of `name`, calling render() on a miss.
+    version = table_version() if student_id is None else student_version(student_id)
+    key = fragment_key(name, [version], vary_on)
+    cache = get_cache()
+    content = cache.get(key)
+    record_lookup(name, content is not None)
+    if content is None:
+        content = render()
+        if current_replica() is not None:
+            timeout = min(timeout, REPLICA_FRAGMENT_TIMEOUT)
+        cache.set(key, content, timeout)
+    return content
+
+
+def record_lookup(name, hit):
+    with _lookups_lock:
+        _lookups[(name, hit)] += 1
+
+
+def cache_stats():
+    with _lookups_lock:
+        lookups = dict(_lookups)
+    stats = {}
+    for name in sorted({name for name, _ in lookups}):
+        hits = lookups.get((name, True), 0)
+        misses = lookups.get((name, False), 0)
+        stats[name] = {'hits': hits, 'misses': misses, 'hit_ratio': round(hits / (hits + misses), 3)}
+    return stats
+
+
+def reset_cache_stats():
+    with _lookups_lock:
+        _lookups.clear()
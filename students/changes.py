@@ -0,0 +1,126 @@
+"""
+Change log for Student rows, read back by the incremental export.
+
+Every create, update and delete appends a StudentChange row in the same
+transaction as the write: single saves and deletes through the signals in
+signals.py, bulk writes (imports, API bulk endpoints, bulk delete,
+seeding) through record_changes(), batched into one INSERT per
+changes_batch(). Consumers keep the id of the last change they applied
+and ask for the ones after it (see change_page()), instead of pulling the
+whole table again.
+"""
+import threading
+from contextlib import contextmanager
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+
+from .models import Student, StudentChange
+
+CHANGES_PAGE_SIZE = 1000
+CHANGES_MAX_PAGE_SIZE = 10000
+CHANGES_INSERT_BATCH_SIZE = 1000
+# Entries younger than this are held back: ids are handed out at INSERT
+# but become visible at COMMIT, so a transaction still in flight may yet
+# commit an id below one a consumer has already read past.
+CHANGES_SETTLE_SECONDS = getattr(settings, 'STUDENT_CHANGES_SETTLE_SECONDS', 5)
+
+_local = threading.local()
+
+
+def record_changes(action, student_ids):
+    entries = [StudentChange(student_id=student_id, action=action) for student_id in student_ids]
+    pending = getattr(_local, 'pending', None)
+    if pending is not None:
+        pending.extend(entries)
+    elif entries:
+        StudentChange.objects.bulk_create(entries, batch_size=CHANGES_INSERT_BATCH_SIZE)
+
+
+def record_change(action, student_id):
+    record_changes(action, [student_id])
+
+
+@contextmanager
+def changes_batch():
+    # An atomic block whose change entries are inserted together at the end.
+    if getattr(_local, 'pending', None) is not None:
+        with transaction.atomic():
+            yield
+        return
+    _local.pending = []
+    try:
+        with transaction.atomic():
+            yield
+            StudentChange.objects.bulk_create(_local.pending, batch_size=CHANGES_INSERT_BATCH_SIZE)
+    finally:
+        _local.pending = None
+
+
+def created_ids(students):
+    # bulk_create() only sets primary keys on backends that return them
+    # (not MySQL); look the others up by their unique email.
+    ids = [s.id for s in students if s.id is not None]
+    missing = [s.email for s in students if s.id is None]
+    if missing:
+        ids += Student.objects.filter(email__in=missing).values_list('id', flat=True)
+    return ids
+
+
+# Reading
+
+def cursor_before(moment):
+    # Cursor of the last change recorded before `moment`, for consumers
+    # starting from a full export taken at that time.
+    entry = StudentChange.objects.filter(changed_at__lt=moment).order_by('-changed_at', '-id').first()
+    return entry.id if entry else 0
+
+
+def settled_before():
+    settle = getattr(settings, 'STUDENT_CHANGES_SETTLE_SECONDS', CHANGES_SETTLE_SECONDS)
+    return timezone.now() - timedelta(seconds=settle)
+
+
+def settled_cursor():
+    # Where change_page() would stop right now: the last entry before the
+    # first one that is still settling.
+    entries = StudentChange.objects.order_by('-id').values_list('id', flat=True)
+    settling = StudentChange.objects.filter(changed_at__gt=settled_before()).order_by('id').values_list('id', flat=True).first()
+    if settling is not None:
+        entries = entries.filter(id__lt=settling)
+    return entries.first() or 0
+
+
+def change_page(cursor=0, limit=CHANGES_PAGE_SIZE):
+    # Returns (entries, next_cursor, has_more). Only the latest entry per
+    # student is kept, so an update carries that student's current state
+    # and consumers should apply creates and updates as upserts.
+    settled = settled_before()
+    entries = list(StudentChange.objects.filter(id__gt=cursor).order_by('id')[:limit + 1])
+    has_more = len(entries) > limit
+    entries = entries[:limit]
+    for index, entry in enumerate(entries):
+        if entry.changed_at > settled:
+            entries, has_more = entries[:index], False
+            break
+    next_cursor = entries[-1].id if entries else cursor
+
+    latest = {}
+    for entry in entries:
+        latest.pop(entry.student_id, None)
+        latest[entry.student_id] = entry
+    return list(latest.values()), next_cursor, has_more
+
+
+def with_students(entries, queryset):
+    # Pairs each entry with the student's current row (None for deletes).
+    # Creates and updates of rows deleted since are dropped; their delete
+    # entry comes later in the log.
+    students = queryset.in_bulk([e.student_id for e in entries if e.action != StudentChange.DELETE])
+    for entry in entries:
+        if entry.action == StudentChange.DELETE:
+            yield entry, None
+        elif entry.student_id in students:
+            yield entry, students[entry.student_id]
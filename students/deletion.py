@@ -0,0 +1,105 @@
+"""
+Soft delete and purge for Student records.
+
+Deleting a student only sets deleted_at, with one UPDATE per
+DELETE_BATCH_SIZE ids, so nothing is loaded through the model and no
+long-running DELETE locks the table. Student.objects hides the row from
+then on, and the side effects a delete has elsewhere happen right away:
+a change log entry, the stats counters and a cache version bump. Until
+the row is purged it can be brought back with restore_students(), and it
+keeps its email address.
+
+``manage.py purge_students`` removes rows deleted more than
+STUDENT_PURGE_AFTER_DAYS ago for good, PURGE_BATCH_SIZE at a time, each
+chunk in its own short transaction. Profile pictures and thumbnails are
+deleted once their chunk has committed. After every chunk the purge
+sleeps at least as long as the chunk took (and STUDENT_PURGE_PAUSE
+seconds), so it holds locks at most half the time.
+"""
+import time
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import router, transaction
+from django.utils import timezone
+
+from .caching import bump_versions_on_commit
+from .changes import changes_batch, record_changes
+from .models import QueuedEmail, Student, StudentChange, StudentSearchToken
+from .stats import record_created, record_deleted, stats_batch
+from .thumbnails import delete_files
+
+DELETE_BATCH_SIZE = 1000
+PURGE_BATCH_SIZE = 500
+PURGE_AFTER_DAYS = getattr(settings, 'STUDENT_PURGE_AFTER_DAYS', 30)
+PURGE_PAUSE = getattr(settings, 'STUDENT_PURGE_PAUSE', 0.1)
+
+
+def soft_delete_students(queryset, batch_size=DELETE_BATCH_SIZE):
+    # Marks the live students in `queryset` deleted; returns how many.
+    now = timezone.now()
+    with changes_batch(), stats_batch():
+        rows = list(queryset.order_by().values_list('id', 'gpa'))
+        ids = [student_id for student_id, _ in rows]
+        for start in range(0, len(ids), batch_size):
+            Student.objects.filter(id__in=ids[start:start + batch_size]).update(deleted_at=now, updated_at=now)
+        record_changes(StudentChange.DELETE, ids)
+        for _, gpa in rows:
+            record_deleted(gpa)
+        if ids:
+            bump_versions_on_commit(ids)
+    return len(ids)
+
+
+def restore_students(ids, batch_size=DELETE_BATCH_SIZE):
+    # Undoes soft_delete_students() for the given ids not purged yet.
+    now = timezone.now()
+    with changes_batch(), stats_batch():
+        rows = list(Student.all_objects.filter(id__in=ids, deleted_at__isnull=False).order_by().values_list('id', 'gpa'))
+        ids = [student_id for student_id, _ in rows]
+        for start in range(0, len(ids), batch_size):
+            Student.all_objects.filter(id__in=ids[start:start + batch_size]).update(deleted_at=None, updated_at=now)
+        record_changes(StudentChange.CREATE, ids)
+        for _, gpa in rows:
+            record_created(gpa)
+        if ids:
+            bump_versions_on_commit(ids)
+    return len(ids)
+
+
+def hard_delete(ids, using):
+    # Plain DELETE of the rows, without loading them for signals or the
+    # collector, so dependent rows are handled here. Call inside a transaction.
+    StudentSearchToken.objects.filter(student_id__in=ids)._raw_delete(using=using)
+    QueuedEmail.objects.filter(student_id__in=ids).update(student=None)
+    return Student.all_objects.filter(id__in=ids)._raw_delete(using=using)
+
+
+def purge_students(older_than=None, batch_size=PURGE_BATCH_SIZE, pause=None, on_chunk=None):
+    # Hard-deletes students soft-deleted before `older_than` (default:
+    # STUDENT_PURGE_AFTER_DAYS ago) and their files; returns how many.
+    if older_than is None:
+        days = getattr(settings, 'STUDENT_PURGE_AFTER_DAYS', PURGE_AFTER_DAYS)
+        older_than = timezone.now() - timedelta(days=days)
+    if pause is None:
+        pause = getattr(settings, 'STUDENT_PURGE_PAUSE', PURGE_PAUSE)
+    using = router.db_for_write(Student)
+    expired = Student.all_objects.using(using).filter(deleted_at__lt=older_than)
+    purged = 0
+    while True:
+        started = time.monotonic()
+        with transaction.atomic(using=using):
+            rows = list(expired.order_by('deleted_at', 'created_at', 'id').values_list('id', 'profile_picture', 'profile_thumbnails')[:batch_size])
+            if not rows:
+                break
+            purged += hard_delete([student_id for student_id, _, _ in rows], using)
+        files = []
+        for _, picture, thumbnails in rows:
+            files += [picture, *(thumbnails or {}).values()]
+        delete_files(files)
+        if on_chunk is not None:
+            on_chunk(purged)
+        if len(rows) < batch_size:
+            break
+        time.sleep(max(pause, time.monotonic() - started))
+    return purged
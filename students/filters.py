@@ -0,0 +1,26 @@
+from .models import PERFORMANCE_LABELS
+from .search import search_students
+
+# Older links and the API also accept this grouping of the two lower levels.
+NEEDS_IMPROVEMENT = ['average', 'poor']
+
+
+def filter_students(students, query='', min_gpa='', max_gpa='', performance=''):
+    # Search filter (ranked; see search.py)
+    if query:
+        students = search_students(students, query)
+    
+    # GPA range filter
+    if min_gpa:
+        students = students.filter(gpa__gte=float(min_gpa))
+    if max_gpa:
+        students = students.filter(gpa__lte=float(max_gpa))
+    
+    # Performance filter (indexed generated column)
+    performance = performance.lower()
+    if performance in PERFORMANCE_LABELS:
+        students = students.filter(performance_level=performance)
+    elif performance == 'needs_improvement':
+        students = students.filter(performance_level__in=NEEDS_IMPROVEMENT)
+    
+    return students
@@ -1,5 +1,9 @@
 from django import forms
-from .models import Student
+from django.core.exceptions import ValidationError
+from .models import PERFORMANCE_CHOICES, Student
+from .bulk import adjusted_gpa
+from .importers import IMPORT_MODES, MODE_CREATE
+from .validation import GPA_MAX, GPA_MIN, STUDENT_FIELDS, clean_student, email_error, taken_emails
 
 class StudentForm(forms.ModelForm):
     date_of_birth = forms.DateField(
@@ -25,12 +29,42 @@ class StudentForm(forms.ModelForm):
             'profile_picture': forms.FileInput(attrs={'class': 'form-control'}),
         }
 
+    def clean(self):
+        # The rules the import and API batch paths apply (see validation.py),
+        # on the fields that passed their own form validation.
+        cleaned_data = super().clean()
+        fields = [name for name in STUDENT_FIELDS if name in cleaned_data]
+        data, errors = clean_student(cleaned_data, fields)
+        for name, field_errors in errors.items():
+            for e in field_errors:
+                self.add_error(name, ValidationError(e['message'], code=e['code']))
+        for name in fields:
+            if name in data:
+                cleaned_data[name] = data[name]
+            elif name not in errors:
+                # Blank with a model default: keep the default or current value.
+                cleaned_data.pop(name)
+        return cleaned_data
+
+    def validate_unique(self):
+        email = self.cleaned_data.get('email')
+        if email and 'email' not in self._errors:
+            e = email_error(taken_emails([email]), email, self.instance)
+            if e:
+                self.add_error('email', ValidationError(e['message'], code=e['code']))
+
 class ImportCSVForm(forms.Form):
     csv_file = forms.FileField(
         label='Select CSV File',
         help_text='Upload a CSV file with columns: first_name, last_name, email, gpa, phone, address',
         widget=forms.FileInput(attrs={'class': 'form-control', 'accept': '.csv'})
     )
+    mode = forms.ChoiceField(
+        label='Import Mode',
+        choices=IMPORT_MODES,
+        initial=MODE_CREATE,
+        widget=forms.Select(attrs={'class': 'form-select'})
+    )
 
 class FilterForm(forms.Form):
     min_gpa = forms.DecimalField(
@@ -47,6 +81,68 @@ class FilterForm(forms.Form):
     )
     performance = forms.ChoiceField(
         required=False,
-        choices=[('', 'All'), ('excellent', 'Excellent'), ('good', 'Good'), ('needs_improvement', 'Needs Improvement')],
+        choices=[('', 'All')] + PERFORMANCE_CHOICES,
         widget=forms.Select(attrs={'class': 'form-control'})
-    )
\ No newline at end of file
+    )
+
+class BulkEditForm(forms.Form):
+    gpa_action = forms.ChoiceField(
+        required=False,
+        label='GPA',
+        choices=[('', 'Leave unchanged'), ('set', 'Set to'), ('adjust', 'Adjust by')],
+        widget=forms.Select(attrs={'class': 'form-select'})
+    )
+    gpa = forms.DecimalField(
+        required=False,
+        max_digits=4,
+        decimal_places=2,
+        widget=forms.NumberInput(attrs={'class': 'form-control', 'step': '0.01', 'min': '-4', 'max': '4'})
+    )
+    enrollment_date = forms.DateField(
+        required=False,
+        help_text='Leave empty to keep each student\'s date.',
+        widget=forms.DateInput(attrs={'type': 'date', 'class': 'form-control'})
+    )
+    phone_action = forms.ChoiceField(
+        required=False,
+        label='Phone',
+        choices=[('', 'Leave unchanged'), ('set', 'Set to'), ('clear', 'Clear')],
+        widget=forms.Select(attrs={'class': 'form-select'})
+    )
+    phone = forms.CharField(
+        required=False,
+        max_length=Student._meta.get_field('phone').max_length,
+        widget=forms.TextInput(attrs={'class': 'form-control', 'placeholder': '+1234567890'})
+    )
+
+    def clean(self):
+        cleaned_data = super().clean()
+        gpa_action = cleaned_data.get('gpa_action')
+        gpa = cleaned_data.get('gpa')
+        if gpa_action and gpa is None:
+            self.add_error('gpa', 'Enter a GPA value.')
+        elif gpa_action == 'set' and not GPA_MIN <= gpa <= GPA_MAX:
+            self.add_error('gpa', f'GPA must be between {GPA_MIN} and {GPA_MAX}.')
+        elif gpa_action == 'adjust' and abs(gpa) > GPA_MAX:
+            self.add_error('gpa', f'Adjust by at most {GPA_MAX} points.')
+        if cleaned_data.get('phone_action') == 'set' and not cleaned_data.get('phone'):
+            self.add_error('phone', 'Enter a phone number, or choose Clear.')
+        if not self.errors and not self.updates():
+            raise forms.ValidationError('Choose at least one change to apply.')
+        return cleaned_data
+
+    def updates(self):
+        # Field name -> new value (or expression) for bulk_edit_students()
+        data = self.cleaned_data
+        updates = {}
+        if data.get('gpa_action') == 'set':
+            updates['gpa'] = data['gpa']
+        elif data.get('gpa_action') == 'adjust':
+            updates['gpa'] = adjusted_gpa(data['gpa'])
+        if data.get('enrollment_date'):
+            updates['enrollment_date'] = data['enrollment_date']
+        if data.get('phone_action') == 'set':
+            updates['phone'] = data['phone']
+        elif data.get('phone_action') == 'clear':
+            updates['phone'] = None
+        return updates
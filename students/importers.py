@@ -0,0 +1,211 @@
+"""
+Streaming CSV import for Student records.
+
+The upload is decoded incrementally from its chunks. Rows are validated
+with the rules StudentForm uses (see validation.py) and written in
+fixed-size batches with one bulk_create per batch, each inside its own
+transaction. In upsert mode rows are matched to existing students by
+email and changed ones are written with bulk_update instead of being
+rejected.
+"""
+import codecs
+import csv
+import io
+import time
+
+from django.core.exceptions import ValidationError
+from django.db import IntegrityError
+from django.utils import timezone
+
+from .caching import bump_versions_on_commit
+from .changes import changes_batch, created_ids, record_changes
+from .models import Student, StudentChange
+from .search import index_students, uses_token_index
+from .stats import record_changed, record_created, stats_batch
+from .validation import DATE_FIELDS, DELETED_EMAIL_MESSAGE, TEXT_FIELDS, UNIQUE_EMAIL_MESSAGE, error_messages, validate_students
+
+IMPORT_BATCH_SIZE = 1000
+MODE_CREATE = 'create'
+MODE_UPSERT = 'upsert'
+IMPORT_MODES = [
+    (MODE_CREATE, 'Add new students only'),
+    (MODE_UPSERT, 'Add new and update existing students (match on email)'),
+]
+REQUIRED_COLUMNS = ['first_name', 'last_name', 'email', 'gpa']
+
+
+def iter_csv_lines(uploaded_file, encoding='utf-8-sig', on_chunk=None):
+    # Decode chunk by chunk so the whole upload never sits in memory as text.
+    decoder = codecs.getincrementaldecoder(encoding)()
+    pending = ''
+    for chunk in uploaded_file.chunks():
+        if on_chunk is not None:
+            on_chunk(len(chunk))
+        pending += decoder.decode(chunk)
+        lines = pending.split('\n')
+        pending = lines.pop()
+        for line in lines:
+            yield line + '\n'
+    pending += decoder.decode(b'', final=True)
+    if pending:
+        yield pending
+
+
+class StudentCSVImporter:
+    def __init__(self, mode=MODE_CREATE, batch_size=IMPORT_BATCH_SIZE, progress=None):
+        self.mode = mode
+        self.batch_size = batch_size
+        # Called with the importer after every written batch
+        self.progress = progress
+        self.columns = set()
+        self.bytes_read = 0
+        self.rows = 0
+        self.created = 0
+        self.updated = 0
+        self.unchanged = 0
+        self.errors = []
+        self.elapsed = 0.0
+
+    @property
+    def rows_per_second(self):
+        if not self.elapsed:
+            return float(self.rows)
+        return self.rows / self.elapsed
+
+    def run(self, uploaded_file):
+        started = time.monotonic()
+        reader = csv.DictReader(iter_csv_lines(uploaded_file, on_chunk=self.count_bytes))
+        missing = [c for c in REQUIRED_COLUMNS if c not in (reader.fieldnames or [])]
+        if missing:
+            raise ValidationError(f'Missing required column(s): {", ".join(missing)}')
+        self.columns = set(reader.fieldnames)
+
+        with stats_batch():
+            seen_emails = set()
+            rows = []
+            for row in reader:
+                self.rows += 1
+                rows.append((reader.line_num, row))
+                if len(rows) >= self.batch_size:
+                    self.flush(self.validate(rows, seen_emails))
+                    rows = []
+                    if self.progress is not None:
+                        self.progress(self)
+
+            if rows:
+                self.flush(self.validate(rows, seen_emails))
+        self.elapsed = time.monotonic() - started
+        return self
+
+    def summary(self):
+        text = f'Successfully imported {self.created} students. '
+        if self.mode == MODE_UPSERT:
+            text += f'Updated {self.updated}, {self.unchanged} unchanged. '
+        return text + (
+            f'{len(self.errors)} errors. '
+            f'({self.rows} rows in {self.elapsed:.1f}s, {self.rows_per_second:,.0f} rows/sec)'
+        )
+
+    def count_bytes(self, size):
+        self.bytes_read += size
+
+    def validate(self, rows, seen_emails):
+        # The valid rows as (line, data); the others are recorded as errors.
+        # Existing emails are checked by flush(), which looks them up anyway.
+        results = validate_students([row for _, row in rows], seen_emails=seen_emails, check_database=False)
+        batch = []
+        for (line, _), (data, errors) in zip(rows, results):
+            if errors:
+                self.errors.append((line, '; '.join(error_messages(errors))))
+            else:
+                batch.append((line, data))
+        return batch
+
+    def flush(self, batch):
+        if not batch:
+            return
+        emails = [data['email'] for _, data in batch]
+        try:
+            with changes_batch():
+                existing = {
+                    row['email'].lower(): row
+                    for row in Student.all_objects.filter(email__in=emails).order_by().values('id', 'deleted_at', *self.compared_fields())
+                }
+                to_create, to_update, rejected, gpa_changes, renamed = [], [], [], [], []
+                changed_fields = set()
+                for line, data in batch:
+                    current = existing.get(data['email'].lower())
+                    if current is None:
+                        to_create.append(Student(**data))
+                    elif current['deleted_at'] is not None:
+                        rejected.append((line, f'email: {DELETED_EMAIL_MESSAGE}'))
+                    elif self.mode == MODE_UPSERT:
+                        changes = self.diff(current, data)
+                        if changes:
+                            # Carry every compared value so rows that changed fewer
+                            # fields than the batch-wide set keep their own values.
+                            values = {name: data.get(name, current[name]) for name in self.updatable_fields()}
+                            to_update.append(Student(id=current['id'], **values))
+                            changed_fields.update(changes)
+                            gpa_changes.append((current['gpa'], values['gpa']))
+                            if changes & {'first_name', 'last_name'}:
+                                renamed.append(data['email'])
+                    else:
+                        rejected.append((line, f'email: {UNIQUE_EMAIL_MESSAGE}'))
+                Student.objects.bulk_create(to_create, batch_size=self.batch_size)
+                if to_update:
+                    # bulk_update() skips auto_now, so stamp updated_at explicitly.
+                    now = timezone.now()
+                    for student in to_update:
+                        student.updated_at = now
+                    Student.objects.bulk_update(to_update, sorted(changed_fields) + ['updated_at'], batch_size=self.batch_size)
+                record_changes(StudentChange.CREATE, created_ids(to_create))
+                record_changes(StudentChange.UPDATE, [student.id for student in to_update])
+                if uses_token_index() and (to_create or renamed):
+                    # bulk_create() may not return primary keys (MySQL), so look the rows up again.
+                    written = [s.email for s in to_create] + renamed
+                    index_students(
+                        Student.objects.filter(email__in=written).order_by().only('id', 'first_name', 'last_name', 'email')
+                    )
+        except IntegrityError as e:
+            # The whole batch was rolled back; report every row in it.
+            self.errors.extend((line, f'batch rejected by the database: {e}') for line, _ in batch)
+            return
+        self.errors.extend(rejected)
+        for student in to_create:
+            record_created(student.gpa)
+        for old_gpa, new_gpa in gpa_changes:
+            record_changed(old_gpa, new_gpa)
+        if to_create or to_update:
+            bump_versions_on_commit(student.id for student in to_update)
+        self.created += len(to_create)
+        self.updated += len(to_update)
+        if self.mode == MODE_UPSERT:
+            self.unchanged += len(batch) - len(to_create) - len(to_update) - len(rejected)
+
+    def compared_fields(self):
+        # Only columns present in the upload are authoritative for updates.
+        return [name for name in TEXT_FIELDS + ['gpa'] + DATE_FIELDS if name in self.columns]
+
+    def updatable_fields(self):
+        return [name for name in self.compared_fields() if name != 'email']
+
+    def diff(self, current, data):
+        changes = set()
+        for name in self.updatable_fields():
+            if name not in data:
+                continue
+            old, new = current[name], data[name]
+            if name in TEXT_FIELDS:
+                # Blank text may be stored as '' or NULL.
+                old, new = old or '', new or ''
+            if old != new:
+                changes.add(name)
+        return changes
+
+    def error_report(self):
+        output = io.StringIO()
+        writer = csv.writer(output)
+        writer.writerow(['Line', 'Error'])
+        writer.writerows(sorted(self.errors))
+        return output.getvalue()
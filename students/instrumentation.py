@@ -0,0 +1,181 @@
+"""
+Per-request SQL and timing instrumentation.
+
+When STUDENT_METRICS_ENABLED is on, InstrumentationMiddleware records for
+every request the view's URL name, total time, query count, DB time,
+repeated queries, template render time and response size. Records are
+kept in a bounded in-memory ring buffer (STUDENT_METRICS_BUFFER_SIZE per
+process) and summarized as p50/p95/p99 per URL name by the staff-only
+``/metrics/`` endpoint and the ``request_metrics`` management command.
+"""
+import threading
+import time
+from collections import Counter, deque
+from contextlib import ExitStack
+from contextvars import ContextVar
+
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import connections
+from django.utils import timezone
+
+METRICS_ENABLED = getattr(settings, 'STUDENT_METRICS_ENABLED', False)
+METRICS_BUFFER_SIZE = getattr(settings, 'STUDENT_METRICS_BUFFER_SIZE', 1000)
+# Requests to these URL names are not recorded.
+IGNORED_URL_NAMES = {'request_metrics'}
+PERCENTILES = (50, 95, 99)
+SQL_PREVIEW_LENGTH = 200
+
+_records = deque(maxlen=METRICS_BUFFER_SIZE)
+_records_lock = threading.Lock()
+_current = ContextVar('student_request_metrics', default=None)
+
+
+class RequestMetrics:
+    def __init__(self):
+        self.queries = 0
+        self.db_time = 0.0
+        self.template_time = 0.0
+        self.statements = Counter()
+
+    def __call__(self, execute, sql, params, many, context):
+        # Installed with connection.execute_wrapper() for the whole request.
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.db_time += time.perf_counter() - start
+            self.queries += 1
+            self.statements[(sql, repr(params))] += 1
+
+    def duplicates(self):
+        # Queries that ran again with exactly the same SQL and parameters.
+        return sum(count - 1 for count in self.statements.values())
+
+    def similar(self):
+        # The most repeated SQL shape regardless of parameters: an N+1 shows up here.
+        shapes = Counter()
+        for (sql, _), count in self.statements.items():
+            shapes[sql] += count
+        if not shapes:
+            return 0, ''
+        sql, count = shapes.most_common(1)[0]
+        return count, sql[:SQL_PREVIEW_LENGTH]
+
+
+def install_template_timer():
+    # Time the top-level render of every Django template; includes and
+    # {% extends %} happen inside it, so nothing is counted twice.
+    from django.template.backends.django import Template
+
+    if getattr(Template.render, 'instrumented', False):
+        return
+    original = Template.render
+
+    def render(self, context=None, request=None):
+        metrics = _current.get()
+        if metrics is None:
+            return original(self, context, request)
+        start = time.perf_counter()
+        try:
+            return original(self, context, request)
+        finally:
+            metrics.template_time += time.perf_counter() - start
+
+    render.instrumented = True
+    Template.render = render
+
+
+def response_size(response):
+    if response.streaming:
+        length = response.get('Content-Length')
+        return int(length) if length else None
+    return len(response.content)
+
+
+class InstrumentationMiddleware:
+    def __init__(self, get_response):
+        if not getattr(settings, 'STUDENT_METRICS_ENABLED', METRICS_ENABLED):
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+        install_template_timer()
+
+    def __call__(self, request):
+        metrics = RequestMetrics()
+        token = _current.set(metrics)
+        start = time.perf_counter()
+        try:
+            with ExitStack() as stack:
+                for alias in connections:
+                    stack.enter_context(connections[alias].execute_wrapper(metrics))
+                response = self.get_response(request)
+        finally:
+            _current.reset(token)
+        duration = time.perf_counter() - start
+
+        match = request.resolver_match
+        url_name = match.view_name if match else None
+        if url_name not in IGNORED_URL_NAMES:
+            similar_count, similar_sql = metrics.similar()
+            record({
+                'at': timezone.now().isoformat(),
+                'method': request.method,
+                'path': request.path,
+                'url_name': url_name or '<unresolved>',
+                'status': response.status_code,
+                'duration_ms': round(duration * 1000, 3),
+                'queries': metrics.queries,
+                'db_ms': round(metrics.db_time * 1000, 3),
+                'duplicate_queries': metrics.duplicates(),
+                'most_repeated_count': similar_count,
+                'most_repeated_sql': similar_sql if similar_count > 1 else '',
+                'template_ms': round(metrics.template_time * 1000, 3),
+                'response_bytes': response_size(response),
+            })
+        return response
+
+
+def record(entry):
+    with _records_lock:
+        _records.append(entry)
+
+
+def get_records():
+    with _records_lock:
+        return list(_records)
+
+
+def clear_records():
+    with _records_lock:
+        _records.clear()
+
+
+def percentile(values, pct):
+    # Nearest-rank percentile of an unsorted list.
+    if not values:
+        return None
+    ordered = sorted(values)
+    rank = max(1, -(-pct * len(ordered) // 100))
+    return ordered[int(rank) - 1]
+
+
+def summarize(records):
+    by_name = {}
+    for entry in records:
+        by_name.setdefault(entry['url_name'], []).append(entry)
+
+    summary = {}
+    for name, entries in sorted(by_name.items()):
+        row = {'requests': len(entries)}
+        for metric in ('duration_ms', 'queries', 'db_ms', 'template_ms'):
+            values = [e[metric] for e in entries]
+            for pct in PERCENTILES:
+                row[f'{metric}_p{pct}'] = percentile(values, pct)
+        row['max_queries'] = max(e['queries'] for e in entries)
+        row['max_duplicate_queries'] = max(e['duplicate_queries'] for e in entries)
+        sizes = [e['response_bytes'] for e in entries if e['response_bytes'] is not None]
+        row['response_bytes_p50'] = percentile(sizes, 50)
+        worst = max(entries, key=lambda e: e['most_repeated_count'])
+        row['most_repeated_sql'] = worst['most_repeated_sql']
+        summary[name] = row
+    return summary
@@ -0,0 +1,295 @@
+"""
+Background jobs for CSV imports and exports.
+
+Web requests only store the upload (or the export options) as a Job row
+and return. A worker claims queued jobs and runs them, writing progress
+counters to the row as it goes, and saves finished exports and import
+error reports under job_results/ for download. Workers are the
+``process_jobs`` management command, which runs jobs in a pool of
+STUDENT_JOB_WORKERS processes; deployments are expected to run
+``manage.py process_jobs --loop`` alongside the web processes. For
+development, STUDENT_JOB_WORKER_THREAD (off by default) instead starts a
+daemon thread in the web process after each enqueue, like the email
+queue's. An import's upload is deleted once the job has finished,
+whether it succeeded or failed.
+
+Progress writes double as a heartbeat: a running job that has not
+written one for JOB_STALE_TIMEOUT seconds is assumed to have died with
+its worker and is queued again, up to JOB_MAX_ATTEMPTS times.
+"""
+import logging
+import multiprocessing
+import tempfile
+import threading
+import time
+import uuid
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from datetime import timedelta
+
+import django
+from django.conf import settings
+from django.core.exceptions import ValidationError
+from django.core.files.base import ContentFile, File
+from django.core.files.storage import default_storage
+from django.db import close_old_connections, connection, transaction
+from django.db.models import F, Q
+from django.urls import reverse
+from django.utils import timezone
+
+from .exporters import BULK_EXPORT_COLUMNS, EXPORT_CHUNK_SIZE, EXPORT_COLUMNS, csv_content, iter_queryset_rows
+from .importers import MODE_CREATE, StudentCSVImporter
+from .models import Job, Student
+
+logger = logging.getLogger(__name__)
+
+JOB_WORKERS = getattr(settings, 'STUDENT_JOB_WORKERS', 2)
+JOB_WORKER_THREAD = getattr(settings, 'STUDENT_JOB_WORKER_THREAD', False)
+JOB_STALE_TIMEOUT = 300
+JOB_MAX_ATTEMPTS = 3
+PROGRESS_INTERVAL = 1.0
+RESULT_DIR = 'job_results'
+
+_worker = None
+_worker_lock = threading.Lock()
+
+
+def enqueue_import(uploaded_file, mode=MODE_CREATE, user=None):
+    job = Job(kind=Job.IMPORT, options={'mode': mode}, created_by=user, total=uploaded_file.size)
+    job.input_file.save(f'{uuid.uuid4().hex}.csv', uploaded_file, save=False)
+    job.save()
+    transaction.on_commit(start_worker)
+    return job
+
+
+def enqueue_export(user=None, gzip=False, student_ids=None):
+    options = {'gzip': gzip}
+    if student_ids is not None:
+        options['student_ids'] = [int(i) for i in student_ids]
+    job = Job.objects.create(kind=Job.EXPORT, options=options, created_by=user)
+    transaction.on_commit(start_worker)
+    return job
+
+
+def job_status(job):
+    return {
+        'id': job.id,
+        'kind': job.kind,
+        'status': job.status,
+        'processed': job.processed,
+        'total': job.total,
+        'percent': job.percent,
+        'result': job.result,
+        'error': job.error,
+        'done': job.finished,
+        'download_url': reverse('job_download', args=[job.id]) if job.result_file else None,
+    }
+
+
+def download_name(job):
+    if job.kind == Job.IMPORT:
+        return 'import_errors.csv'
+    return 'students.csv.gz' if job.options.get('gzip') else 'students.csv'
+
+
+# Claiming
+
+def claimable_jobs(now):
+    # Queued jobs, plus running ones whose worker stopped sending heartbeats.
+    stale = now - timedelta(seconds=JOB_STALE_TIMEOUT)
+    return Job.objects.filter(Q(status=Job.QUEUED) | Q(status=Job.RUNNING, heartbeat_at__lt=stale))
+
+
+def claim_next():
+    # Returns the next job marked as running under a fresh claim, or None.
+    now = timezone.now()
+    claimable_jobs(now).filter(attempts__gte=JOB_MAX_ATTEMPTS).update(
+        status=Job.FAILED, error='The worker running this job stopped responding.', claim='', finished_at=now,
+    )
+    while True:
+        job_id = claimable_jobs(now).order_by('id').values_list('id', flat=True).first()
+        if job_id is None:
+            return None
+        token = uuid.uuid4().hex
+        # Re-check the condition in the UPDATE so two workers never claim the same job.
+        claimed = claimable_jobs(now).filter(id=job_id).update(
+            status=Job.RUNNING, claim=token, attempts=F('attempts') + 1, started_at=now, heartbeat_at=now,
+        )
+        if claimed:
+            return Job.objects.get(id=job_id)
+
+
+class Progress:
+    # Throttled progress writes, which are also the job's heartbeat.
+    def __init__(self, job, interval=PROGRESS_INTERVAL):
+        self.job = job
+        self.interval = interval
+        self.last = time.monotonic()
+
+    def update(self, processed, **fields):
+        now = time.monotonic()
+        if not fields and now - self.last < self.interval:
+            return
+        self.last = now
+        Job.objects.filter(id=self.job.id, claim=self.job.claim).update(
+            processed=processed, heartbeat_at=timezone.now(), **fields
+        )
+
+
+def finish(job, status, **fields):
+    Job.objects.filter(id=job.id, claim=job.claim).update(
+        status=status, claim='', finished_at=timezone.now(), heartbeat_at=timezone.now(), **fields
+    )
+
+
+# Running
+
+def run_job(job_id, claim):
+    # Entry point for pool processes and the worker thread.
+    job = Job.objects.filter(id=job_id, claim=claim).first()
+    if job is None:
+        # Deleted, or claimed again by another worker in the meantime.
+        return
+    try:
+        if job.kind == Job.IMPORT:
+            run_import(job)
+        else:
+            run_export(job)
+    except Exception as e:
+        logger.exception('Job %s failed', job.id)
+        finish(job, Job.FAILED, error=str(e) or type(e).__name__)
+    finally:
+        if job.kind == Job.IMPORT:
+            discard_upload(job)
+
+
+def discard_upload(job):
+    # The upload is not needed once the import has finished either way. A
+    # job still running (reclaimed by another worker after a stall) keeps it.
+    name = job.input_file.name
+    if name and Job.objects.filter(id=job.id).exclude(status=Job.RUNNING).update(input_file=''):
+        default_storage.delete(name)
+
+
+def run_import(job):
+    progress = Progress(job)
+    importer = StudentCSVImporter(
+        mode=job.options.get('mode', MODE_CREATE),
+        progress=lambda importer: progress.update(importer.bytes_read),
+    )
+    try:
+        with job.input_file.open('rb') as upload:
+            importer.run(File(upload))
+    except UnicodeDecodeError:
+        finish(job, Job.FAILED, error='The CSV file must be UTF-8 encoded.')
+        return
+    except ValidationError as e:
+        finish(job, Job.FAILED, error=' '.join(e.messages))
+        return
+
+    fields = {}
+    if importer.errors:
+        fields['result_file'] = default_storage.save(
+            f'{RESULT_DIR}/import-errors-{job.id}.csv', ContentFile(importer.error_report().encode('utf-8'))
+        )
+    finish(job, Job.SUCCEEDED, processed=job.total, result={
+        'rows': importer.rows,
+        'created': importer.created,
+        'updated': importer.updated,
+        'unchanged': importer.unchanged,
+        'errors': len(importer.errors),
+        'summary': importer.summary(),
+    }, **fields)
+
+
+def run_export(job):
+    queryset = Student.objects.order_by('id')
+    columns = EXPORT_COLUMNS
+    if 'student_ids' in job.options:
+        queryset = queryset.filter(id__in=job.options['student_ids'])
+        columns = BULK_EXPORT_COLUMNS
+    total = queryset.count()
+    progress = Progress(job)
+    progress.update(0, total=total)
+
+    def rows(queryset):
+        for number, row in enumerate(iter_queryset_rows(queryset), start=1):
+            yield row
+            if number % EXPORT_CHUNK_SIZE == 0:
+                progress.update(number)
+
+    gzip = job.options.get('gzip', False)
+    with tempfile.TemporaryFile() as output:
+        for chunk in csv_content(queryset, columns, gzip, rows):
+            output.write(chunk)
+        output.seek(0)
+        name = default_storage.save(f'{RESULT_DIR}/students-{job.id}.csv' + ('.gz' if gzip else ''), File(output))
+    finish(job, Job.SUCCEEDED, processed=total, result_file=name, result={'rows': total})
+
+
+def process_jobs(workers=JOB_WORKERS, loop=False, interval=2.0):
+    # Runs queued jobs until there are none left (or forever with loop=True)
+    # and returns how many were started. workers=0 runs them one at a time
+    # in this process.
+    started = 0
+    if not workers:
+        while True:
+            job = claim_next()
+            if job is not None:
+                run_job(job.id, job.claim)
+                started += 1
+            elif loop:
+                time.sleep(interval)
+            else:
+                return started
+
+    # Spawned rather than forked children, so none of them inherits this
+    # process's database connections.
+    context = multiprocessing.get_context('spawn')
+    running = set()
+    with ProcessPoolExecutor(max_workers=workers, mp_context=context, initializer=django.setup) as pool:
+        while True:
+            while len(running) < workers:
+                job = claim_next()
+                if job is None:
+                    break
+                running.add(pool.submit(run_job, job.id, job.claim))
+                started += 1
+            if running:
+                done, running = wait(running, timeout=interval, return_when=FIRST_COMPLETED)
+                for future in done:
+                    future.result()
+            elif loop:
+                time.sleep(interval)
+            else:
+                return started
+
+
+# In-process worker thread
+
+def start_worker():
+    global _worker
+    if not getattr(settings, 'STUDENT_JOB_WORKER_THREAD', JOB_WORKER_THREAD):
+        return
+    with _worker_lock:
+        if _worker is not None and _worker.is_alive():
+            return
+        _worker = threading.Thread(target=run_worker, name='student-job-worker', daemon=True)
+        _worker.start()
+
+
+def run_worker():
+    global _worker
+    try:
+        while True:
+            close_old_connections()
+            job = claim_next()
+            if job is not None:
+                run_job(job.id, job.claim)
+                continue
+            with _worker_lock:
+                # Exit under the lock so a concurrent start_worker() sees us gone.
+                if not claimable_jobs(timezone.now()).exists():
+                    _worker = None
+                    return
+    finally:
+        connection.close()
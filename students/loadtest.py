@@ -0,0 +1,491 @@
+"""
+Route load-testing harness used by ``manage.py benchmark_routes``.
+
+SCENARIOS describes one or more requests for every named route in
+students/urls.py (missing_routes() keeps it honest). Each scenario is
+driven in-process through the Django test client, over HTTP against a
+local threaded WSGI server, or in-process through the ASGI handler with
+the async views switched on, with a configurable number of concurrent
+workers (threads, or tasks on one event loop for ASGI). Requests that change data work on rows created for
+the run, all under SEED_EMAIL_DOMAIN so delete_seeded_students() removes
+them again.
+"""
+import asyncio
+import http.client
+import importlib
+import io
+import itertools
+import json
+import sys
+import threading
+import time
+from collections import Counter, namedtuple
+from concurrent.futures import ThreadPoolExecutor
+
+from asgiref.sync import ThreadSensitiveContext, sync_to_async
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.db import connection, connections
+from django.forms.models import model_to_dict
+from django.test import AsyncClient, Client
+from django.test.client import BOUNDARY, MULTIPART_CONTENT, encode_multipart
+from django.test.utils import override_settings
+from django.urls import clear_url_caches, reverse
+from django.utils.crypto import get_random_string
+
+from .instrumentation import RequestMetrics, percentile
+from .jobs import claim_next, enqueue_export, run_job
+from .models import EmailBatch, Job, Student
+from .rollups import refresh_rollups
+from .seed import SEED_EMAIL_DOMAIN
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+BENCH_USERNAME = 'route-benchmark'
+IMPORT_ROWS = 100
+BULK_ROWS = 10
+
+Request = namedtuple('Request', 'method path data content_type anonymous')
+
+
+def request(method, path, data=None, content_type=MULTIPART_CONTENT, anonymous=False):
+    return Request(method, path, data, content_type, anonymous)
+
+
+def json_request(method, path, payload):
+    return request(method, path, json.dumps(payload), 'application/json')
+
+
+class Scenario:
+    def __init__(self, name, url_name, build):
+        # build(ctx) returns the Request to send; any rows it needs are
+        # created there, outside the timed section.
+        self.name = name
+        self.url_name = url_name
+        self.build = build
+
+
+class BenchContext:
+    def __init__(self, user):
+        self.user = user
+        self.student_ids = list(
+            Student.objects.filter(email__endswith='@' + SEED_EMAIL_DOMAIN).order_by('id').values_list('id', flat=True)[:50]
+        )
+        if not self.student_ids:
+            raise ValueError('Seed some students before benchmarking routes.')
+        self.total = Student.objects.count()
+        self.batch = EmailBatch.objects.create(subject='Benchmark', message='Benchmark', created_by=user)
+        self.thumbnail = default_storage.save('student_thumbs/route-benchmark.jpg', ContentFile(tiny_jpeg()))
+        # Queued jobs stay queued: only the enqueueing request is measured.
+        # The rollups are refreshed once here instead of by a thread.
+        self.no_job_worker = override_settings(STUDENT_JOB_WORKER_THREAD=False, STUDENT_ROLLUP_THREAD=False)
+        self.no_job_worker.enable()
+        self.job = enqueue_export(user, student_ids=self.student_ids)
+        job = claim_next()
+        run_job(job.id, job.claim)
+        refresh_rollups()
+        self._counter = itertools.count()
+        self._lock = threading.Lock()
+
+    def close(self):
+        self.batch.delete()
+        default_storage.delete(self.thumbnail)
+        for job in Job.objects.filter(created_by=self.user):
+            job.delete()
+        self.no_job_worker.disable()
+
+    def unique(self):
+        with self._lock:
+            return f'{next(self._counter)}-{get_random_string(8).lower()}'
+
+    def email(self):
+        return f'route.{self.unique()}@{SEED_EMAIL_DOMAIN}'
+
+    def throwaway(self, count=1):
+        students = Student.objects.bulk_create([
+            Student(first_name='Route', last_name='Benchmark', email=self.email(), gpa='3.00') for _ in range(count)
+        ])
+        return [s.id for s in Student.objects.filter(email__in=[s.email for s in students])]
+
+    def form_data(self, **overrides):
+        data = {'first_name': 'Route', 'last_name': 'Benchmark', 'email': self.email(), 'gpa': '3.25',
+                'phone': '', 'address': '', 'date_of_birth': '', 'enrollment_date': '2020-09-01'}
+        data.update(overrides)
+        return data
+
+    def import_file(self):
+        lines = ['first_name,last_name,email,phone,address,gpa,date_of_birth,enrollment_date']
+        lines += [f'Route,Import,{self.email()},,,3.10,,2021-09-01' for _ in range(IMPORT_ROWS)]
+        return SimpleUploadedFile('students.csv', '\n'.join(lines).encode('utf-8'), content_type='text/csv')
+
+
+def tiny_jpeg():
+    try:
+        from PIL import Image
+    except ImportError:
+        return b''
+    output = io.BytesIO()
+    Image.new('RGB', (16, 16), 'gray').save(output, format='JPEG')
+    return output.getvalue()
+
+
+def student_form_data(student_id):
+    data = model_to_dict(Student.objects.get(id=student_id), exclude=['id', 'profile_picture', 'profile_thumbnails'])
+    return {k: '' if v is None else v for k, v in data.items()}
+
+
+SCENARIOS = [
+    Scenario('login_page', 'login', lambda ctx: request('GET', reverse('login'), anonymous=True)),
+    Scenario('logout', 'logout', lambda ctx: request('POST', reverse('logout'), {}, anonymous=True)),
+    Scenario('register_page', 'register', lambda ctx: request('GET', reverse('register'), anonymous=True)),
+    Scenario('list', 'student_list', lambda ctx: request('GET', reverse('student_list'))),
+    Scenario('list_search', 'student_list', lambda ctx: request('GET', reverse('student_list') + '?q=khan')),
+    Scenario('list_filtered', 'student_list', lambda ctx: request(
+        'GET', reverse('student_list') + '?min_gpa=2.5&max_gpa=3.8&performance=excellent&sort=-gpa')),
+    Scenario('list_deep_page', 'student_list', lambda ctx: request(
+        'GET', reverse('student_list') + f'?sort=last_name&page={max(1, ctx.total // 20)}')),
+    Scenario('list_keyset', 'student_list', lambda ctx: request(
+        'GET', reverse('student_list') + '?pagination=keyset&sort=last_name')),
+    Scenario('create_form', 'student_create', lambda ctx: request('GET', reverse('student_create'))),
+    Scenario('create', 'student_create', lambda ctx: request('POST', reverse('student_create'), ctx.form_data())),
+    Scenario('update_form', 'student_update', lambda ctx: request(
+        'GET', reverse('student_update', args=[ctx.student_ids[0]]))),
+    Scenario('update', 'student_update', lambda ctx: request(
+        'POST', reverse('student_update', args=[ctx.student_ids[1]]), student_form_data(ctx.student_ids[1]))),
+    Scenario('delete_confirm', 'student_delete', lambda ctx: request(
+        'GET', reverse('student_delete', args=[ctx.student_ids[0]]))),
+    Scenario('delete', 'student_delete', lambda ctx: request(
+        'POST', reverse('student_delete', args=ctx.throwaway()), {})),
+    Scenario('detail', 'student_detail', lambda ctx: request(
+        'GET', reverse('student_detail', args=[ctx.student_ids[2]]))),
+    Scenario('thumbnail', 'student_thumbnail', lambda ctx: request(
+        'GET', reverse('student_thumbnail', args=[ctx.thumbnail.rsplit('/', 1)[-1]]))),
+    Scenario('export', 'export_csv', lambda ctx: request('GET', reverse('export_csv'))),
+    Scenario('export_gzip', 'export_csv', lambda ctx: request('GET', reverse('export_csv') + '?gzip=1')),
+    Scenario('import_form', 'import_csv', lambda ctx: request('GET', reverse('import_csv'))),
+    Scenario('import', 'import_csv', lambda ctx: request(
+        'POST', reverse('import_csv'), {'csv_file': ctx.import_file(), 'mode': 'create'})),
+    Scenario('import_report', 'import_error_report', lambda ctx: request('GET', reverse('import_error_report'))),
+    Scenario('export_job', 'export_job', lambda ctx: request('POST', reverse('export_job'), {'gzip': '1'})),
+    Scenario('job_page', 'job_detail', lambda ctx: request('GET', reverse('job_detail', args=[ctx.job.id]))),
+    Scenario('job_status', 'job_detail', lambda ctx: request(
+        'GET', reverse('job_detail', args=[ctx.job.id]) + '?format=json')),
+    Scenario('job_download', 'job_download', lambda ctx: request('GET', reverse('job_download', args=[ctx.job.id]))),
+    Scenario('bulk_delete', 'bulk_delete', lambda ctx: request(
+        'POST', reverse('bulk_delete'), {'student_ids': ctx.throwaway(BULK_ROWS)})),
+    Scenario('bulk_export', 'bulk_export', lambda ctx: request(
+        'POST', reverse('bulk_export'), {'student_ids': ctx.student_ids})),
+    Scenario('bulk_edit', 'bulk_edit', lambda ctx: request(
+        'POST', reverse('bulk_edit'), {'student_ids': ctx.student_ids[:BULK_ROWS], 'phone_action': 'set',
+                                       'phone': '555', 'apply': '1'})),
+    Scenario('bulk_email_compose', 'bulk_email', lambda ctx: request(
+        'POST', reverse('bulk_email'), {'student_ids': ctx.student_ids})),
+    Scenario('send_email_form', 'send_email', lambda ctx: request(
+        'GET', reverse('send_email', args=[ctx.student_ids[0]]))),
+    Scenario('email_batch', 'email_batch_detail', lambda ctx: request(
+        'GET', reverse('email_batch_detail', args=[ctx.batch.id]))),
+    Scenario('email_batch_json', 'email_batch_detail', lambda ctx: request(
+        'GET', reverse('email_batch_detail', args=[ctx.batch.id]) + '?format=json')),
+    Scenario('chart_data', 'chart_data', lambda ctx: request('GET', reverse('chart_data'))),
+    Scenario('enrollment_trend', 'enrollment_trend_data', lambda ctx: request('GET', reverse('enrollment_trend_data'))),
+    Scenario('cohort_gpa', 'cohort_gpa_data', lambda ctx: request('GET', reverse('cohort_gpa_data'))),
+    Scenario('age_distribution', 'age_distribution_data', lambda ctx: request('GET', reverse('age_distribution_data'))),
+    Scenario('api_list', 'api_students', lambda ctx: request('GET', reverse('api_students') + '?per_page=50')),
+    Scenario('api_create', 'api_students', lambda ctx: json_request(
+        'POST', reverse('api_students'), {'first_name': 'Route', 'last_name': 'Api', 'email': ctx.email(), 'gpa': '3.00'})),
+    Scenario('api_bulk_update', 'api_students_bulk', lambda ctx: json_request(
+        'PATCH', reverse('api_students_bulk'), [{'id': i, 'phone': '555'} for i in ctx.student_ids[:BULK_ROWS]])),
+    Scenario('api_changes', 'api_student_changes', lambda ctx: request(
+        'GET', reverse('api_student_changes') + '?limit=500')),
+    Scenario('api_changes_csv', 'api_student_changes', lambda ctx: request(
+        'GET', reverse('api_student_changes') + '?limit=500&format=csv')),
+    Scenario('api_detail', 'api_student', lambda ctx: request('GET', reverse('api_student', args=[ctx.student_ids[3]]))),
+    Scenario('request_metrics', 'request_metrics', lambda ctx: request('GET', reverse('request_metrics'))),
+    Scenario('print_list', 'print_student_list', lambda ctx: request('GET', reverse('print_student_list'))),
+    Scenario('print_list_pdf', 'print_student_list_pdf', lambda ctx: request('GET', reverse('print_student_list_pdf'))),
+    Scenario('print_detail', 'print_student_detail', lambda ctx: request(
+        'GET', reverse('print_student_detail', args=[ctx.student_ids[4]]))),
+]
+
+
+def missing_routes(scenarios=SCENARIOS):
+    from . import urls
+
+    return sorted({p.name for p in urls.urlpatterns if p.name} - {s.url_name for s in scenarios})
+
+
+def default_host():
+    hosts = [h for h in settings.ALLOWED_HOSTS if h not in ('*', '') and not h.startswith('.')]
+    return hosts[0] if hosts else 'localhost'
+
+
+def peak_rss_mb():
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is in bytes on macOS and kilobytes elsewhere.
+    return round(peak / (1024 * 1024 if sys.platform == 'darwin' else 1024), 1)
+
+
+class ClientDriver:
+    name = 'client'
+
+    def __init__(self, user, host):
+        self.user = user
+        self.host = host
+
+    def session(self, anonymous=False):
+        client = Client(HTTP_HOST=self.host)
+        if not anonymous:
+            client.force_login(self.user)
+        return client
+
+    def send(self, client, req):
+        method = getattr(client, req.method.lower())
+        if req.data is None:
+            response = method(req.path)
+        elif req.content_type == MULTIPART_CONTENT:
+            response = method(req.path, req.data)
+        else:
+            response = method(req.path, req.data, content_type=req.content_type)
+        if response.streaming:
+            size = sum(len(chunk) for chunk in response.streaming_content)
+        else:
+            size = len(response.content)
+        response.close()
+        return response.status_code, size
+
+
+class WSGIDriver:
+    # Real HTTP against a threaded local server running the project's WSGI app.
+    name = 'wsgi'
+
+    def __init__(self, user, host):
+        self.user = user
+        self.host = host
+        self.server = None
+
+    def start(self):
+        from django.core.servers.basehttp import ThreadedWSGIServer, WSGIRequestHandler
+        from django.core.wsgi import get_wsgi_application
+
+        class QuietHandler(WSGIRequestHandler):
+            def log_message(self, *args):
+                pass
+
+        self.server = ThreadedWSGIServer(('127.0.0.1', 0), QuietHandler, allow_reuse_address=True)
+        self.server.set_app(get_wsgi_application())
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+
+    def stop(self):
+        if self.server is not None:
+            self.server.shutdown()
+            self.server.server_close()
+
+    def session(self, anonymous=False):
+        csrf_secret = get_random_string(32)
+        cookies = {'csrftoken': csrf_secret}
+        if not anonymous:
+            client = Client(HTTP_HOST=self.host)
+            client.force_login(self.user)
+            cookies[settings.SESSION_COOKIE_NAME] = client.cookies[settings.SESSION_COOKIE_NAME].value
+        return {
+            'Host': self.host,
+            'Cookie': '; '.join(f'{k}={v}' for k, v in cookies.items()),
+            'X-CSRFToken': csrf_secret,
+        }
+
+    def send(self, headers, req):
+        headers = dict(headers)
+        body = None
+        if req.data is not None:
+            if req.content_type == MULTIPART_CONTENT:
+                body = encode_multipart(BOUNDARY, req.data)
+            else:
+                body = req.data.encode('utf-8')
+            headers['Content-Type'] = req.content_type
+        conn = http.client.HTTPConnection(*self.server.server_address, timeout=300)
+        try:
+            conn.request(req.method, req.path, body=body, headers=headers)
+            response = conn.getresponse()
+            size = len(response.read())
+            return response.status, size
+        finally:
+            conn.close()
+
+
+def reload_urlconf():
+    # students/urls.py picks sync or async views when it is imported.
+    from . import urls
+
+    importlib.reload(urls)
+    importlib.reload(importlib.import_module(settings.ROOT_URLCONF))
+    clear_url_caches()
+
+
+class ASGIDriver:
+    # The project's ASGI request path in-process, with STUDENT_ASYNC_VIEWS
+    # on: concurrent workers are tasks on one event loop, and each request
+    # gets its own ThreadSensitiveContext as under an ASGI server.
+    name = 'asgi'
+    asynchronous = True
+
+    def __init__(self, user, host):
+        self.user = user
+        self.host = host
+        # AsyncClient always sends Host: testserver.
+        self.async_views = override_settings(
+            STUDENT_ASYNC_VIEWS=True, ALLOWED_HOSTS=[*settings.ALLOWED_HOSTS, host, 'testserver'],
+        )
+
+    def start(self):
+        self.async_views.enable()
+        reload_urlconf()
+
+    def stop(self):
+        self.async_views.disable()
+        reload_urlconf()
+
+    def session(self, anonymous=False):
+        client = AsyncClient()
+        if not anonymous:
+            client.force_login(self.user)
+        return client
+
+    async def send(self, client, req):
+        method = getattr(client, req.method.lower())
+        async with ThreadSensitiveContext():
+            if req.data is None:
+                response = await method(req.path)
+            elif req.content_type == MULTIPART_CONTENT:
+                response = await method(req.path, req.data)
+            else:
+                response = await method(req.path, req.data, content_type=req.content_type)
+            if not response.streaming:
+                size = len(response.content)
+            elif response.is_async:
+                size = 0
+                async for chunk in response.streaming_content:
+                    size += len(chunk)
+            else:
+                size = await sync_to_async(lambda: sum(len(chunk) for chunk in response.streaming_content))()
+        return response.status_code, size
+
+
+def run_scenario(driver, scenario, ctx, requests, concurrency):
+    # Untimed warm-up that also counts the queries of one request.
+    warmup = scenario.build(ctx)
+    client = ClientDriver(ctx.user, driver.host)
+    session = client.session(warmup.anonymous)
+    queries = RequestMetrics()
+    with connection.execute_wrapper(queries):
+        client.send(session, warmup)
+
+    latencies, statuses, sizes = [], Counter(), []
+    lock = threading.Lock()
+
+    def measure(start, status, size):
+        elapsed = (time.perf_counter() - start) * 1000
+        with lock:
+            latencies.append(elapsed)
+            statuses[status] += 1
+            sizes.append(size)
+
+    def work(count):
+        session = None
+        try:
+            for _ in range(count):
+                req = scenario.build(ctx)
+                if session is None:
+                    session = driver.session(req.anonymous)
+                start = time.perf_counter()
+                try:
+                    status, size = driver.send(session, req)
+                except Exception as e:
+                    status, size = type(e).__name__, 0
+                measure(start, status, size)
+        finally:
+            if threading.current_thread() is not threading.main_thread():
+                connections.close_all()
+
+    async def async_work(count):
+        session = None
+        for _ in range(count):
+            req = await sync_to_async(scenario.build)(ctx)
+            if session is None:
+                session = await sync_to_async(driver.session)(req.anonymous)
+            start = time.perf_counter()
+            try:
+                status, size = await driver.send(session, req)
+            except Exception as e:
+                status, size = type(e).__name__, 0
+            measure(start, status, size)
+
+    async def run_tasks(shares):
+        await asyncio.gather(*[async_work(share) for share in shares])
+        await sync_to_async(connections.close_all)()
+
+    shares = [requests // concurrency + (1 if i < requests % concurrency else 0) for i in range(concurrency)]
+    shares = [share for share in shares if share]
+    started = time.perf_counter()
+    if getattr(driver, 'asynchronous', False):
+        asyncio.run(run_tasks(shares))
+    elif len(shares) == 1:
+        work(shares[0])
+    else:
+        with ThreadPoolExecutor(max_workers=len(shares)) as pool:
+            list(pool.map(work, shares))
+    wall = time.perf_counter() - started
+
+    errors = sum(count for status, count in statuses.items() if not isinstance(status, int) or status >= 500)
+    return {
+        'key': f'{driver.name}:{scenario.name}',
+        'driver': driver.name,
+        'scenario': scenario.name,
+        'url_name': scenario.url_name,
+        'requests': len(latencies),
+        'concurrency': len(shares),
+        'errors': errors,
+        'statuses': {str(status): count for status, count in sorted(statuses.items(), key=str)},
+        'rps': round(len(latencies) / wall, 2) if wall else None,
+        'p50_ms': round(percentile(latencies, 50), 3),
+        'p95_ms': round(percentile(latencies, 95), 3),
+        'p99_ms': round(percentile(latencies, 99), 3),
+        'queries': queries.queries,
+        'response_bytes': percentile(sizes, 50),
+        'peak_rss_mb': peak_rss_mb(),
+    }
+
+
+def get_bench_user():
+    user, created = User.objects.get_or_create(username=BENCH_USERNAME, defaults={'is_staff': True})
+    if created:
+        user.set_unusable_password()
+        user.save()
+    return user
+
+
+def compare(results, baseline, threshold):
+    # Regressions against a previous run: slower p95 or lower throughput by
+    # more than `threshold` (a fraction), any extra query, or new errors.
+    previous = {row['key']: row for row in baseline.get('results', [])}
+    regressions = []
+    for row in results:
+        old = previous.get(row['key'])
+        if old is None:
+            continue
+        if old['p95_ms'] and row['p95_ms'] > old['p95_ms'] * (1 + threshold):
+            regressions.append(f'{row["key"]}: p95 {old["p95_ms"]:.1f} ms -> {row["p95_ms"]:.1f} ms')
+        if old['rps'] and row['rps'] is not None and row['rps'] < old['rps'] * (1 - threshold):
+            regressions.append(f'{row["key"]}: {old["rps"]:.1f} -> {row["rps"]:.1f} requests/sec')
+        if row['queries'] > old['queries']:
+            regressions.append(f'{row["key"]}: {old["queries"]} -> {row["queries"]} queries')
+        if row['errors'] > old.get('errors', 0):
+            regressions.append(f'{row["key"]}: {row["errors"]} errors')
+    return regressions
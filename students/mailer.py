@@ -0,0 +1,189 @@
+"""
+Background delivery for bulk student email.
+
+Messages are queued as QueuedEmail rows and delivered by a worker, either
+the in-process daemon thread started after each enqueue or the
+``process_email_queue`` management command. A worker claims a batch of due
+rows, opens one SMTP connection for the whole batch, sends at no more
+than STUDENT_EMAIL_RATE_LIMIT messages per second, and retries failures
+with exponential backoff up to EMAIL_MAX_ATTEMPTS times.
+"""
+import logging
+import threading
+import time
+import uuid
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.mail import EmailMessage, get_connection
+from django.db import DatabaseError, close_old_connections, connection, transaction
+from django.db.models import Count, Min, Q
+from django.utils import timezone
+
+from .models import EmailBatch, QueuedEmail
+
+logger = logging.getLogger(__name__)
+
+EMAIL_BATCH_SIZE = getattr(settings, 'STUDENT_EMAIL_BATCH_SIZE', 50)
+EMAIL_RATE_LIMIT = getattr(settings, 'STUDENT_EMAIL_RATE_LIMIT', 10)
+EMAIL_WORKER_THREAD = getattr(settings, 'STUDENT_EMAIL_WORKER_THREAD', True)
+EMAIL_MAX_ATTEMPTS = 3
+EMAIL_RETRY_DELAY = 60
+EMAIL_CLAIM_TIMEOUT = 600
+ENQUEUE_CHUNK_SIZE = 1000
+
+_worker = None
+_worker_lock = threading.Lock()
+
+
+def enqueue_bulk_email(students, subject, message, user=None):
+    with transaction.atomic():
+        batch = EmailBatch.objects.create(subject=subject, message=message, created_by=user)
+        chunk = []
+        for student_id, email in students.order_by().values_list('id', 'email').iterator(chunk_size=ENQUEUE_CHUNK_SIZE):
+            chunk.append(QueuedEmail(batch=batch, student_id=student_id, to_email=email))
+            if len(chunk) >= ENQUEUE_CHUNK_SIZE:
+                QueuedEmail.objects.bulk_create(chunk)
+                chunk = []
+        QueuedEmail.objects.bulk_create(chunk)
+    transaction.on_commit(start_worker)
+    return batch
+
+
+def batch_status(batch):
+    counts = batch.emails.aggregate(
+        total=Count('id'),
+        pending=Count('id', filter=Q(status__in=[QueuedEmail.PENDING, QueuedEmail.SENDING])),
+        sent=Count('id', filter=Q(status=QueuedEmail.SENT)),
+        failed=Count('id', filter=Q(status=QueuedEmail.FAILED)),
+    )
+    counts['done'] = counts['pending'] == 0
+    return counts
+
+
+def due_emails(now):
+    # Pending rows whose backoff has passed, plus rows whose claim expired
+    # because the worker sending them died.
+    return QueuedEmail.objects.filter(
+        status__in=[QueuedEmail.PENDING, QueuedEmail.SENDING], next_attempt_at__lte=now
+    )
+
+
+def claim_due(limit):
+    now = timezone.now()
+    token = uuid.uuid4().hex
+    ids = list(due_emails(now).order_by('next_attempt_at', 'id').values_list('id', flat=True)[:limit])
+    if not ids:
+        return []
+    # Re-check the condition in the UPDATE so two workers never claim the same row.
+    due_emails(now).filter(id__in=ids).update(
+        status=QueuedEmail.SENDING,
+        claim=token,
+        next_attempt_at=now + timedelta(seconds=EMAIL_CLAIM_TIMEOUT),
+    )
+    return list(QueuedEmail.objects.filter(claim=token, status=QueuedEmail.SENDING).select_related('batch'))
+
+
+def process_queue(batch_size=EMAIL_BATCH_SIZE, rate_limit=EMAIL_RATE_LIMIT):
+    # Sends one claimed batch and returns how many messages were attempted.
+    emails = claim_due(batch_size)
+    if not emails:
+        return 0
+
+    from_email = getattr(settings, 'DEFAULT_FROM_EMAIL', 'nlabibs2003@gmail.com')
+    handled = 0
+    unrecorded = []
+    started = time.monotonic()
+    try:
+        with get_connection() as mail_connection:
+            for email in emails:
+                message = EmailMessage(email.batch.subject, email.batch.message, from_email, [email.to_email])
+                try:
+                    mail_connection.send_messages([message])
+                except Exception as e:
+                    record_failure(email, e)
+                else:
+                    # Mark it right away so a crash later in the batch does not
+                    # send it again once the claim expires.
+                    if not record_sent(email):
+                        unrecorded.append(email)
+                handled += 1
+                if rate_limit:
+                    wait = handled / rate_limit - (time.monotonic() - started)
+                    if wait > 0:
+                        time.sleep(wait)
+    except Exception as e:
+        # The connection could not be opened (or closed): release the rows
+        # not handled yet as a failed attempt, so a dead server gives up.
+        for email in emails[handled:]:
+            record_failure(email, e)
+    for email in unrecorded:
+        # One more try once the batch is through; failing that, the row stays
+        # claimed (SENDING) rather than being retried as a failed send.
+        if not record_sent(email):
+            logger.error('Email %s to %s was sent but could not be marked sent; it stays claimed until %s',
+                         email.id, email.to_email, email.next_attempt_at)
+    return len(emails)
+
+
+def record_sent(email):
+    # True once the row is marked SENT. A database error here comes after
+    # the message went out, so it is logged, not treated as a send failure.
+    try:
+        QueuedEmail.objects.filter(id=email.id).update(
+            status=QueuedEmail.SENT, sent_at=timezone.now(), claim='', last_error=''
+        )
+    except DatabaseError:
+        logger.exception('Could not mark email %s as sent', email.id)
+        return False
+    return True
+
+
+def record_failure(email, error):
+    email.attempts += 1
+    email.last_error = str(error)
+    email.claim = ''
+    if email.attempts >= EMAIL_MAX_ATTEMPTS:
+        email.status = QueuedEmail.FAILED
+    else:
+        email.status = QueuedEmail.PENDING
+        email.next_attempt_at = timezone.now() + timedelta(seconds=EMAIL_RETRY_DELAY * 2 ** (email.attempts - 1))
+    email.save(update_fields=['attempts', 'last_error', 'claim', 'status', 'next_attempt_at'])
+
+
+def seconds_until_next_retry():
+    next_due = QueuedEmail.objects.filter(
+        status__in=[QueuedEmail.PENDING, QueuedEmail.SENDING]
+    ).aggregate(next_due=Min('next_attempt_at'))['next_due']
+    if next_due is None:
+        return None
+    return max(0.0, (next_due - timezone.now()).total_seconds())
+
+
+def start_worker():
+    global _worker
+    if not EMAIL_WORKER_THREAD:
+        return
+    with _worker_lock:
+        if _worker is not None and _worker.is_alive():
+            return
+        _worker = threading.Thread(target=run_worker, name='student-email-worker', daemon=True)
+        _worker.start()
+
+
+def run_worker(max_sleep=30):
+    global _worker
+    try:
+        while True:
+            close_old_connections()
+            if process_queue():
+                continue
+            with _worker_lock:
+                wait = seconds_until_next_retry()
+                if wait is None:
+                    # Exit under the lock so a concurrent start_worker() sees us gone.
+                    _worker = None
+                    return
+            time.sleep(min(wait, max_sleep))
+    finally:
+        connection.close()
@@ -0,0 +1,135 @@
+import json
+import platform
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.db.models import Q
+
+from students.loadtest import (
+    SCENARIOS, ASGIDriver, BenchContext, ClientDriver, WSGIDriver, compare, default_host, get_bench_user, missing_routes,
+    run_scenario,
+)
+from students.models import Student
+from students.seed import SEED_EMAIL_DOMAIN, delete_seeded_students, top_up_seeded_students
+
+DRIVERS = {'client': ClientDriver, 'wsgi': WSGIDriver, 'asgi': ASGIDriver}
+
+
+def dataset_size(value):
+    # Accepts plain numbers or 1k / 100k / 1m style sizes.
+    multipliers = {'k': 1000, 'm': 1000000}
+    value = value.strip().lower()
+    try:
+        if value[-1:] in multipliers:
+            return int(float(value[:-1]) * multipliers[value[-1]])
+        return int(value)
+    except ValueError:
+        raise CommandError(f'Invalid dataset size "{value}".')
+
+
+class Command(BaseCommand):
+    help = (
+        'Seed synthetic students and load-test every route in students/urls.py through the test client, '
+        'a local WSGI server or the ASGI handler with the async views.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--students', default='1k', help='Dataset size, e.g. 1000, 1k, 100k or 1m.')
+        parser.add_argument('--requests', type=int, default=50, help='Timed requests per scenario.')
+        parser.add_argument('--concurrency', type=int, default=1, help='Concurrent workers per scenario.')
+        parser.add_argument('--driver', action='append', choices=sorted(DRIVERS), help='Repeat for several; default: client.')
+        parser.add_argument('--scenario', action='append', help='Only run these scenario names (repeatable).')
+        parser.add_argument('--host', default=None, help='Host header to send (default: first ALLOWED_HOSTS entry).')
+        parser.add_argument('--output', help='Write results as JSON to this file.')
+        parser.add_argument('--baseline', help='JSON from an earlier run to compare against.')
+        parser.add_argument('--threshold', type=float, default=0.25,
+                            help='Allowed fractional p95/throughput regression against --baseline.')
+        parser.add_argument('--keep', action='store_true', help='Keep the seeded students for the next run.')
+
+    def handle(self, *args, **options):
+        missing = missing_routes()
+        if missing:
+            raise CommandError(f'No benchmark scenario for route(s): {", ".join(missing)}')
+        scenarios = SCENARIOS
+        if options['scenario']:
+            scenarios = [s for s in SCENARIOS if s.name in options['scenario']]
+            unknown = set(options['scenario']) - {s.name for s in scenarios}
+            if unknown:
+                raise CommandError(f'Unknown scenario(s): {", ".join(sorted(unknown))}')
+        baseline = None
+        if options['baseline']:
+            with open(options['baseline']) as f:
+                baseline = json.load(f)
+            for setting in ('students', 'requests', 'concurrency'):
+                value = dataset_size(options['students']) if setting == 'students' else options[setting]
+                if baseline.get(setting) != value:
+                    raise CommandError(f'Baseline ran with {setting}={baseline.get(setting)}, not {value}.')
+
+        # Top up an existing seeded dataset instead of rebuilding it.
+        size = dataset_size(options['students'])
+        started = time.perf_counter()
+        added = top_up_seeded_students(size)
+        if added:
+            self.stdout.write(f'Seeded {added} students on {connection.vendor} in {time.perf_counter() - started:.1f}s')
+
+        user = get_bench_user()
+        host = options['host'] or default_host()
+        ctx = BenchContext(user)
+        results = []
+        self.stdout.write(
+            f'{"driver:scenario":<32} {"req/s":>9} {"p50 ms":>9} {"p95 ms":>9} {"p99 ms":>9} {"qs":>5} {"errs":>5} {"rss MB":>8}'
+        )
+        try:
+            for driver_name in options['driver'] or ['client']:
+                driver = DRIVERS[driver_name](user, host)
+                if hasattr(driver, 'start'):
+                    driver.start()
+                try:
+                    for scenario in scenarios:
+                        row = run_scenario(driver, scenario, ctx, options['requests'], options['concurrency'])
+                        results.append(row)
+                        self.stdout.write(
+                            f'{row["key"]:<32} {row["rps"]:>9.1f} {row["p50_ms"]:>9.1f} {row["p95_ms"]:>9.1f} '
+                            f'{row["p99_ms"]:>9.1f} {row["queries"]:>5} {row["errors"]:>5} {row["peak_rss_mb"] or 0:>8.1f}'
+                        )
+                finally:
+                    if hasattr(driver, 'stop'):
+                        driver.stop()
+        finally:
+            ctx.close()
+            if not options['keep']:
+                delete_seeded_students()
+                user.delete()
+            else:
+                # Keep the dataset at its requested size for comparable runs.
+                Student.all_objects.filter(Q(email__startswith='route.') & Q(email__endswith='@' + SEED_EMAIL_DOMAIN)).delete()
+
+        drivers = list(dict.fromkeys(row['driver'] for row in results))
+        if len(drivers) > 1:
+            self.stdout.write('\nThroughput by driver (req/s):')
+            self.stdout.write(f'{"scenario":<24}' + ''.join(f'{name:>10}' for name in drivers))
+            by_key = {row['key']: row for row in results}
+            for scenario in scenarios:
+                self.stdout.write(f'{scenario.name:<24}' + ''.join(
+                    f'{by_key[f"{name}:{scenario.name}"]["rps"]:>10.1f}' for name in drivers
+                ))
+
+        report = {
+            'vendor': connection.vendor,
+            'python': platform.python_version(),
+            'students': size,
+            'requests': options['requests'],
+            'concurrency': options['concurrency'],
+            'results': results,
+        }
+        if options['output']:
+            with open(options['output'], 'w') as f:
+                json.dump(report, f, indent=2)
+            self.stdout.write(self.style.SUCCESS(f'Wrote {len(results)} results to {options["output"]}'))
+
+        if baseline is not None:
+            regressions = compare(results, baseline, options['threshold'])
+            if regressions:
+                raise CommandError('Performance regressions:\n  ' + '\n  '.join(regressions))
+            self.stdout.write(self.style.SUCCESS('No regressions against the baseline.'))
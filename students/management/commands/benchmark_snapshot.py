@@ -0,0 +1,80 @@
+import statistics
+import time
+import tracemalloc
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+
+from students.filters import filter_students
+from students.models import Student
+from students.printing import PRINT_FIELDS
+from students.seed import delete_seeded_students, top_up_seeded_students
+from students.snapshot import StudentSnapshot, snapshot_enabled
+from students.stats import compute_stats
+
+PERCENTILES = [10, 25, 50, 75, 90]
+
+
+def orm_percentiles(gpas):
+    # Nearest rank, as StudentSnapshot.percentiles() computes it.
+    gpas = sorted(gpas)
+    return [gpas[max(0, -(-len(gpas) * p // 100) - 1)] for p in PERCENTILES]
+
+
+class Command(BaseCommand):
+    help = 'Seed synthetic students and compare memory per row and report timings of the ORM and the columnar snapshot.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--students', type=int, default=10000, help='Number of synthetic students to seed.')
+        parser.add_argument('--repeat', type=int, default=5, help='Timed runs per report.')
+        parser.add_argument('--keep', action='store_true', help='Keep the seeded students afterwards.')
+
+    def handle(self, *args, **options):
+        if not snapshot_enabled():
+            raise CommandError('Set STUDENT_SNAPSHOT_ENABLED and install NumPy to benchmark the snapshot.')
+        self.stdout.write(f'Seeding up to {options["students"]} students on {connection.vendor}...')
+        added = top_up_seeded_students(options['students'])
+        self.stdout.write(f'Added {added}, reusing {options["students"] - added} kept from an earlier run.')
+        try:
+            self.report(options['repeat'])
+        finally:
+            if not options['keep']:
+                delete_seeded_students()
+
+    def report(self, repeat):
+        total = Student.objects.count()
+        tracemalloc.start()
+        instances = list(Student.objects.all())
+        orm_bytes = tracemalloc.get_traced_memory()[0]
+        tracemalloc.stop()
+        del instances
+        snapshot = StudentSnapshot.load()
+        self.stdout.write(f'{total} students: {orm_bytes / total:.0f} bytes/row as model instances, '
+                          f'{snapshot.nbytes / total:.0f} bytes/row in the snapshot')
+
+        reports = {
+            'print_rows': (
+                lambda: list(Student.objects.order_by('last_name', 'id')),
+                lambda: list(snapshot.rows(snapshot.order(snapshot.select(), 'last_name'), PRINT_FIELDS)),
+            ),
+            'gpa_range_count': (
+                lambda: filter_students(Student.objects.all(), min_gpa='2.5', max_gpa='3.2').count(),
+                lambda: len(snapshot.select(min_gpa='2.5', max_gpa='3.2')),
+            ),
+            'stats': (compute_stats, snapshot.stats),
+            'percentiles': (
+                lambda: orm_percentiles([s.gpa for s in Student.objects.all()]),
+                lambda: snapshot.percentiles(PERCENTILES),
+            ),
+        }
+        self.stdout.write(f'{"report":<16} {"orm ms":>10} {"snapshot ms":>12}')
+        for name, (orm, columnar) in reports.items():
+            self.stdout.write(f'{name:<16} {self.measure(orm, repeat):>10.2f} {self.measure(columnar, repeat):>12.2f}')
+
+    def measure(self, report, repeat):
+        timings = []
+        for _ in range(repeat):
+            started = time.perf_counter()
+            report()
+            timings.append((time.perf_counter() - started) * 1000)
+        return statistics.median(timings)
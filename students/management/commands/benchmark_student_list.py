@@ -0,0 +1,84 @@
+import json
+import statistics
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import connection
+
+from students.filters import filter_students
+from students.models import Student
+from students.pagination import SORT_FIELDS, keyset_page, seek
+from students.seed import delete_seeded_students, top_up_seeded_students
+
+FILTERS = {
+    'none': {},
+    'search': {'query': 'khan'},
+    'gpa_range': {'min_gpa': '2.5', 'max_gpa': '3.2'},
+    'excellent': {'performance': 'excellent'},
+    'needs_improvement': {'performance': 'needs_improvement'},
+}
+
+
+class Command(BaseCommand):
+    help = 'Seed synthetic students and time every student_list sort/filter/pagination combination with EXPLAIN output.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--students', type=int, default=10000, help='Number of synthetic students to seed.')
+        parser.add_argument('--repeat', type=int, default=5, help='Timed runs per combination.')
+        parser.add_argument('--per-page', type=int, default=10)
+        parser.add_argument('--deep-page', type=int, default=500, help='Page number used for the OFFSET comparison.')
+        parser.add_argument('--output', help='Write results as JSON to this file.')
+        parser.add_argument('--explain', action='store_true', help='Print EXPLAIN output for every combination.')
+        parser.add_argument('--keep', action='store_true', help='Keep the seeded students afterwards.')
+
+    def handle(self, *args, **options):
+        per_page = options['per_page']
+        self.stdout.write(f'Seeding up to {options["students"]} students on {connection.vendor}...')
+        added = top_up_seeded_students(options['students'])
+        self.stdout.write(f'Added {added}, reusing {options["students"] - added} kept from an earlier run.')
+        try:
+            results = []
+            for filter_name, params in FILTERS.items():
+                for field in SORT_FIELDS:
+                    for sort in (field, '-' + field):
+                        base = filter_students(Student.objects.all(), **params)
+                        offset = (options['deep_page'] - 1) * per_page
+                        cursor = keyset_page(base, sort, per_page).next_cursor
+                        cases = {
+                            'offset_first': base.order_by(sort)[:per_page],
+                            'offset_deep': base.order_by(sort)[offset:offset + per_page],
+                            'keyset_next': seek(base, sort, cursor)[0][:per_page + 1],
+                        }
+                        for case, queryset in cases.items():
+                            result = self.measure(filter_name, sort, case, queryset, options['repeat'])
+                            results.append(result)
+                            if options['explain']:
+                                self.stdout.write(f'-- {filter_name} {sort} {case}\n{result["explain"]}')
+        finally:
+            if not options['keep']:
+                delete_seeded_students()
+
+        self.stdout.write(f'{"filter":<18} {"sort":<18} {"case":<13} {"median ms":>10} {"max ms":>10}')
+        for row in results:
+            self.stdout.write(
+                f'{row["filter"]:<18} {row["sort"]:<18} {row["case"]:<13} {row["median_ms"]:>10.2f} {row["max_ms"]:>10.2f}'
+            )
+        if options['output']:
+            with open(options['output'], 'w') as f:
+                json.dump({'vendor': connection.vendor, 'students': options['students'], 'results': results}, f, indent=2)
+            self.stdout.write(self.style.SUCCESS(f'Wrote {len(results)} results to {options["output"]}'))
+
+    def measure(self, filter_name, sort, case, queryset, repeat):
+        timings = []
+        for _ in range(repeat):
+            started = time.perf_counter()
+            list(queryset.all())
+            timings.append((time.perf_counter() - started) * 1000)
+        return {
+            'filter': filter_name,
+            'sort': sort,
+            'case': case,
+            'median_ms': statistics.median(timings),
+            'max_ms': max(timings),
+            'explain': queryset.explain(),
+        }
@@ -0,0 +1,22 @@
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+
+from students.api import create_api_token
+
+
+class Command(BaseCommand):
+    help = 'Create an API token for a user and print its key, which is not stored and cannot be shown again.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('username')
+        parser.add_argument('--name', default='', help='What the token is for, e.g. the script using it.')
+
+    def handle(self, *args, **options):
+        User = get_user_model()
+        try:
+            user = User.objects.get(**{User.USERNAME_FIELD: options['username']})
+        except User.DoesNotExist:
+            raise CommandError(f'No user named {options["username"]}.')
+        token, key = create_api_token(user, options['name'])
+        self.stdout.write(self.style.SUCCESS(f'Created API token {token.id} for {user}.'))
+        self.stdout.write(f'Send it as "Authorization: Token {key}"')
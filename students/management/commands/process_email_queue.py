@@ -0,0 +1,25 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from students.mailer import process_queue
+
+
+class Command(BaseCommand):
+    help = 'Deliver queued bulk emails. Use --loop to keep running as a dedicated worker.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--loop', action='store_true', help='Keep polling for new messages.')
+        parser.add_argument('--interval', type=float, default=5.0, help='Seconds to wait when the queue is empty.')
+
+    def handle(self, *args, **options):
+        total = 0
+        while True:
+            processed = process_queue()
+            total += processed
+            if processed:
+                continue
+            if not options['loop']:
+                break
+            time.sleep(options['interval'])
+        self.stdout.write(self.style.SUCCESS(f'Processed {total} queued emails.'))
@@ -0,0 +1,17 @@
+from django.core.management.base import BaseCommand
+
+from students.jobs import JOB_WORKERS, process_jobs
+
+
+class Command(BaseCommand):
+    help = 'Run queued import/export jobs in a process pool. Use --loop to keep running as a dedicated worker.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--workers', type=int, default=JOB_WORKERS,
+                            help='Worker processes; 0 runs jobs one at a time in this process.')
+        parser.add_argument('--loop', action='store_true', help='Keep polling for new jobs.')
+        parser.add_argument('--interval', type=float, default=2.0, help='Seconds to wait when no job is queued.')
+
+    def handle(self, *args, **options):
+        started = process_jobs(options['workers'], loop=options['loop'], interval=options['interval'])
+        self.stdout.write(self.style.SUCCESS(f'Ran {started} jobs.'))
@@ -0,0 +1,23 @@
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from students.deletion import PURGE_AFTER_DAYS, PURGE_BATCH_SIZE, PURGE_PAUSE, purge_students
+
+
+class Command(BaseCommand):
+    help = 'Permanently delete students soft-deleted more than --days ago, with their profile pictures, in throttled chunks.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--days', type=float, default=PURGE_AFTER_DAYS, help='Only purge students deleted this many days ago or earlier.')
+        parser.add_argument('--batch-size', type=int, default=PURGE_BATCH_SIZE, help='Students deleted per transaction.')
+        parser.add_argument('--pause', type=float, default=PURGE_PAUSE, help='Minimum seconds to sleep between chunks.')
+
+    def handle(self, *args, **options):
+        older_than = timezone.now() - timedelta(days=options['days'])
+        purged = purge_students(
+            older_than, options['batch_size'], options['pause'],
+            on_chunk=lambda total: self.stdout.write(f'Purged {total} students...'),
+        )
+        self.stdout.write(self.style.SUCCESS(f'Purged {purged} students deleted before {older_than:%Y-%m-%d %H:%M}.'))
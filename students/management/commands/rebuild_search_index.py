@@ -0,0 +1,26 @@
+from django.core.management.base import BaseCommand
+
+from students.models import Student
+from students.search import index_students, uses_token_index
+
+BATCH_SIZE = 2000
+
+
+class Command(BaseCommand):
+    help = 'Rebuild the StudentSearchToken table used by the token search backend.'
+
+    def handle(self, *args, **options):
+        if not uses_token_index():
+            self.stdout.write('The active search backend does not use the token table; nothing to do.')
+            return
+        students = Student.objects.order_by('id').only('id', 'first_name', 'last_name', 'email')
+        last_id = 0
+        indexed = 0
+        while True:
+            batch = list(students.filter(id__gt=last_id)[:BATCH_SIZE])
+            if not batch:
+                break
+            index_students(batch)
+            indexed += len(batch)
+            last_id = batch[-1].id
+        self.stdout.write(self.style.SUCCESS(f'Indexed {indexed} students.'))
@@ -0,0 +1,23 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from students.rollups import ROLLUP_REFRESH_INTERVAL, rebuild_rollups, refresh_rollups
+
+
+class Command(BaseCommand):
+    help = 'Bring the enrollment/age rollup tables up to date from the change log. Use --loop to keep refreshing.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--rebuild', action='store_true', help='Recount every student from scratch first.')
+        parser.add_argument('--loop', action='store_true', help='Keep refreshing every --interval seconds.')
+        parser.add_argument('--interval', type=float, default=ROLLUP_REFRESH_INTERVAL, help='Seconds between refreshes.')
+
+    def handle(self, *args, **options):
+        if options['rebuild']:
+            self.stdout.write(f'Rebuilt rollups from {rebuild_rollups()} students.')
+        while True:
+            self.stdout.write(self.style.SUCCESS(f'Re-counted {refresh_rollups()} changed students.'))
+            if not options['loop']:
+                return
+            time.sleep(options['interval'])
@@ -0,0 +1,64 @@
+import json
+import sys
+
+from django.core.management.base import BaseCommand, CommandError
+
+from students.caching import cache_stats
+from students.instrumentation import get_records, summarize
+
+
+class Command(BaseCommand):
+    help = (
+        'Print p50/p95/p99 request timings and query counts per URL name. The ring buffer lives '
+        'in each web process, so pass a JSON file saved from /metrics/?records=1 (or - for stdin).'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('input', nargs='?', help='JSON saved from /metrics/?records=1, or - to read stdin.')
+        parser.add_argument('--sort', default='duration_ms_p95', help='Summary column to sort by, descending.')
+
+    def handle(self, *args, **options):
+        records, fragment_cache = self.load(options['input'])
+        if fragment_cache:
+            self.stdout.write(f'{"fragment":<28} {"hits":>8} {"misses":>8} {"hit ratio":>10}')
+            for name, row in fragment_cache.items():
+                self.stdout.write(f'{name:<28} {row["hits"]:>8} {row["misses"]:>8} {row["hit_ratio"]:>10.1%}')
+            self.stdout.write('')
+        if not records:
+            self.stdout.write('No requests recorded.')
+            return
+        summary = summarize(records)
+        if not all(options['sort'] in row for row in summary.values()):
+            raise CommandError(f'Unknown sort column "{options["sort"]}".')
+
+        self.stdout.write(
+            f'{"url name":<28} {"reqs":>6} {"p50 ms":>9} {"p95 ms":>9} {"p99 ms":>9} '
+            f'{"q p50":>6} {"q max":>6} {"db p95":>9} {"tpl p95":>9} {"dups":>5}'
+        )
+        rows = sorted(summary.items(), key=lambda item: item[1][options['sort']] or 0, reverse=True)
+        for name, row in rows:
+            self.stdout.write(
+                f'{name:<28} {row["requests"]:>6} {row["duration_ms_p50"]:>9.1f} {row["duration_ms_p95"]:>9.1f} '
+                f'{row["duration_ms_p99"]:>9.1f} {row["queries_p50"]:>6} {row["max_queries"]:>6} '
+                f'{row["db_ms_p95"]:>9.1f} {row["template_ms_p95"]:>9.1f} {row["max_duplicate_queries"]:>5}'
+            )
+        for name, row in rows:
+            if row['max_duplicate_queries'] and row['most_repeated_sql']:
+                self.stdout.write(f'\n{name}: repeated query\n  {row["most_repeated_sql"]}')
+
+    def load(self, path):
+        if not path:
+            return get_records(), cache_stats()
+        try:
+            if path == '-':
+                data = json.load(sys.stdin)
+            else:
+                with open(path) as f:
+                    data = json.load(f)
+        except (OSError, ValueError) as e:
+            raise CommandError(f'Could not read metrics: {e}')
+        if isinstance(data, dict):
+            if 'records' not in data:
+                raise CommandError('Input has no "records"; save /metrics/?records=1 instead.')
+            return data['records'], data.get('fragment_cache', {})
+        return data, {}
@@ -0,0 +1,37 @@
+# Generated by Django 6.0 on 2026-10-18 08:18
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('students', '0002_alter_student_options_student_address_and_more'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='student',
+            index=models.Index(fields=['created_at', 'id'], name='student_created_id_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='student',
+            index=models.Index(fields=['updated_at', 'id'], name='student_updated_id_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='student',
+            index=models.Index(fields=['last_name', 'id'], name='student_last_name_id_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='student',
+            index=models.Index(fields=['first_name', 'id'], name='student_first_name_id_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='student',
+            index=models.Index(fields=['gpa', 'id'], name='student_gpa_id_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='student',
+            index=models.Index(fields=['enrollment_date', 'id'], name='student_enrolled_id_idx'),
+        ),
+    ]
@@ -0,0 +1,38 @@
+# Generated by Django 6.0 on 2026-10-18 08:20
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+def create_fulltext_index(apps, schema_editor):
+    if schema_editor.connection.vendor == 'mysql':
+        schema_editor.execute(
+            'CREATE FULLTEXT INDEX student_fulltext_idx ON students_student (first_name, last_name, email)'
+        )
+
+
+def drop_fulltext_index(apps, schema_editor):
+    if schema_editor.connection.vendor == 'mysql':
+        schema_editor.execute('DROP INDEX student_fulltext_idx ON students_student')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('students', '0003_student_list_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='StudentSearchToken',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('token', models.CharField(max_length=50)),
+                ('student', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='search_tokens', to='students.student')),
+            ],
+            options={
+                'unique_together': {('token', 'student')},
+            },
+        ),
+        migrations.RunPython(create_fulltext_index, drop_fulltext_index),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 6.0 on 2026-10-18 08:31
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('students', '0005_email_queue'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='student',
+            name='profile_thumbnails',
+            field=models.JSONField(blank=True, default=dict, editable=False),
+        ),
+    ]
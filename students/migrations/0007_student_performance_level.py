@@ -0,0 +1,23 @@
+# Generated by Django 6.0 on 2026-10-18 08:38
+
+from decimal import Decimal
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('students', '0006_student_profile_thumbnails'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='student',
+            name='performance_level',
+            field=models.GeneratedField(db_persist=True, expression=models.Case(models.When(gpa__gte=Decimal('3.5'), then=models.Value('excellent')), models.When(gpa__gte=Decimal('3.0'), then=models.Value('good')), models.When(gpa__gte=Decimal('2.0'), then=models.Value('average')), default=models.Value('poor')), output_field=models.CharField(choices=[('excellent', 'Excellent'), ('good', 'Good'), ('average', 'Average'), ('poor', 'Poor')], max_length=10)),
+        ),
+        migrations.AddIndex(
+            model_name='student',
+            index=models.Index(fields=['performance_level', 'created_at', 'id'], name='student_perf_created_id_idx'),
+        ),
+    ]
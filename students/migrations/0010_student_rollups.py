@@ -0,0 +1,43 @@
+# Generated by Django 6.0 on 2026-10-18 16:40
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('students', '0009_student_change'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='RollupMember',
+            fields=[
+                ('student_id', models.BigIntegerField(primary_key=True, serialize=False)),
+                ('enrolled_month', models.CharField(blank=True, max_length=7)),
+                ('birth_month', models.CharField(blank=True, max_length=7)),
+                ('gpa', models.DecimalField(decimal_places=2, max_digits=4)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='RollupState',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('cursor', models.BigIntegerField(default=0)),
+                ('refreshed_at', models.DateTimeField(blank=True, null=True)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='StudentRollup',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('dimension', models.CharField(choices=[('enrolled_month', 'Enrollment month'), ('birth_month', 'Birth month')], max_length=20)),
+                ('bucket', models.CharField(blank=True, max_length=7)),
+                ('students', models.PositiveIntegerField(default=0)),
+                ('gpa_sum', models.DecimalField(decimal_places=2, default=0, max_digits=14)),
+            ],
+            options={
+                'unique_together': {('dimension', 'bucket')},
+            },
+        ),
+    ]
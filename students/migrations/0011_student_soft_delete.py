@@ -0,0 +1,22 @@
+# Generated by Django 6.0 on 2026-10-18 12:10
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('students', '0010_student_rollups'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='student',
+            name='deleted_at',
+            field=models.DateTimeField(blank=True, editable=False, null=True),
+        ),
+        migrations.AddIndex(
+            model_name='student',
+            index=models.Index(fields=['deleted_at', 'created_at', 'id'], name='student_deleted_created_idx'),
+        ),
+    ]
@@ -1,6 +1,71 @@
+from decimal import Decimal
+
+from django.conf import settings
 from django.db import models
 from django.utils import timezone
 
+# GPA bands used by the model, list filters, stats and print views, best
+# first: (code, label, minimum GPA). Changing them needs a migration for
+# Student.performance_level.
+PERFORMANCE_LEVELS = [
+    ('excellent', 'Excellent', Decimal('3.5')),
+    ('good', 'Good', Decimal('3.0')),
+    ('average', 'Average', Decimal('2.0')),
+    ('poor', 'Poor', Decimal('0')),
+]
+PERFORMANCE_CHOICES = [(code, label) for code, label, _ in PERFORMANCE_LEVELS]
+PERFORMANCE_LABELS = dict(PERFORMANCE_CHOICES)
+
+
+def performance_for(gpa):
+    gpa = Decimal(str(gpa))
+    for code, _, minimum in PERFORMANCE_LEVELS[:-1]:
+        if gpa >= minimum:
+            return code
+    return PERFORMANCE_LEVELS[-1][0]
+
+
+def performance_case():
+    return models.Case(
+        *[models.When(gpa__gte=minimum, then=models.Value(code)) for code, _, minimum in PERFORMANCE_LEVELS[:-1]],
+        default=models.Value(PERFORMANCE_LEVELS[-1][0]),
+    )
+
+
+# Columns each view reads (see StudentQuerySet). The list also loads its
+# sort column, which keyset cursors are built from.
+LIST_FIELDS = ['id', 'first_name', 'last_name', 'email', 'gpa', 'performance_level']
+RECENT_FIELDS = ['id', 'first_name', 'last_name', 'created_at']
+PRINT_FIELDS = ['first_name', 'last_name', 'email', 'phone', 'gpa', 'performance_level', 'enrollment_date']
+
+
+class StudentQuerySet(models.QuerySet):
+    # Named column projections, so pages never fetch the address, picture
+    # or other columns they do not show. Their orderings are served by the
+    # Meta.indexes: (deleted_at, created_at, id) for the default list order
+    # and recent activity, (sort column, id) for the other list sorts and
+    # (last_name, id) for print.
+    def for_list(self, sort=None):
+        fields = LIST_FIELDS + ([sort.lstrip('-')] if sort else [])
+        return self.only(*fields)
+
+    def for_recent(self):
+        return self.only(*RECENT_FIELDS)
+
+    def for_print(self):
+        return self.values_list(*PRINT_FIELDS)
+
+    def for_export(self, fields):
+        return self.values_list(*fields)
+
+
+class ActiveStudentManager(models.Manager.from_queryset(StudentQuerySet)):
+    # Hides soft-deleted students (see deletion.py); Student.all_objects
+    # still sees them.
+    def get_queryset(self):
+        return super().get_queryset().filter(deleted_at__isnull=True)
+
+
 class Student(models.Model):
     # Basic Information
     first_name = models.CharField(max_length=50)
@@ -14,13 +79,52 @@ class Student(models.Model):
     date_of_birth = models.DateField(blank=True, null=True)
     enrollment_date = models.DateField(default=timezone.now)
     profile_picture = models.ImageField(upload_to='student_profiles/', blank=True, null=True)
+    # Derivative file names by size label, filled in by thumbnails.py
+    profile_thumbnails = models.JSONField(default=dict, blank=True, editable=False)
+    # Stored by the database from gpa, so bucket filters and counts use an index
+    performance_level = models.GeneratedField(
+        expression=performance_case(),
+        output_field=models.CharField(max_length=10, choices=PERFORMANCE_CHOICES),
+        db_persist=True,
+    )
     
     # Metadata
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
+    # Set when the student is deleted; the row is purged later.
+    deleted_at = models.DateTimeField(blank=True, null=True, editable=False)
+
+    objects = ActiveStudentManager()
+    all_objects = StudentQuerySet.as_manager()
 
     class Meta:
         ordering = ['-created_at']
+        # One (sort column, id) index per sort the list offers, so both
+        # ORDER BY and keyset seeks are served by an index scan. The gpa
+        # index also covers the GPA range filters.
+        indexes = [
+            models.Index(fields=['created_at', 'id'], name='student_created_id_idx'),
+            models.Index(fields=['updated_at', 'id'], name='student_updated_id_idx'),
+            models.Index(fields=['last_name', 'id'], name='student_last_name_id_idx'),
+            models.Index(fields=['first_name', 'id'], name='student_first_name_id_idx'),
+            models.Index(fields=['gpa', 'id'], name='student_gpa_id_idx'),
+            models.Index(fields=['enrollment_date', 'id'], name='student_enrolled_id_idx'),
+            # Performance filter with the default sort, and per-level counts
+            models.Index(fields=['performance_level', 'created_at', 'id'], name='student_perf_created_id_idx'),
+            # Live rows in the default order (deleted_at IS NULL is an
+            # equality prefix), and purge scans of rows deleted before a date
+            models.Index(fields=['deleted_at', 'created_at', 'id'], name='student_deleted_created_idx'),
+        ]
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # Remember the stored GPA and picture so save signals can adjust
+        # cached stats and clean up replaced media.
+        instance._loaded_gpa = instance.__dict__.get('gpa')
+        if 'profile_picture' in instance.__dict__:
+            instance._loaded_picture = str(instance.__dict__['profile_picture'] or '')
+        return instance
 
     def __str__(self):
         return f"{self.first_name} {self.last_name}"
@@ -30,10 +134,226 @@ class Student(models.Model):
         return f"{self.first_name} {self.last_name}"
     
     @property
-    def performance_level(self):
-        if self.gpa >= 3.5:
-            return "Excellent"
-        elif self.gpa >= 3.0:
-            return "Good"
-        else:
-            return "Needs Improvement"
\ No newline at end of file
+    def thumbnail_urls(self):
+        # URL per thumbnail size, falling back to the original upload until
+        # the derivatives have been generated.
+        from .thumbnails import THUMBNAIL_SIZES, thumbnail_url
+
+        if not self.profile_picture:
+            return {}
+        thumbnails = self.profile_thumbnails or {}
+        return {
+            label: thumbnail_url(thumbnails[label]) if label in thumbnails else self.profile_picture.url
+            for label in THUMBNAIL_SIZES
+        }
+
+    @property
+    def performance_label(self):
+        # From gpa rather than the generated column, which is only
+        # refreshed from the database after a save.
+        return PERFORMANCE_LABELS[performance_for(self.gpa)]
+
+
+class StudentSearchToken(models.Model):
+    # One row per lower-cased word of a student's names and email (see search.py).
+    student = models.ForeignKey(Student, on_delete=models.CASCADE, related_name='search_tokens')
+    token = models.CharField(max_length=50)
+
+    class Meta:
+        unique_together = [('token', 'student')]
+
+    def __str__(self):
+        return self.token
+
+
+class StudentChange(models.Model):
+    # One row per create, update or delete of a Student (see changes.py).
+    # The id is the cursor incremental exports resume from; student_id is
+    # a plain column so the entry outlives the row it describes.
+    CREATE = 'create'
+    UPDATE = 'update'
+    DELETE = 'delete'
+    ACTION_CHOICES = [
+        (CREATE, 'Create'),
+        (UPDATE, 'Update'),
+        (DELETE, 'Delete'),
+    ]
+
+    student_id = models.BigIntegerField()
+    action = models.CharField(max_length=10, choices=ACTION_CHOICES)
+    changed_at = models.DateTimeField(default=timezone.now)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['changed_at'], name='student_change_at_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.action} student {self.student_id}"
+
+
+class StudentRollup(models.Model):
+    # Student count and GPA sum per month of a date column, kept up to
+    # date from the change log by rollups.py.
+    ENROLLED_MONTH = 'enrolled_month'
+    BIRTH_MONTH = 'birth_month'
+    DIMENSION_CHOICES = [
+        (ENROLLED_MONTH, 'Enrollment month'),
+        (BIRTH_MONTH, 'Birth month'),
+    ]
+
+    dimension = models.CharField(max_length=20, choices=DIMENSION_CHOICES)
+    # 'YYYY-MM', or '' for students without the date
+    bucket = models.CharField(max_length=7, blank=True)
+    students = models.PositiveIntegerField(default=0)
+    gpa_sum = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+
+    class Meta:
+        unique_together = [('dimension', 'bucket')]
+
+    def __str__(self):
+        return f"{self.dimension} {self.bucket or '-'}: {self.students}"
+
+
+class RollupMember(models.Model):
+    # What each student is currently counted under in StudentRollup, so a
+    # change can take the old contribution back out.
+    student_id = models.BigIntegerField(primary_key=True)
+    enrolled_month = models.CharField(max_length=7, blank=True)
+    birth_month = models.CharField(max_length=7, blank=True)
+    gpa = models.DecimalField(max_digits=4, decimal_places=2)
+
+
+class RollupState(models.Model):
+    # Single row: the change log cursor the rollups have been brought up to.
+    cursor = models.BigIntegerField(default=0)
+    refreshed_at = models.DateTimeField(blank=True, null=True)
+
+
+
+class EmailBatch(models.Model):
+    # One "email selected students" request; its messages are QueuedEmail rows.
+    subject = models.CharField(max_length=200)
+    message = models.TextField()
+    created_by = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.SET_NULL, blank=True, null=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        ordering = ['-created_at']
+
+    def __str__(self):
+        return self.subject
+
+
+class QueuedEmail(models.Model):
+    PENDING = 'pending'
+    SENDING = 'sending'
+    SENT = 'sent'
+    FAILED = 'failed'
+    STATUS_CHOICES = [
+        (PENDING, 'Pending'),
+        (SENDING, 'Sending'),
+        (SENT, 'Sent'),
+        (FAILED, 'Failed'),
+    ]
+
+    batch = models.ForeignKey(EmailBatch, on_delete=models.CASCADE, related_name='emails')
+    student = models.ForeignKey(Student, on_delete=models.SET_NULL, blank=True, null=True)
+    to_email = models.EmailField()
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default=PENDING)
+    attempts = models.PositiveSmallIntegerField(default=0)
+    # When the row may next be picked up: retry backoff for pending rows,
+    # claim expiry for rows a worker is sending.
+    next_attempt_at = models.DateTimeField(default=timezone.now)
+    claim = models.CharField(max_length=32, blank=True)
+    last_error = models.TextField(blank=True)
+    sent_at = models.DateTimeField(blank=True, null=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['status', 'next_attempt_at'], name='queued_email_due_idx'),
+            models.Index(fields=['batch', 'status'], name='queued_email_batch_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.to_email} ({self.status})"
+
+
+class Job(models.Model):
+    # Long-running import/export work, run by the worker in jobs.py.
+    IMPORT = 'import'
+    EXPORT = 'export'
+    KIND_CHOICES = [
+        (IMPORT, 'Import'),
+        (EXPORT, 'Export'),
+    ]
+    QUEUED = 'queued'
+    RUNNING = 'running'
+    SUCCEEDED = 'succeeded'
+    FAILED = 'failed'
+    STATUS_CHOICES = [
+        (QUEUED, 'Queued'),
+        (RUNNING, 'Running'),
+        (SUCCEEDED, 'Succeeded'),
+        (FAILED, 'Failed'),
+    ]
+
+    kind = models.CharField(max_length=10, choices=KIND_CHOICES)
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default=QUEUED)
+    options = models.JSONField(default=dict, blank=True)
+    created_by = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.SET_NULL, blank=True, null=True)
+    # The uploaded CSV of an import
+    input_file = models.FileField(upload_to='job_uploads/', blank=True)
+    # The CSV of an export, or the error report of an import
+    result_file = models.FileField(upload_to='job_results/', blank=True)
+    # Progress in bytes of the upload (imports) or rows (exports)
+    processed = models.BigIntegerField(default=0)
+    total = models.BigIntegerField(default=0)
+    result = models.JSONField(default=dict, blank=True)
+    error = models.TextField(blank=True)
+    attempts = models.PositiveSmallIntegerField(default=0)
+    claim = models.CharField(max_length=32, blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    started_at = models.DateTimeField(blank=True, null=True)
+    finished_at = models.DateTimeField(blank=True, null=True)
+    # Touched with every progress update; a running job that stops
+    # updating is assumed dead and handed to another worker.
+    heartbeat_at = models.DateTimeField(blank=True, null=True)
+
+    class Meta:
+        ordering = ['-created_at']
+        indexes = [
+            models.Index(fields=['status', 'id'], name='job_status_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.get_kind_display()} #{self.id} ({self.status})"
+
+    @property
+    def finished(self):
+        return self.status in (self.SUCCEEDED, self.FAILED)
+
+    @property
+    def percent(self):
+        if self.status == self.SUCCEEDED:
+            return 100
+        if not self.total:
+            return 0
+        return min(99, int(100 * self.processed / self.total))
+
+
+
+class APIToken(models.Model):
+    # Credential for scripts using the JSON API (see api.py). Only a hash of
+    # the key is stored; the key itself is shown once, when it is created.
+    user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name='api_tokens')
+    name = models.CharField(max_length=100, blank=True)
+    key_hash = models.CharField(max_length=64, unique=True, editable=False)
+    created_at = models.DateTimeField(auto_now_add=True)
+    last_used_at = models.DateTimeField(blank=True, null=True)
+
+    class Meta:
+        ordering = ['-created_at']
+
+    def __str__(self):
+        return f"{self.user} ({self.name or self.id})"
@@ -0,0 +1,131 @@
+"""
+Keyset (seek) pagination for the student list.
+
+Instead of LIMIT/OFFSET, each page remembers the sort value and id of
+its first and last rows in an opaque cursor, and the next query seeks
+past them with a WHERE clause that an index on (sort column, id) can
+satisfy directly. Page 5,000 therefore costs the same as page 1.
+"""
+import base64
+import hashlib
+import json
+
+from django.core.cache import cache
+from django.core.paginator import Paginator
+from django.db.models import Q
+
+from .models import Student
+
+SORT_FIELDS = ['first_name', 'last_name', 'email', 'gpa', 'enrollment_date', 'created_at', 'updated_at']
+DEFAULT_SORT = '-created_at'
+DEFAULT_PER_PAGE = 10
+MAX_PER_PAGE = 100
+COUNT_CACHE_TIMEOUT = 60
+
+
+def clean_sort(sort):
+    if sort.lstrip('-') in SORT_FIELDS:
+        return sort
+    return DEFAULT_SORT
+
+
+def clean_per_page(per_page):
+    try:
+        per_page = int(per_page)
+    except (TypeError, ValueError):
+        return DEFAULT_PER_PAGE
+    return max(1, min(per_page, MAX_PER_PAGE))
+
+
+def encode_cursor(sort, student, direction):
+    field = sort.lstrip('-')
+    value = Student._meta.get_field(field).value_to_string(student)
+    payload = json.dumps({'s': sort, 'v': value, 'id': student.id, 'd': direction}, separators=(',', ':'))
+    return base64.urlsafe_b64encode(payload.encode('utf-8')).decode('ascii').rstrip('=')
+
+
+def decode_cursor(cursor, sort):
+    # Returns (value, id, direction), or None if the cursor is unusable.
+    try:
+        padded = cursor + '=' * (-len(cursor) % 4)
+        payload = json.loads(base64.urlsafe_b64decode(padded.encode('ascii')))
+        if payload['s'] != sort or payload['d'] not in ('next', 'prev'):
+            return None
+        field = Student._meta.get_field(sort.lstrip('-'))
+        return field.to_python(payload['v']), int(payload['id']), payload['d']
+    except Exception:
+        return None
+
+
+def cached_count(queryset):
+    key = 'students:count:' + hashlib.md5(str(queryset.query).encode('utf-8')).hexdigest()
+    return cache.get_or_set(key, queryset.count, COUNT_CACHE_TIMEOUT)
+
+
+async def aget_page(queryset, per_page, number, count=None):
+    # Paginator.get_page() for async views: the COUNT (unless `count` is
+    # given) and the page rows go through the async ORM, so rendering the
+    # page never queries.
+    paginator = Paginator(queryset, per_page)
+    paginator.count = await queryset.acount() if count is None else count
+    page = paginator.get_page(number)
+    page.object_list = [obj async for obj in page.object_list]
+    return page
+
+
+class KeysetPage:
+    def __init__(self, object_list, sort, has_next, has_previous):
+        self.object_list = object_list
+        self.sort = sort
+        self.has_next = has_next
+        self.has_previous = has_previous
+
+    def __iter__(self):
+        return iter(self.object_list)
+
+    def __len__(self):
+        return len(self.object_list)
+
+    @property
+    def next_cursor(self):
+        if self.has_next and self.object_list:
+            return encode_cursor(self.sort, self.object_list[-1], 'next')
+        return None
+
+    @property
+    def previous_cursor(self):
+        if self.has_previous and self.object_list:
+            return encode_cursor(self.sort, self.object_list[0], 'prev')
+        return None
+
+
+def seek(queryset, sort, cursor=None):
+    # Returns the ordered queryset positioned after the cursor, and whether
+    # it walks backwards (towards earlier pages).
+    field = sort.lstrip('-')
+    descending = sort.startswith('-')
+    position = decode_cursor(cursor, sort) if cursor else None
+    backwards = position is not None and position[2] == 'prev'
+
+    # Walking backwards is the same seek with the comparison and order flipped.
+    forward_desc = descending != backwards
+    if position is not None:
+        value, last_id, _ = position
+        op = 'lt' if forward_desc else 'gt'
+        queryset = queryset.filter(
+            Q(**{f'{field}__{op}': value}) | Q(**{field: value, f'id__{op}': last_id})
+        )
+    prefix = '-' if forward_desc else ''
+    return queryset.order_by(prefix + field, prefix + 'id'), position is not None, backwards
+
+
+def keyset_page(queryset, sort, per_page, cursor=None):
+    queryset, positioned, backwards = seek(queryset, sort, cursor)
+    rows = list(queryset[:per_page + 1])
+
+    has_more = len(rows) > per_page
+    rows = rows[:per_page]
+    if backwards:
+        rows.reverse()
+        return KeysetPage(rows, sort, has_next=True, has_previous=has_more)
+    return KeysetPage(rows, sort, has_next=has_more, has_previous=positioned)
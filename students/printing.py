@@ -0,0 +1,211 @@
+"""
+Print pipeline for the student list.
+
+Both outputs read only the printed columns, as tuples from
+``Student.objects.for_print()``, through the same unbuffered iterator
+as the CSV export, so no model instances (or the address column) are
+loaded.
+With STUDENT_SNAPSHOT_ENABLED they come sorted from the in-memory
+snapshot instead (see snapshot.py), without a query.
+
+* stream_print_html() renders print_student_list.html around a marker
+  and streams the table rows in chunks of PRINT_CHUNK_SIZE.
+* render_pdf() lays the same rows out on landscape A4 pages with the
+  standard Helvetica fonts. It has no third-party dependency; views
+  cache its output under the students table version.
+"""
+import zlib
+
+from django.http import StreamingHttpResponse
+from django.template.loader import render_to_string
+from django.utils.formats import date_format
+
+from .exporters import iter_queryset_rows
+from .models import PERFORMANCE_LABELS, PRINT_FIELDS, Student
+from .replicas import pin_database
+from .snapshot import print_rows, snapshot_enabled
+
+PRINT_CHUNK_SIZE = 500
+ROWS_MARKER = '<!-- print rows -->'
+
+
+def print_queryset():
+    return Student.objects.order_by('last_name', 'id').for_print()
+
+
+def print_source():
+    # Chosen in the view, so rows streamed later still come from its database.
+    if snapshot_enabled():
+        return print_rows(PRINT_FIELDS, 'last_name')
+    return iter_queryset_rows(pin_database(print_queryset()))
+
+
+def iter_print_rows(rows=None):
+    rows = print_source() if rows is None else rows
+    for number, row in enumerate(rows, start=1):
+        first_name, last_name, email, phone, gpa, level, enrolled = row
+        yield {
+            'number': number,
+            'name': f'{first_name} {last_name}',
+            'email': email,
+            'phone': phone or 'N/A',
+            'gpa': gpa,
+            'performance_level': level,
+            'performance_label': PERFORMANCE_LABELS[level],
+            'enrollment_date': date_format(enrolled, 'M d, Y') if enrolled else 'N/A',
+        }
+
+
+def iter_chunks(rows, size=PRINT_CHUNK_SIZE):
+    chunk = []
+    for row in rows:
+        chunk.append(row)
+        if len(chunk) >= size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+def stream_print_html(context, request=None):
+    page = render_to_string('print_student_list.html', context, request)
+    head, tail = page.split(ROWS_MARKER, 1)
+
+    rows = print_source()
+
+    def content():
+        yield head
+        empty = True
+        for chunk in iter_chunks(iter_print_rows(rows)):
+            empty = False
+            yield render_to_string('print_student_rows.html', {'rows': chunk})
+        if empty:
+            yield render_to_string('print_student_rows.html', {'rows': []})
+        yield tail
+
+    return StreamingHttpResponse(content(), content_type='text/html; charset=utf-8')
+
+
+# PDF
+
+PAGE_WIDTH, PAGE_HEIGHT = 842, 595  # A4 landscape, in points
+MARGIN = 36
+FONT_SIZE = 9
+ROW_HEIGHT = 14
+PDF_COLUMNS = [
+    ('#', 'number', 36),
+    ('Name', 'name', 150),
+    ('Email', 'email', 210),
+    ('Phone', 'phone', 100),
+    ('GPA', 'gpa', 45),
+    ('Performance', 'performance_label', 110),
+    ('Enrollment Date', 'enrollment_date', 100),
+]
+
+
+def pdf_text(value, width=None):
+    text = str(value)
+    if width is not None:
+        # Helvetica averages about half an em per character.
+        limit = int(width / (FONT_SIZE * 0.5)) - 1
+        if len(text) > limit:
+            text = text[:limit - 3] + '...'
+    text = text.encode('cp1252', 'replace').decode('latin-1')
+    return '(%s)' % text.replace('\\', '\\\\').replace('(', '\\(').replace(')', '\\)')
+
+
+class PDFPage:
+    def __init__(self, number):
+        self.number = number
+        self.commands = []
+
+    def text(self, x, y, value, font='F1', size=FONT_SIZE, width=None):
+        self.commands.append(f'BT /{font} {size} Tf {x} {y} Td {pdf_text(value, width)} Tj ET')
+
+    def rect(self, x, y, width, height, color):
+        self.commands.append(f'{color} rg {x} {y} {width} {height} re f 0 g')
+
+
+class PDFDocument:
+    # Just enough PDF 1.4 for text tables: two Type1 fonts, Flate-compressed pages.
+    def __init__(self):
+        self.pages = []
+
+    def add_page(self):
+        page = PDFPage(len(self.pages) + 1)
+        self.pages.append(page)
+        return page
+
+    def render(self):
+        fonts = '<< /F1 3 0 R /F2 4 0 R >>'
+        objects = [
+            b'<< /Type /Catalog /Pages 2 0 R >>',
+            ('<< /Type /Pages /Kids [%s] /Count %d >>' % (
+                ' '.join(f'{5 + 2 * i} 0 R' for i in range(len(self.pages))), len(self.pages)
+            )).encode('ascii'),
+            b'<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica /Encoding /WinAnsiEncoding >>',
+            b'<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica-Bold /Encoding /WinAnsiEncoding >>',
+        ]
+        for i, page in enumerate(self.pages):
+            objects.append((
+                f'<< /Type /Page /Parent 2 0 R /MediaBox [0 0 {PAGE_WIDTH} {PAGE_HEIGHT}] '
+                f'/Resources << /Font {fonts} >> /Contents {6 + 2 * i} 0 R >>'
+            ).encode('ascii'))
+            stream = zlib.compress('\n'.join(page.commands).encode('latin-1'))
+            objects.append(
+                b'<< /Length %d /Filter /FlateDecode >>\nstream\n' % len(stream) + stream + b'\nendstream'
+            )
+
+        output = bytearray(b'%PDF-1.4\n%\xe2\xe3\xcf\xd3\n')
+        offsets = []
+        for number, body in enumerate(objects, start=1):
+            offsets.append(len(output))
+            output += b'%d 0 obj\n' % number + body + b'\nendobj\n'
+        xref = len(output)
+        output += b'xref\n0 %d\n0000000000 65535 f \n' % (len(objects) + 1)
+        output += b''.join(b'%010d 00000 n \n' % offset for offset in offsets)
+        output += b'trailer\n<< /Size %d /Root 1 0 R >>\nstartxref\n%d\n%%%%EOF\n' % (len(objects) + 1, xref)
+        return bytes(output)
+
+
+def render_pdf(rows, stats, today):
+    document = PDFDocument()
+    page, y = None, 0
+
+    def new_page():
+        page = document.add_page()
+        top = PAGE_HEIGHT - MARGIN
+        page.text(MARGIN, top - 14, 'Student Management System - Complete Student List', font='F2', size=14)
+        if page.number == 1 and stats:
+            page.text(MARGIN, top - 32, (
+                f'Total Students: {stats["total"]} | Average GPA: {stats["avg_gpa"]} | Excellent: {stats["excellent"]} | '
+                f'Good: {stats["good"]} | Average: {stats["average"]} | Poor: {stats["poor"]}'
+            ))
+        y = top - 56
+        page.rect(MARGIN, y - 4, PAGE_WIDTH - 2 * MARGIN, ROW_HEIGHT, '0.416 0.067 0.796')
+        x = MARGIN + 3
+        for title, _, width in PDF_COLUMNS:
+            page.commands.append('1 g')
+            page.text(x, y, title, font='F2')
+            page.commands.append('0 g')
+            x += width
+        return page, y - ROW_HEIGHT
+
+    for index, row in enumerate(rows):
+        if page is None or y < MARGIN + ROW_HEIGHT:
+            page, y = new_page()
+        if index % 2:
+            page.rect(MARGIN, y - 4, PAGE_WIDTH - 2 * MARGIN, ROW_HEIGHT, '0.95 0.95 0.95')
+        x = MARGIN + 3
+        for _, key, width in PDF_COLUMNS:
+            page.text(x, y, row[key], width=width)
+            x += width
+        y -= ROW_HEIGHT
+    if page is None:
+        page, y = new_page()
+        page.text(MARGIN + 3, y, 'No students found.')
+
+    total = len(document.pages)
+    for page in document.pages:
+        page.text(MARGIN, MARGIN - 16, f'Generated on {today} | Page {page.number} of {total}', size=8)
+    return document.render()
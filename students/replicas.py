@@ -0,0 +1,143 @@
+"""
+Read-replica routing for the read-only student views.
+
+STUDENT_READ_REPLICAS lists database aliases that hold copies of
+``default``. Views wrapped in read_replica() read Student data from one
+of them, picked at random among those that accept connections; every
+other read, and every write, stays on ``default``. Auth and session
+tables are never routed, so logging in cannot race replication.
+
+Read-your-writes: ReplicaPinMiddleware sets a short-lived cookie on the
+response to any write request (POST, PUT, ...), and requests carrying it
+read from ``default`` until it expires after STUDENT_REPLICA_PIN_SECONDS,
+which should exceed the usual replication lag.
+
+A replica that fails to connect is skipped for STUDENT_REPLICA_RETRY_SECONDS
+before it is tried again. To try this locally, add a second SQLite file
+(kept in sync by copying the primary) or a second MySQL instance as a
+``replica`` alias and list it in STUDENT_READ_REPLICAS.
+"""
+import logging
+import random
+import threading
+import time
+from contextvars import ContextVar
+from functools import wraps
+
+from asgiref.sync import iscoroutinefunction, sync_to_async
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import DatabaseError, connections
+
+logger = logging.getLogger(__name__)
+
+READ_REPLICAS = getattr(settings, 'STUDENT_READ_REPLICAS', [])
+REPLICA_PIN_SECONDS = getattr(settings, 'STUDENT_REPLICA_PIN_SECONDS', 10)
+REPLICA_RETRY_SECONDS = getattr(settings, 'STUDENT_REPLICA_RETRY_SECONDS', 30)
+# Fragments rendered from a replica may predate the latest version bump,
+# so they are only cached this long.
+REPLICA_FRAGMENT_TIMEOUT = 60
+PIN_COOKIE = 'students_db_pin'
+SAFE_METHODS = ('GET', 'HEAD', 'OPTIONS')
+ROUTED_APPS = {'students'}
+
+_read_alias = ContextVar('students_read_alias', default=None)
+_down_until = {}
+_down_lock = threading.Lock()
+
+
+def replica_aliases():
+    return getattr(settings, 'STUDENT_READ_REPLICAS', READ_REPLICAS)
+
+
+def current_replica():
+    # The replica reads are being routed to, or None.
+    return _read_alias.get()
+
+
+def is_healthy(alias):
+    with _down_lock:
+        if time.monotonic() < _down_until.get(alias, 0):
+            return False
+    try:
+        # Cheap when the persistent connection is already open.
+        connections[alias].ensure_connection()
+    except DatabaseError:
+        logger.warning('Read replica %s is unavailable; reading from the primary', alias, exc_info=True)
+        with _down_lock:
+            _down_until[alias] = time.monotonic() + REPLICA_RETRY_SECONDS
+        return False
+    return True
+
+
+def choose_replica(request):
+    if request.COOKIES.get(PIN_COOKIE):
+        return None
+    healthy = [alias for alias in replica_aliases() if is_healthy(alias)]
+    return random.choice(healthy) if healthy else None
+
+
+def read_replica(methods=SAFE_METHODS):
+    # Routes the view's Student reads to a replica for requests with one of
+    # `methods`. Only for views that never write: a form's unique checks
+    # against a lagging replica would pass when they should fail.
+    def decorator(view):
+        if iscoroutinefunction(view):
+            @wraps(view)
+            async def wrapper(request, *args, **kwargs):
+                if request.method not in methods or not replica_aliases():
+                    return await view(request, *args, **kwargs)
+                request.read_only = True
+                token = _read_alias.set(await sync_to_async(choose_replica)(request))
+                try:
+                    return await view(request, *args, **kwargs)
+                finally:
+                    _read_alias.reset(token)
+        else:
+            @wraps(view)
+            def wrapper(request, *args, **kwargs):
+                if request.method not in methods or not replica_aliases():
+                    return view(request, *args, **kwargs)
+                request.read_only = True
+                token = _read_alias.set(choose_replica(request))
+                try:
+                    return view(request, *args, **kwargs)
+                finally:
+                    _read_alias.reset(token)
+        return wrapper
+    return decorator
+
+
+def pin_database(queryset):
+    # Resolves the alias now, for querysets evaluated after the view has
+    # returned (streamed responses), when the routing is no longer active.
+    return queryset.using(queryset.db)
+
+
+class ReplicaRouter:
+    def db_for_read(self, model, **hints):
+        if model._meta.app_label in ROUTED_APPS:
+            return _read_alias.get()
+        return None
+
+    def db_for_write(self, model, **hints):
+        return 'default'
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # Every alias holds the same data.
+        return True
+
+
+class ReplicaPinMiddleware:
+    # Sends the rest of a session's reads to the primary for a while after
+    # it writes, so users see their own changes.
+    def __init__(self, get_response):
+        if not replica_aliases():
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+
+    def __call__(self, request):
+        response = self.get_response(request)
+        if request.method not in SAFE_METHODS and not getattr(request, 'read_only', False) and response.status_code < 500:
+            response.set_cookie(PIN_COOKIE, '1', max_age=REPLICA_PIN_SECONDS, httponly=True, samesite='Lax')
+        return response
@@ -0,0 +1,260 @@
+"""
+Pre-aggregated enrollment and age analytics.
+
+StudentRollup holds a student count and GPA sum per enrollment month and
+per birth month, and the trend, cohort and age endpoints next to
+chart_data read nothing else. refresh_rollups() brings the rollups up to
+date from the change log (see changes.py): for each student changed
+since the stored cursor it takes out what RollupMember says the student
+was counted under and adds the current row back in, so the live Student
+table is only ever read by primary key. The first refresh, or
+``refresh_rollups --rebuild``, builds them from one pass over the table.
+
+Refreshes run from the ``refresh_rollups`` management command or, with
+STUDENT_ROLLUP_THREAD, in a daemon thread the endpoints start, every
+STUDENT_ROLLUP_REFRESH_INTERVAL seconds.
+"""
+import logging
+import threading
+import time
+from collections import defaultdict
+from decimal import Decimal
+
+from django.conf import settings
+from django.db import close_old_connections, connection, transaction
+from django.utils import timezone
+
+from .changes import change_page, settled_cursor
+from .models import RollupMember, RollupState, Student, StudentRollup
+
+logger = logging.getLogger(__name__)
+
+ROLLUP_BATCH_SIZE = 2000
+ROLLUP_THREAD = getattr(settings, 'STUDENT_ROLLUP_THREAD', True)
+ROLLUP_REFRESH_INTERVAL = getattr(settings, 'STUDENT_ROLLUP_REFRESH_INTERVAL', 60)
+# (youngest, oldest, label); None leaves that end open.
+AGE_BANDS = [
+    (None, 17, 'Under 18'),
+    (18, 20, '18-20'),
+    (21, 23, '21-23'),
+    (24, 26, '24-26'),
+    (27, 30, '27-30'),
+    (31, None, '31+'),
+]
+UNKNOWN_LABEL = 'Unknown'
+
+_refresher = None
+_refresher_lock = threading.Lock()
+
+
+def month_bucket(value):
+    return value.strftime('%Y-%m') if value else ''
+
+
+def member_for(student_id, enrollment_date, date_of_birth, gpa):
+    return RollupMember(
+        student_id=student_id,
+        enrolled_month=month_bucket(enrollment_date),
+        birth_month=month_bucket(date_of_birth),
+        gpa=gpa,
+    )
+
+
+def contributions(member):
+    return [
+        (StudentRollup.ENROLLED_MONTH, member.enrolled_month),
+        (StudentRollup.BIRTH_MONTH, member.birth_month),
+    ]
+
+
+# Maintenance
+
+def rollup_state():
+    # Locked until the transaction ends, so refreshes never overlap.
+    state, _ = RollupState.objects.select_for_update().get_or_create(id=1)
+    return state
+
+
+def apply_students(student_ids):
+    # Moves the students' contributions from what RollupMember recorded to
+    # their current rows (or drops them, for deleted students).
+    old = RollupMember.objects.in_bulk(student_ids)
+    new = {
+        row[0]: member_for(*row)
+        for row in Student.objects.filter(id__in=student_ids).values_list('id', 'enrollment_date', 'date_of_birth', 'gpa')
+    }
+    deltas = defaultdict(lambda: [0, Decimal(0)])
+    for sign, members in ((-1, old.values()), (1, new.values())):
+        for member in members:
+            for key in contributions(member):
+                deltas[key][0] += sign
+                deltas[key][1] += sign * member.gpa
+
+    gone = [student_id for student_id in old if student_id not in new]
+    if gone:
+        RollupMember.objects.filter(student_id__in=gone).delete()
+    RollupMember.objects.bulk_update(
+        [m for m in new.values() if m.student_id in old], ['enrolled_month', 'birth_month', 'gpa'], batch_size=ROLLUP_BATCH_SIZE
+    )
+    RollupMember.objects.bulk_create([m for m in new.values() if m.student_id not in old], batch_size=ROLLUP_BATCH_SIZE)
+    apply_deltas({key: delta for key, delta in deltas.items() if delta[0] or delta[1]})
+
+
+def apply_deltas(deltas):
+    rows = {}
+    for dimension in {dimension for dimension, _ in deltas}:
+        buckets = [bucket for d, bucket in deltas if d == dimension]
+        for row in StudentRollup.objects.filter(dimension=dimension, bucket__in=buckets):
+            rows[(dimension, row.bucket)] = row
+    changed, emptied = [], []
+    for (dimension, bucket), (students, gpa_sum) in deltas.items():
+        row = rows.get((dimension, bucket)) or StudentRollup(dimension=dimension, bucket=bucket)
+        row.students += students
+        row.gpa_sum += gpa_sum
+        (changed if row.students > 0 else emptied).append(row)
+    StudentRollup.objects.filter(id__in=[row.id for row in emptied if row.id]).delete()
+    StudentRollup.objects.bulk_update([row for row in changed if row.id], ['students', 'gpa_sum'])
+    StudentRollup.objects.bulk_create([row for row in changed if not row.id])
+
+
+def refresh_rollups(batch_size=ROLLUP_BATCH_SIZE):
+    # Applies the change log past the stored cursor; returns how many
+    # students were re-counted.
+    counted = 0
+    while True:
+        with transaction.atomic():
+            state = rollup_state()
+            if state.refreshed_at is None:
+                return rebuild_rollups(batch_size)
+            entries, next_cursor, has_more = change_page(state.cursor, batch_size)
+            if entries:
+                apply_students([entry.student_id for entry in entries])
+            state.cursor = next_cursor
+            state.refreshed_at = timezone.now()
+            state.save()
+        counted += len(entries)
+        if not has_more:
+            return counted
+
+
+def rebuild_rollups(batch_size=ROLLUP_BATCH_SIZE):
+    with transaction.atomic():
+        state = rollup_state()
+        # The scan below covers every change up to here; the next refresh
+        # applies later ones, and re-applying a covered one changes nothing.
+        cursor = settled_cursor()
+        RollupMember.objects.all().delete()
+        StudentRollup.objects.all().delete()
+        counted, last_id = 0, 0
+        while True:
+            ids = list(Student.objects.filter(id__gt=last_id).order_by('id').values_list('id', flat=True)[:batch_size])
+            if not ids:
+                break
+            apply_students(ids)
+            counted += len(ids)
+            last_id = ids[-1]
+        state.cursor = cursor
+        state.refreshed_at = timezone.now()
+        state.save()
+    return counted
+
+
+# Background thread
+
+def start_refresher():
+    global _refresher
+    if not getattr(settings, 'STUDENT_ROLLUP_THREAD', ROLLUP_THREAD):
+        return
+    with _refresher_lock:
+        if _refresher is not None and _refresher.is_alive():
+            return
+        _refresher = threading.Thread(target=run_refresher, name='student-rollup-refresher', daemon=True)
+        _refresher.start()
+
+
+def run_refresher():
+    interval = getattr(settings, 'STUDENT_ROLLUP_REFRESH_INTERVAL', ROLLUP_REFRESH_INTERVAL)
+    try:
+        while True:
+            close_old_connections()
+            try:
+                refresh_rollups()
+            except Exception:
+                logger.exception('Refreshing the student rollups failed')
+            time.sleep(interval)
+    finally:
+        connection.close()
+
+
+# Reading
+
+def rollup_counts(dimension):
+    return {
+        bucket: (students, gpa_sum)
+        for bucket, students, gpa_sum in StudentRollup.objects.filter(dimension=dimension).values_list('bucket', 'students', 'gpa_sum')
+    }
+
+
+def average(gpa_sum, students):
+    return (gpa_sum / students).quantize(Decimal('0.01')) if students else None
+
+
+def series(labels, counts):
+    # Chart payload from {label: (students, gpa_sum)}.
+    rows = [counts.get(label, (0, Decimal(0))) for label in labels]
+    return {
+        'labels': labels,
+        'students': [students for students, _ in rows],
+        'avg_gpa': [average(gpa_sum, students) for students, gpa_sum in rows],
+        'refreshed_at': RollupState.objects.values_list('refreshed_at', flat=True).first(),
+    }
+
+
+def month_range(first, last):
+    year, month = map(int, first.split('-'))
+    while f'{year:04d}-{month:02d}' <= last:
+        yield f'{year:04d}-{month:02d}'
+        year, month = (year + 1, 1) if month == 12 else (year, month + 1)
+
+
+def enrollment_trend(start='', end=''):
+    # Enrollments per month from `start` to `end` ('YYYY-MM', inclusive),
+    # with empty months filled in.
+    counts = rollup_counts(StudentRollup.ENROLLED_MONTH)
+    months = sorted(m for m in counts if m and (not start or m >= start) and (not end or m <= end))
+    labels = list(month_range(months[0], months[-1])) if months else []
+    return series(labels, counts)
+
+
+def cohort_gpa():
+    # Average GPA per enrollment year.
+    years = defaultdict(lambda: (0, Decimal(0)))
+    for month, (students, gpa_sum) in rollup_counts(StudentRollup.ENROLLED_MONTH).items():
+        if month:
+            count, total = years[month[:4]]
+            years[month[:4]] = (count + students, total + gpa_sum)
+    return series(sorted(years), years)
+
+
+def age_band(age):
+    for youngest, oldest, label in AGE_BANDS:
+        if (youngest is None or age >= youngest) and (oldest is None or age <= oldest):
+            return label
+
+
+def age_distribution(today=None):
+    # Ages as of today, to the month of birth.
+    today = today or timezone.localdate()
+    bands = defaultdict(lambda: (0, Decimal(0)))
+    for month, (students, gpa_sum) in rollup_counts(StudentRollup.BIRTH_MONTH).items():
+        if month:
+            year, month_number = map(int, month.split('-'))
+            label = age_band(today.year - year - (today.month < month_number))
+        else:
+            label = UNKNOWN_LABEL
+        count, total = bands[label]
+        bands[label] = (count + students, total + gpa_sum)
+    labels = [label for _, _, label in AGE_BANDS]
+    if UNKNOWN_LABEL in bands:
+        labels.append(UNKNOWN_LABEL)
+    return series(labels, bands)
@@ -0,0 +1,132 @@
+"""
+Relevance-ranked student search.
+
+Two backends sit behind search_students():
+
+* ``fulltext`` - MySQL's FULLTEXT index on (first_name, last_name, email),
+  queried in boolean mode with a prefix wildcard on every term.
+* ``tokens`` - an app-maintained StudentSearchToken table holding the
+  lower-cased words of each student's names and email. Terms are matched
+  as indexed prefixes (LIKE 'term%'), which works on every database.
+
+STUDENT_SEARCH_BACKEND picks one explicitly; the default ``auto`` uses
+``fulltext`` on MySQL and ``tokens`` everywhere else. Either way every
+search term must match, and exact word matches rank above prefixes.
+"""
+import re
+
+from django.conf import settings
+from django.db import connections, transaction
+from django.db.models import Case, F, IntegerField, Max, Q, Value, When
+from django.db.models.expressions import RawSQL
+
+from .models import Student, StudentSearchToken
+
+SEARCH_BACKEND = getattr(settings, 'STUDENT_SEARCH_BACKEND', 'auto')
+MAX_SEARCH_TERMS = 5
+# InnoDB ignores words shorter than innodb_ft_min_token_size (3 by default).
+FULLTEXT_MIN_TOKEN_SIZE = 3
+TOKEN_MAX_LENGTH = StudentSearchToken._meta.get_field('token').max_length
+WORD_RE = re.compile(r'[^\W_]+')
+
+
+def tokenize(text):
+    return [word.lower()[:TOKEN_MAX_LENGTH] for word in WORD_RE.findall(text or '')]
+
+
+def student_tokens(student):
+    return set(tokenize(student.first_name) + tokenize(student.last_name) + tokenize(student.email))
+
+
+def get_backend(using='default'):
+    if SEARCH_BACKEND == 'auto':
+        return 'fulltext' if connections[using].vendor == 'mysql' else 'tokens'
+    return SEARCH_BACKEND
+
+
+def uses_token_index(using='default'):
+    return get_backend(using) == 'tokens'
+
+
+def basic_filter(queryset, term):
+    return queryset.filter(
+        Q(first_name__icontains=term) |
+        Q(last_name__icontains=term) |
+        Q(email__icontains=term)
+    )
+
+
+def search_students(queryset, query):
+    # Annotates search_rank; callers order by it when relevance is wanted.
+    terms = list(dict.fromkeys(tokenize(query)))[:MAX_SEARCH_TERMS]
+    if not terms:
+        return basic_filter(queryset, query).annotate(search_rank=Value(0, output_field=IntegerField()))
+    backend = get_backend(queryset.db)
+    if backend == 'fulltext':
+        return fulltext_search(queryset, terms)
+    elif backend == 'tokens':
+        return token_search(queryset, terms)
+    for term in terms:
+        queryset = basic_filter(queryset, term)
+    return queryset.annotate(search_rank=Value(0, output_field=IntegerField()))
+
+
+def fulltext_search(queryset, terms):
+    table = Student._meta.db_table
+    long_terms = [t for t in terms if len(t) >= FULLTEXT_MIN_TOKEN_SIZE]
+    if long_terms:
+        # tokenize() only yields word characters, so no boolean operators leak in.
+        against = ' '.join(f'+{t}*' for t in long_terms)
+        queryset = queryset.annotate(search_rank=RawSQL(
+            f'MATCH ({table}.first_name, {table}.last_name, {table}.email) AGAINST (%s IN BOOLEAN MODE)',
+            [against],
+        )).filter(search_rank__gt=0)
+    else:
+        queryset = queryset.annotate(search_rank=Value(0, output_field=IntegerField()))
+    for term in terms:
+        if len(term) < FULLTEXT_MIN_TOKEN_SIZE:
+            queryset = basic_filter(queryset, term)
+    return queryset
+
+
+def token_search(queryset, terms):
+    matches = Q()
+    for term in terms:
+        matches |= Q(search_tokens__token__startswith=term)
+    # Per term: 2 for an exact word, 1 for a prefix, 0 for no match.
+    scores = {
+        f'_term_{i}': Max(Case(
+            When(search_tokens__token=term, then=Value(2)),
+            When(search_tokens__token__startswith=term, then=Value(1)),
+            default=Value(0),
+            output_field=IntegerField(),
+        ))
+        for i, term in enumerate(terms)
+    }
+    queryset = queryset.filter(matches).annotate(**scores)
+    queryset = queryset.filter(**{f'{name}__gt': 0 for name in scores})
+    rank = sum((F(name) for name in scores), Value(0))
+    return queryset.annotate(search_rank=rank)
+
+
+def index_student(student):
+    tokens = student_tokens(student)
+    existing = set(StudentSearchToken.objects.filter(student=student).values_list('token', flat=True))
+    if tokens == existing:
+        return
+    with transaction.atomic():
+        StudentSearchToken.objects.filter(student=student, token__in=existing - tokens).delete()
+        StudentSearchToken.objects.bulk_create(
+            [StudentSearchToken(student=student, token=token) for token in tokens - existing]
+        )
+
+
+def index_students(students):
+    # Rebuild the tokens of many students with one DELETE and one INSERT.
+    students = list(students)
+    with transaction.atomic():
+        StudentSearchToken.objects.filter(student__in=[s.id for s in students]).delete()
+        StudentSearchToken.objects.bulk_create(
+            [StudentSearchToken(student_id=s.id, token=token) for s in students for token in student_tokens(s)],
+            batch_size=5000,
+        )
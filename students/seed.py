@@ -0,0 +1,87 @@
+"""
+Fast synthetic Student generator for benchmarks.
+
+Seeded rows all use SEED_EMAIL_DOMAIN so they can be told apart from
+real records and removed again with delete_seeded_students().
+"""
+import random
+from datetime import date, timedelta
+from decimal import Decimal
+
+from django.db import transaction
+
+from .caching import bump_versions
+from .changes import created_ids, record_changes
+from .deletion import hard_delete
+from .models import Student, StudentChange
+from .search import index_students, uses_token_index
+from .stats import invalidate_stats
+
+SEED_EMAIL_DOMAIN = 'bench.example.com'
+SEED_BATCH_SIZE = 5000
+
+FIRST_NAMES = ['Amina', 'Ben', 'Chen', 'Dara', 'Elif', 'Farhan', 'Grace', 'Hugo', 'Ines', 'Jamal',
+               'Kiran', 'Lena', 'Mateo', 'Nadia', 'Omar', 'Priya', 'Quinn', 'Rafi', 'Sara', 'Tariq']
+LAST_NAMES = ['Ahmed', 'Brown', 'Chowdhury', 'Diaz', 'Evans', 'Fischer', 'Garcia', 'Hossain', 'Islam',
+              'Jones', 'Khan', 'Lopez', 'Miller', 'Nguyen', 'Okafor', 'Patel', 'Rahman', 'Smith', 'Tanaka']
+
+
+def build_student(index, rng):
+    first_name = rng.choice(FIRST_NAMES)
+    last_name = rng.choice(LAST_NAMES)
+    return Student(
+        first_name=first_name,
+        last_name=last_name,
+        email=f'{first_name.lower()}.{last_name.lower()}.{index}@{SEED_EMAIL_DOMAIN}',
+        gpa=Decimal(rng.randint(100, 400)) / 100,
+        phone=f'+1555{rng.randint(0, 9999999):07d}',
+        address=f'{rng.randint(1, 999)} Example Street',
+        date_of_birth=date(1995, 1, 1) + timedelta(days=rng.randint(0, 3650)),
+        enrollment_date=date(2015, 9, 1) + timedelta(days=rng.randint(0, 3650)),
+    )
+
+
+def seed_students(count, batch_size=SEED_BATCH_SIZE, seed=0, start=None):
+    # bulk_create() skips signals, so search tokens and change log entries
+    # are written here and the cached stats are rebuilt afterwards.
+    rng = random.Random(seed)
+    if start is None:
+        start = Student.objects.filter(email__endswith='@' + SEED_EMAIL_DOMAIN).count()
+    created = 0
+    while created < count:
+        size = min(batch_size, count - created)
+        batch = [build_student(start + created + i, rng) for i in range(size)]
+        with transaction.atomic():
+            Student.objects.bulk_create(batch, batch_size=batch_size)
+            record_changes(StudentChange.CREATE, created_ids(batch))
+            if uses_token_index():
+                index_students(Student.objects.filter(email__in=[s.email for s in batch]).only(
+                    'id', 'first_name', 'last_name', 'email'))
+        created += size
+    invalidate_stats()
+    bump_versions()
+    return created
+
+
+def top_up_seeded_students(count, batch_size=SEED_BATCH_SIZE):
+    # Seeds only what is missing for `count` seeded students in all, so a
+    # dataset kept from an earlier run is reused; returns how many were added.
+    existing = Student.objects.filter(email__endswith='@' + SEED_EMAIL_DOMAIN).count()
+    if existing >= count:
+        return 0
+    return seed_students(count - existing, batch_size=batch_size, start=existing)
+
+
+def delete_seeded_students(batch_size=SEED_BATCH_SIZE):
+    deleted = 0
+    seeded = Student.all_objects.filter(email__endswith='@' + SEED_EMAIL_DOMAIN)
+    while True:
+        ids = list(seeded.order_by().values_list('id', flat=True)[:batch_size])
+        if not ids:
+            break
+        with transaction.atomic(using=seeded.db):
+            deleted += hard_delete(ids, seeded.db)
+            record_changes(StudentChange.DELETE, ids)
+        bump_versions(ids)
+    invalidate_stats()
+    return deleted
@@ -0,0 +1,79 @@
+from django.db.models.signals import post_delete, post_save, pre_save
+from django.dispatch import receiver
+
+from . import caching, changes, search, stats, thumbnails
+from .models import Job, Student, StudentChange
+
+
+@receiver(post_save, sender=Student)
+def update_stats_on_save(sender, instance, created, **kwargs):
+    if created:
+        stats.record_created(instance.gpa)
+    elif getattr(instance, '_loaded_gpa', None) is None:
+        # We don't know what the row held before this save.
+        stats.invalidate_stats()
+    else:
+        stats.record_changed(instance._loaded_gpa, instance.gpa)
+    instance._loaded_gpa = instance.gpa
+
+
+@receiver(post_delete, sender=Student)
+def update_stats_on_delete(sender, instance, **kwargs):
+    # Soft-deleted rows already left the counters (see deletion.py).
+    if instance.deleted_at is None:
+        stats.record_deleted(instance.gpa)
+
+
+@receiver(post_save, sender=Student)
+def update_search_index_on_save(sender, instance, **kwargs):
+    # Tokens of deleted students go with them through the FK cascade.
+    if search.uses_token_index(kwargs.get('using') or 'default'):
+        search.index_student(instance)
+
+
+@receiver(pre_save, sender=Student)
+def forget_replaced_picture(sender, instance, **kwargs):
+    if not hasattr(instance, '_loaded_picture'):
+        return
+    if str(instance.profile_picture or '') != instance._loaded_picture:
+        instance._replaced_media = [instance._loaded_picture, *(instance.profile_thumbnails or {}).values()]
+        instance.profile_thumbnails = {}
+
+
+@receiver(post_save, sender=Student)
+def update_thumbnails_on_save(sender, instance, created, **kwargs):
+    picture = str(instance.profile_picture or '')
+    replaced = getattr(instance, '_replaced_media', None)
+    if replaced is not None:
+        thumbnails.schedule_cleanup(replaced)
+        del instance._replaced_media
+    if picture and (created or replaced is not None):
+        thumbnails.schedule_thumbnails(instance.id, picture)
+    instance._loaded_picture = picture
+
+
+@receiver(post_delete, sender=Student)
+def delete_media_on_delete(sender, instance, **kwargs):
+    thumbnails.schedule_cleanup([str(instance.profile_picture or ''), *(instance.profile_thumbnails or {}).values()])
+
+
+@receiver(post_save, sender=Student)
+@receiver(post_delete, sender=Student)
+def bump_cache_versions(sender, instance, **kwargs):
+    caching.bump_versions_on_commit([instance.id])
+
+
+@receiver(post_save, sender=Student)
+def record_change_on_save(sender, instance, created, **kwargs):
+    changes.record_change(StudentChange.CREATE if created else StudentChange.UPDATE, instance.id)
+
+
+@receiver(post_delete, sender=Student)
+def record_change_on_delete(sender, instance, **kwargs):
+    if instance.deleted_at is None:
+        changes.record_change(StudentChange.DELETE, instance.id)
+
+
+@receiver(post_delete, sender=Job)
+def delete_job_files_on_delete(sender, instance, **kwargs):
+    thumbnails.schedule_cleanup([instance.input_file.name, instance.result_file.name])
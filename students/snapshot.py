@@ -0,0 +1,250 @@
+"""
+Read-only columnar snapshot of the Student reporting columns.
+
+With STUDENT_SNAPSHOT_ENABLED (and NumPy installed) each process keeps
+the reporting columns of every student in NumPy arrays: ids, GPA in
+integer cents, performance level codes and dates as day ordinals, with
+names, email and phone as one UTF-8 buffer per column plus offsets.
+That is a few dozen bytes per student instead of a model instance with
+Decimal and date objects. GPA range and level filters, counts, averages,
+percentiles and sorts then run as vectorized operations over the arrays;
+rows are only turned back into Python values for the page being shown.
+
+The snapshot is tagged with the caching.py table version it was built
+at and rebuilt on the next use after any student changes, so it suits
+read-mostly tables. It is always loaded from the primary database.
+"""
+import math
+import threading
+from decimal import Decimal, ROUND_CEILING, ROUND_FLOOR
+
+from django.conf import settings
+from django.db import router
+
+from .caching import table_version
+from .exporters import iter_queryset_rows
+from .filters import NEEDS_IMPROVEMENT
+from .models import PERFORMANCE_CHOICES, Student
+from .pagination import cached_count
+
+SNAPSHOT_ENABLED = getattr(settings, 'STUDENT_SNAPSHOT_ENABLED', False)
+STRING_FIELDS = ['first_name', 'last_name', 'email', 'phone']
+SNAPSHOT_SORTS = ['id', 'first_name', 'last_name', 'gpa', 'enrollment_date']
+LEVEL_CODES = [code for code, _ in PERFORMANCE_CHOICES]
+
+_snapshot = None
+_snapshot_lock = threading.Lock()
+
+
+def snapshot_enabled():
+    if not getattr(settings, 'STUDENT_SNAPSHOT_ENABLED', SNAPSHOT_ENABLED):
+        return False
+    try:
+        import numpy  # noqa: F401
+    except ImportError:
+        return False
+    return True
+
+
+def get_snapshot():
+    # The current snapshot, rebuilt first if any student changed since.
+    global _snapshot
+    version = table_version()
+    snapshot = _snapshot
+    if snapshot is None or snapshot.version != version:
+        with _snapshot_lock:
+            if _snapshot is None or _snapshot.version != version:
+                _snapshot = StudentSnapshot.load(version)
+            snapshot = _snapshot
+    return snapshot
+
+
+def cents_bound(value, rounding):
+    # Parsed (and rejected) like filter_students() does, then compared in
+    # whole cents, rounded towards the inside of the range.
+    value = float(value)
+    if not math.isfinite(value):
+        return value
+    return int((Decimal(repr(value)) * 100).to_integral_value(rounding))
+
+
+def filtered_count(queryset, query='', min_gpa='', max_gpa='', performance=''):
+    # Count of filter_students(queryset, ...), from the snapshot when it
+    # can answer (no search query), otherwise a cached COUNT.
+    if not query and snapshot_enabled():
+        return len(get_snapshot().select(min_gpa, max_gpa, performance))
+    return cached_count(queryset)
+
+
+def print_rows(fields, sort):
+    # Every student as values_list(*fields) tuples ordered by `sort`, then id.
+    snapshot = get_snapshot()
+    return snapshot.rows(snapshot.order(snapshot.select(), sort), fields)
+
+
+class StringColumn:
+    # Strings as one UTF-8 buffer and end offsets; None is stored as ''.
+    def __init__(self, data, ends):
+        self.data = data
+        self.ends = ends
+
+    @classmethod
+    def build(cls, values):
+        import numpy as np
+
+        data = bytearray()
+        ends = []
+        for value in values:
+            data += (value or '').encode('utf-8')
+            ends.append(len(data))
+        return cls(bytes(data), np.array(ends, dtype=np.int64))
+
+    @property
+    def nbytes(self):
+        return len(self.data) + self.ends.nbytes
+
+    def __getitem__(self, index):
+        start = int(self.ends[index - 1]) if index else 0
+        return self.data[start:int(self.ends[index])].decode('utf-8')
+
+    def ranks(self):
+        # Position of each string in sorted order, for sorting by the column.
+        # Case-insensitive, like the MySQL collation; equal strings keep
+        # their (id) order.
+        import numpy as np
+
+        order = sorted(range(len(self.ends)), key=lambda index: self[index].casefold())
+        ranks = np.empty(len(order), dtype=np.int64)
+        ranks[order] = np.arange(len(order))
+        return ranks
+
+
+class StudentSnapshot:
+    def __init__(self, version, ids, gpa, levels, enrolled, born, strings):
+        self.version = version
+        self.ids = ids
+        self.gpa = gpa
+        self.levels = levels
+        self.enrolled = enrolled
+        self.born = born
+        self.strings = strings
+        self._ranks = {}
+
+    @classmethod
+    def load(cls, version=None):
+        import numpy as np
+
+        queryset = Student.objects.using(router.db_for_write(Student)).order_by('id').values_list(
+            'id', 'gpa', 'performance_level', 'enrollment_date', 'date_of_birth', *STRING_FIELDS
+        )
+        columns = [[] for _ in range(5 + len(STRING_FIELDS))]
+        level_index = {code: i for i, code in enumerate(LEVEL_CODES)}
+        for row in iter_queryset_rows(queryset):
+            student_id, gpa, level, enrolled, born = row[:5]
+            columns[0].append(student_id)
+            columns[1].append(int(gpa * 100))
+            columns[2].append(level_index[level])
+            columns[3].append(enrolled.toordinal() if enrolled else 0)
+            columns[4].append(born.toordinal() if born else 0)
+            for i, value in enumerate(row[5:], start=5):
+                columns[i].append(value)
+        return cls(
+            version,
+            ids=np.array(columns[0], dtype=np.int64),
+            gpa=np.array(columns[1], dtype=np.int16),
+            levels=np.array(columns[2], dtype=np.int8),
+            # Day ordinals; 0 when the date is unknown.
+            enrolled=np.array(columns[3], dtype=np.int32),
+            born=np.array(columns[4], dtype=np.int32),
+            strings={name: StringColumn.build(columns[i]) for i, name in enumerate(STRING_FIELDS, start=5)},
+        )
+
+    def __len__(self):
+        return len(self.ids)
+
+    @property
+    def nbytes(self):
+        arrays = [self.ids, self.gpa, self.levels, self.enrolled, self.born]
+        return sum(a.nbytes for a in arrays) + sum(column.nbytes for column in self.strings.values())
+
+    # Queries. Selections are arrays of row positions.
+
+    def select(self, min_gpa='', max_gpa='', performance=''):
+        # The rows filter_students() would return without a search query.
+        import numpy as np
+
+        mask = np.ones(len(self), dtype=bool)
+        if min_gpa:
+            mask &= self.gpa >= cents_bound(min_gpa, ROUND_CEILING)
+        if max_gpa:
+            mask &= self.gpa <= cents_bound(max_gpa, ROUND_FLOOR)
+        performance = performance.lower()
+        if performance in LEVEL_CODES:
+            mask &= self.levels == LEVEL_CODES.index(performance)
+        elif performance == 'needs_improvement':
+            mask &= np.isin(self.levels, [LEVEL_CODES.index(code) for code in NEEDS_IMPROVEMENT])
+        return np.flatnonzero(mask)
+
+    def stats(self, selection=None):
+        # Same shape as stats.get_stats().
+        import numpy as np
+
+        gpa = self.gpa if selection is None else self.gpa[selection]
+        levels = self.levels if selection is None else self.levels[selection]
+        counts = np.bincount(levels, minlength=len(LEVEL_CODES))
+        total = len(gpa)
+        avg_gpa = None
+        if total:
+            avg_gpa = (Decimal(int(gpa.sum(dtype=np.int64))) / 100 / total).quantize(Decimal('0.01'))
+        return {'total': total, 'avg_gpa': avg_gpa, **{code: int(counts[i]) for i, code in enumerate(LEVEL_CODES)}}
+
+    def percentiles(self, percents, selection=None):
+        # GPA at each percentile (nearest rank), or None with no students.
+        import numpy as np
+
+        gpa = self.gpa if selection is None else self.gpa[selection]
+        if not len(gpa):
+            return [None for _ in percents]
+        values = np.percentile(gpa, percents, method='inverted_cdf')
+        return [Decimal(int(value)).scaleb(-2) for value in values]
+
+    def order(self, selection, sort):
+        # Sorts the selection by a SNAPSHOT_SORTS field ('-' for descending), ties by id.
+        import numpy as np
+
+        field = sort.lstrip('-')
+        if field not in SNAPSHOT_SORTS:
+            raise ValueError(f'Cannot sort a snapshot by {sort}.')
+        if field == 'id':
+            keys = self.ids[selection]
+        elif field in STRING_FIELDS:
+            if field not in self._ranks:
+                self._ranks[field] = self.strings[field].ranks()
+            keys = self._ranks[field][selection]
+        else:
+            keys = {'gpa': self.gpa, 'enrollment_date': self.enrolled}[field][selection]
+        if sort.startswith('-'):
+            keys = -keys.astype(np.int64)
+        return selection[np.lexsort((self.ids[selection], keys))]
+
+    def values(self, position, field):
+        if field in self.strings:
+            # phone is the nullable one; forms store a blank phone as NULL.
+            return self.strings[field][position] or (None if field == 'phone' else '')
+        if field == 'id':
+            return int(self.ids[position])
+        if field == 'gpa':
+            return Decimal(int(self.gpa[position])).scaleb(-2)
+        if field == 'performance_level':
+            return LEVEL_CODES[self.levels[position]]
+        if field in ('enrollment_date', 'date_of_birth'):
+            from datetime import date
+
+            ordinal = int((self.enrolled if field == 'enrollment_date' else self.born)[position])
+            return date.fromordinal(ordinal) if ordinal else None
+        raise KeyError(field)
+
+    def rows(self, selection, fields):
+        # values_list()-style tuples for the selected rows, in order.
+        for position in selection:
+            yield tuple(self.values(position, field) for field in fields)
@@ -0,0 +1,143 @@
+"""
+Cached dashboard statistics for Student records.
+
+The totals, GPA sum and performance-bucket counts live in the cache as
+integer counters. Saves and deletes adjust them incrementally (see
+signals.py) instead of re-running the aggregate on every page view, and
+a full recompute every STUDENT_STATS_REFRESH_INTERVAL seconds corrects
+any drift from races or writes that bypass the ORM signals. A recompute
+that changes the counters also changes stats_generation(), which cached
+fragments showing the stats vary on, since no student version moves.
+"""
+import threading
+import time
+from collections import Counter
+from contextlib import contextmanager
+from decimal import Decimal
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import router, transaction
+from django.db.models import Count, Sum
+
+from .caching import new_version
+from .models import PERFORMANCE_CHOICES, Student, performance_for
+
+STATS_KEY_PREFIX = 'students:stats:'
+STATS_COUNTERS = ['total', 'gpa_cents'] + [code for code, _ in PERFORMANCE_CHOICES]
+STATS_COMPUTED_AT = 'computed_at'
+STATS_GENERATION = 'generation'
+STATS_REFRESH_INTERVAL = getattr(settings, 'STUDENT_STATS_REFRESH_INTERVAL', 300)
+
+_local = threading.local()
+
+
+def stats_key(name):
+    return STATS_KEY_PREFIX + name
+
+
+def gpa_cents(gpa):
+    return int(Decimal(str(gpa)) * 100)
+
+
+def compute_stats():
+    # One GROUP BY over the indexed performance_level column
+    counters = {code: 0 for code, _ in PERFORMANCE_CHOICES}
+    gpa_sum = Decimal(0)
+    # Always from the primary: the counters outlive a lagging replica's view.
+    levels = Student.objects.using(router.db_for_write(Student)).order_by().values_list('performance_level').annotate(count=Count('id'), gpa_sum=Sum('gpa'))
+    for level, count, level_sum in levels:
+        counters[level] = count
+        gpa_sum += level_sum or 0
+    counters['total'] = sum(counters.values())
+    counters['gpa_cents'] = gpa_cents(gpa_sum)
+    values = {stats_key(name): value for name, value in counters.items()}
+    if cache.get_many(list(values)) != values:
+        values[stats_key(STATS_GENERATION)] = new_version()
+    values[stats_key(STATS_COMPUTED_AT)] = time.time()
+    cache.set_many(values, timeout=None)
+    return counters
+
+
+def get_stats():
+    keys = [stats_key(name) for name in STATS_COUNTERS + [STATS_COMPUTED_AT]]
+    cached = cache.get_many(keys)
+    computed_at = cached.get(stats_key(STATS_COMPUTED_AT))
+    if len(cached) < len(keys) or time.time() - computed_at > STATS_REFRESH_INTERVAL:
+        counters = compute_stats()
+    else:
+        counters = {name: cached[stats_key(name)] for name in STATS_COUNTERS}
+
+    total = counters['total']
+    avg_gpa = None
+    if total:
+        avg_gpa = (Decimal(counters['gpa_cents']) / 100 / total).quantize(Decimal('0.01'))
+    return {
+        'total': total,
+        'avg_gpa': avg_gpa,
+        'excellent': counters['excellent'],
+        'good': counters['good'],
+        'average': counters['average'],
+        'poor': counters['poor'],
+    }
+
+
+def stats_generation():
+    return cache.get(stats_key(STATS_GENERATION))
+
+
+def invalidate_stats():
+    cache.delete(stats_key(STATS_COMPUTED_AT))
+
+
+def apply_deltas(deltas):
+    for name, delta in deltas.items():
+        if not delta:
+            continue
+        try:
+            cache.incr(stats_key(name), delta)
+        except ValueError:
+            # Counters are not cached yet (or were evicted); rebuild on next read.
+            invalidate_stats()
+            return
+
+
+def record(gpa, delta):
+    deltas = Counter({'total': delta, 'gpa_cents': gpa_cents(gpa) * delta, performance_for(gpa): delta})
+    pending = getattr(_local, 'pending', None)
+    if pending is not None:
+        pending.update(deltas)
+    else:
+        transaction.on_commit(lambda: apply_deltas(deltas))
+
+
+def record_created(gpa):
+    record(gpa, 1)
+
+
+def record_deleted(gpa):
+    record(gpa, -1)
+
+
+def record_changed(old_gpa, new_gpa):
+    if Decimal(str(old_gpa)) != Decimal(str(new_gpa)):
+        record(old_gpa, -1)
+        record(new_gpa, 1)
+
+
+@contextmanager
+def stats_batch():
+    # Collect deltas from a bulk operation and write them to the cache once.
+    if getattr(_local, 'pending', None) is not None:
+        yield
+        return
+    _local.pending = Counter()
+    try:
+        yield
+    except Exception:
+        # Part of the work may have been committed; let the next read recompute.
+        invalidate_stats()
+        raise
+    finally:
+        deltas, _local.pending = _local.pending, None
+    transaction.on_commit(lambda: apply_deltas(deltas))
@@ -0,0 +1,51 @@
+from django import template
+from django.utils.safestring import mark_safe
+
+from ..caching import FRAGMENT_TIMEOUT, cached_fragment
+
+register = template.Library()
+OPTIONS = ('student', 'timeout')
+
+
+class FragmentCacheNode(template.Node):
+    def __init__(self, nodelist, name, vary_on, options):
+        self.nodelist = nodelist
+        self.name = name
+        self.vary_on = vary_on
+        self.options = options
+
+    def render(self, context):
+        options = {key: value.resolve(context) for key, value in self.options.items()}
+        return mark_safe(cached_fragment(
+            self.name.resolve(context),
+            lambda: self.nodelist.render(context),
+            student_id=options.get('student'),
+            vary_on=[var.resolve(context) for var in self.vary_on],
+            timeout=int(options.get('timeout', FRAGMENT_TIMEOUT)),
+        ))
+
+
+@register.tag
+def cachefragment(parser, token):
+    """
+    Cache the enclosed template fragment until the students table changes,
+    or only until one student changes when ``student=`` is given::
+
+        {% cachefragment 'student_detail' student=student.id %} ... {% endcachefragment %}
+        {% cachefragment 'recent_activity' timeout=60 %} ... {% endcachefragment %}
+
+    Any other arguments are extra values to vary the key on.
+    """
+    bits = token.split_contents()
+    if len(bits) < 2:
+        raise template.TemplateSyntaxError(f"'{bits[0]}' tag requires a fragment name.")
+    nodelist = parser.parse(('endcachefragment',))
+    parser.delete_first_token()
+    vary_on, options = [], {}
+    for bit in bits[2:]:
+        key, sep, value = bit.partition('=')
+        if sep and key in OPTIONS:
+            options[key] = parser.compile_filter(value)
+        else:
+            vary_on.append(parser.compile_filter(bit))
+    return FragmentCacheNode(nodelist, parser.compile_filter(bits[1]), vary_on, options)
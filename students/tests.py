@@ -1,3 +1,1365 @@
-from django.test import TestCase
+import gzip
+import io
+import json
+import os
+import re
+import shutil
+import tempfile
+import zlib
+from datetime import date, timedelta
+from decimal import Decimal
+from importlib.util import find_spec
+from unittest import mock, skipUnless
 
-# Create your tests here.
+from asgiref.sync import async_to_sync
+from django.contrib.auth.models import User
+from django.core import mail
+from django.core.cache import cache
+from django.core.mail.backends.locmem import EmailBackend
+from django.http import HttpResponse, JsonResponse, QueryDict
+from django.core.management import call_command
+from django.db import OperationalError, connection
+from django.db.models import QuerySet
+from django.core.files.storage import default_storage
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.test import RequestFactory, TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import resolve, reverse
+from django.utils import timezone
+
+from .loadtest import SCENARIOS, compare, missing_routes, reload_urlconf
+from .exporters import EXPORT_COLUMNS
+from .importers import MODE_UPSERT, StudentCSVImporter, iter_csv_lines
+from .jobs import JOB_MAX_ATTEMPTS, JOB_STALE_TIMEOUT, claim_next, process_jobs
+from .mailer import EMAIL_MAX_ATTEMPTS, process_queue
+from .models import APIToken, LIST_FIELDS, PRINT_FIELDS, RECENT_FIELDS, EmailBatch, Job, QueuedEmail, Student, StudentChange, StudentRollup, StudentSearchToken, performance_for
+from .search import search_students
+from .pagination import SORT_FIELDS, clean_per_page, keyset_page
+from .rollups import age_distribution, enrollment_trend, rebuild_rollups, refresh_rollups
+from .deletion import purge_students, restore_students, soft_delete_students
+from .filters import filter_students
+from .forms import StudentForm
+from .stats import compute_stats, get_stats, invalidate_stats, stats_generation
+from .validation import validate_students
+from . import async_views, caching, instrumentation, replicas, snapshot, views
+
+
+def pdf_text_streams(pdf):
+    return b''.join(zlib.decompress(m) for m in re.findall(rb'stream\n(.*?)\nendstream', pdf, re.S))
+
+
+def make_csv(rows, header='first_name,last_name,email,gpa,phone,address,date_of_birth,enrollment_date'):
+    return SimpleUploadedFile('students.csv', ('\n'.join([header] + rows) + '\n').encode('utf-8'))
+
+
+class CSVImportTests(TestCase):
+    def setUp(self):
+        media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, media_root)
+        self.enterContext(override_settings(MEDIA_ROOT=media_root))
+
+    def test_decodes_multibyte_characters_split_across_chunks(self):
+        upload = SimpleUploadedFile('students.csv', 'a,b\nJosé,Zoë\n'.encode('utf-8'))
+        upload.DEFAULT_CHUNK_SIZE = 3
+        self.assertEqual(list(iter_csv_lines(upload)), ['a,b\n', 'José,Zoë\n'])
+
+    def test_imports_valid_rows_in_batches(self):
+        rows = [f'First{i},Last{i},student{i}@example.com,3.{i},,,2000-01-0{i + 1},' for i in range(5)]
+        importer = StudentCSVImporter(batch_size=2)
+        # Per batch: savepoint, email lookup, INSERT, change log INSERT,
+        # release, plus five queries to refresh the search tokens of the new rows.
+        with self.assertNumQueries(3 * 10):
+            importer.run(make_csv(rows))
+        self.assertEqual(importer.created, 5)
+        self.assertEqual(importer.errors, [])
+        self.assertEqual(Student.objects.get(email='student3@example.com').gpa, Decimal('3.30'))
+
+    def test_collects_line_numbers_and_reasons(self):
+        Student.objects.create(first_name='Ann', last_name='Lee', email='ann@example.com', gpa=3)
+        rows = [
+            'Bob,Ray,bob@example.com,3.1,,,,',
+            ',Ray,nobody@example.com,9,,,,',
+            'Ann,Lee,ann@example.com,3.0,,,,',
+            'Bob,Ray,BOB@example.com,3.1,,,,',
+            'Cat,Fox,cat@example.com,abc,,,1999-13-01,',
+        ]
+        importer = StudentCSVImporter().run(make_csv(rows))
+        self.assertEqual(importer.created, 1)
+        lines = dict(importer.errors)
+        self.assertEqual(sorted(lines), [3, 4, 5, 6])
+        self.assertIn('first_name: This field is required.', lines[3])
+        self.assertIn('gpa: Ensure this value is between 0.00 and 4.00.', lines[3])
+        self.assertIn('already exists', lines[4])
+        self.assertIn('email: This email appears more than once', lines[5])
+        self.assertIn('gpa: Enter a number.', lines[6])
+        self.assertIn('date_of_birth: Enter a valid date.', lines[6])
+        self.assertTrue(importer.error_report().startswith('Line,Error'))
+
+    def test_upsert_updates_only_changed_rows(self):
+        ann = Student.objects.create(first_name='Ann', last_name='Lee', email='ann@example.com', gpa=3, phone='123')
+        bob = Student.objects.create(first_name='Bob', last_name='Ray', email='bob@example.com', gpa=2, phone='456')
+        rows = [
+            'Ann,Lee,ann@example.com,3.00,123,,,',
+            'Bob,Ray,bob@example.com,2.50,,,,',
+            'Cat,Fox,cat@example.com,3.90,,,,',
+        ]
+        importer = StudentCSVImporter(mode=MODE_UPSERT).run(make_csv(rows))
+        self.assertEqual((importer.created, importer.updated, importer.unchanged), (1, 1, 1))
+        self.assertEqual(importer.errors, [])
+        bob.refresh_from_db()
+        self.assertEqual((bob.gpa, bob.phone), (Decimal('2.50'), None))
+        ann_updated_at = ann.updated_at
+        ann.refresh_from_db()
+        self.assertEqual(ann.updated_at, ann_updated_at)
+
+    def test_upsert_leaves_columns_missing_from_file(self):
+        ann = Student.objects.create(first_name='Ann', last_name='Lee', email='ann@example.com', gpa=3, phone='123')
+        importer = StudentCSVImporter(mode=MODE_UPSERT)
+        with self.assertNumQueries(5):  # savepoint, lookup, UPDATE, change log, release
+            importer.run(make_csv(['Ann,Lee,ann@example.com,3.75'], header='first_name,last_name,email,gpa'))
+        ann.refresh_from_db()
+        self.assertEqual((ann.gpa, ann.phone), (Decimal('3.75'), '123'))
+
+    def test_view_offers_error_report(self):
+        User.objects.create_user('admin', password='pass')
+        self.client.login(username='admin', password='pass')
+        response = self.client.post(reverse('import_csv'), {'csv_file': make_csv(['x,y,not-an-email,3,,,,']), 'mode': 'create'})
+        self.assertRedirects(response, reverse('import_csv'))
+        self.assertEqual(process_jobs(workers=0), 1)
+        report = self.client.get(reverse('import_error_report'))
+        self.assertEqual(report.status_code, 200)
+        self.assertIn(b'email: Enter a valid email address.', b''.join(report.streaming_content))
+
+
+class CSVExportTests(TestCase):
+    def setUp(self):
+        User.objects.create_user('admin', password='pass')
+        self.client.login(username='admin', password='pass')
+        self.ann = Student.objects.create(first_name='Ann', last_name='Lee', email='ann@example.com', gpa='3.50')
+        self.bob = Student.objects.create(first_name='Bob', last_name='Ray', email='bob@example.com', gpa='2.10')
+
+    def test_export_streams_all_students(self):
+        response = self.client.get(reverse('export_csv'))
+        self.assertTrue(response.streaming)
+        lines = b''.join(response.streaming_content).decode('utf-8').splitlines()
+        self.assertEqual(lines[0], 'ID,First Name,Last Name,Email,Phone,GPA,Date of Birth,Enrollment Date')
+        self.assertEqual(len(lines), 3)
+        self.assertTrue(lines[1].startswith(f'{self.ann.id},Ann,Lee,ann@example.com,,3.50,,'))
+
+    def test_export_gzip(self):
+        response = self.client.get(reverse('export_csv'), {'gzip': '1'})
+        self.assertEqual(response['Content-Type'], 'application/gzip')
+        self.assertIn('students.csv.gz', response['Content-Disposition'])
+        content = gzip.decompress(b''.join(response.streaming_content)).decode('utf-8')
+        self.assertIn('bob@example.com', content)
+
+    def test_bulk_export_selected_students(self):
+        response = self.client.post(reverse('bulk_export'), {'student_ids': [self.bob.id]})
+        lines = b''.join(response.streaming_content).decode('utf-8').splitlines()
+        self.assertEqual(lines, ['ID,First Name,Last Name,Email,Phone,GPA', f'{self.bob.id},Bob,Ray,bob@example.com,,2.10'])
+
+        response = self.client.post(reverse('bulk_export'), {'student_ids': [self.bob.id], 'gzip': '1'})
+        self.assertEqual(response['Content-Type'], 'application/gzip')
+        self.assertIn('selected_students.csv.gz', response['Content-Disposition'])
+        self.assertIn('bob@example.com', gzip.decompress(b''.join(response.streaming_content)).decode('utf-8'))
+        self.assertContains(self.client.get(reverse('student_list')), 'onclick="bulkExport(true)"')
+
+
+class StatsTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.addCleanup(cache.clear)
+
+    def assertStatsMatchDatabase(self):
+        cached = get_stats()
+        cache.clear()
+        self.assertEqual(cached, get_stats())
+
+    def test_stats_are_cached(self):
+        Student.objects.create(first_name='Ann', last_name='Lee', email='ann@example.com', gpa='3.60')
+        get_stats()
+        with self.assertNumQueries(0):
+            stats = get_stats()
+        self.assertEqual((stats['total'], stats['avg_gpa'], stats['excellent']), (1, Decimal('3.60'), 1))
+
+    def test_performance_level_is_stored_and_counted_in_one_query(self):
+        gpas = ['3.50', '3.49', '3.00', '2.99', '2.00', '1.99']
+        Student.objects.bulk_create([
+            Student(first_name='S', last_name=str(i), email=f's{i}@example.com', gpa=gpa) for i, gpa in enumerate(gpas)
+        ])
+        levels = list(Student.objects.order_by('-gpa').values_list('performance_level', flat=True))
+        self.assertEqual(levels, ['excellent', 'good', 'good', 'average', 'average', 'poor'])
+        self.assertEqual(levels, [performance_for(Decimal(gpa)) for gpa in gpas])
+        with self.assertNumQueries(1):
+            counters = compute_stats()
+        self.assertEqual((counters['total'], counters['good'], counters['average']), (6, 2, 2))
+        matches = filter_students(Student.objects.all(), performance='Average')
+        self.assertIn('performance_level', str(matches.query))
+        self.assertEqual(matches.count(), 2)
+        self.assertEqual(filter_students(Student.objects.all(), performance='needs_improvement').count(), 3)
+
+    def test_signals_keep_counters_in_sync(self):
+        ann = Student.objects.create(first_name='Ann', last_name='Lee', email='ann@example.com', gpa='3.60')
+        get_stats()
+        with self.captureOnCommitCallbacks(execute=True):
+            bob = Student.objects.create(first_name='Bob', last_name='Ray', email='bob@example.com', gpa='1.50')
+            ann = Student.objects.get(id=ann.id)
+            ann.gpa = Decimal('3.10')
+            ann.save()
+        with self.assertNumQueries(0):
+            stats = get_stats()
+        self.assertEqual((stats['total'], stats['good'], stats['poor'], stats['excellent']), (2, 1, 1, 0))
+        self.assertStatsMatchDatabase()
+        with self.captureOnCommitCallbacks(execute=True):
+            bob.delete()
+        self.assertStatsMatchDatabase()
+
+    def test_bulk_delete_and_import_update_counters(self):
+        User.objects.create_user('admin', password='pass')
+        self.client.login(username='admin', password='pass')
+        students = [
+            Student.objects.create(first_name='S', last_name=str(i), email=f's{i}@example.com', gpa=f'{i}.00')
+            for i in range(4)
+        ]
+        get_stats()
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.post(reverse('bulk_delete'), {'student_ids': [students[0].id, students[3].id]})
+            StudentCSVImporter().run(make_csv(['New,One,new@example.com,3.80,,,,']))
+        self.assertEqual(get_stats()['total'], 3)
+        self.assertStatsMatchDatabase()
+
+
+class KeysetPaginationTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        for i in range(7):
+            # Repeated GPAs and names exercise the id tie-breaker.
+            Student.objects.create(first_name=f'F{i % 3}', last_name=f'L{i % 2}', email=f's{i}@example.com', gpa=f'{2 + i % 3}.00')
+
+    def walk(self, sort, per_page=3):
+        seen = []
+        page = keyset_page(Student.objects.all(), sort, per_page)
+        pages = [page]
+        while page.next_cursor:
+            page = keyset_page(Student.objects.all(), sort, per_page, page.next_cursor)
+            pages.append(page)
+        for page in pages:
+            seen.extend(s.id for s in page)
+        return seen, pages
+
+    def test_walks_every_sort_order_forwards_and_backwards(self):
+        for field in SORT_FIELDS:
+            for sort in (field, '-' + field):
+                with self.subTest(sort=sort):
+                    seen, pages = self.walk(sort)
+                    expected = list(Student.objects.order_by(sort, ('-' if sort.startswith('-') else '') + 'id').values_list('id', flat=True))
+                    self.assertEqual(seen, expected)
+                    self.assertFalse(pages[0].has_previous)
+                    back = keyset_page(Student.objects.all(), sort, 3, pages[-1].previous_cursor)
+                    self.assertEqual([s.id for s in back], [s.id for s in pages[-2]])
+
+    def test_cursor_for_another_sort_starts_over(self):
+        first = keyset_page(Student.objects.all(), 'gpa', 3)
+        page = keyset_page(Student.objects.all(), 'last_name', 3, first.next_cursor)
+        self.assertFalse(page.has_previous)
+        self.assertIsNone(keyset_page(Student.objects.all(), 'gpa', 3, 'garbage').previous_cursor)
+
+    def test_per_page_is_bounded(self):
+        self.assertEqual(clean_per_page('100000'), 100)
+        self.assertEqual(clean_per_page('abc'), 10)
+
+    def test_list_view_keyset_mode_skips_count(self):
+        User.objects.create_user('admin', password='pass')
+        self.client.login(username='admin', password='pass')
+        cache.clear()
+        get_stats()
+        with self.assertNumQueries(4):  # session, user, page, recent activity
+            response = self.client.get(reverse('student_list'), {'pagination': 'keyset', 'per_page': 3, 'sort': 'gpa'})
+        self.assertContains(response, 'of about 7 students')
+        self.assertIsNotNone(response.context['keyset_page'].next_cursor)
+
+    def test_filter_params_are_url_encoded(self):
+        User.objects.create_user('admin', password='pass')
+        self.client.login(username='admin', password='pass')
+        response = self.client.get(reverse('student_list'), {'pagination': 'keyset', 'q': 'a&b #x', 'min_gpa': '2'})
+        filter_params = response.context['filter_params']
+        self.assertEqual(filter_params, '&q=a%26b+%23x&min_gpa=2&per_page=10&pagination=keyset')
+        self.assertEqual(QueryDict(filter_params[1:]).dict(), {'q': 'a&b #x', 'min_gpa': '2', 'per_page': '10', 'pagination': 'keyset'})
+
+
+class BenchmarkCommandTests(TestCase):
+    def test_benchmark_writes_results_and_cleans_up(self):
+        output = os.path.join(tempfile.mkdtemp(), 'bench.json')
+        self.addCleanup(shutil.rmtree, os.path.dirname(output))
+        call_command('benchmark_student_list', students=30, repeat=1, deep_page=2, output=output, stdout=io.StringIO())
+        with open(output) as f:
+            results = json.load(f)['results']
+        self.assertEqual({r['case'] for r in results}, {'offset_first', 'offset_deep', 'keyset_next'})
+        self.assertTrue(all(r['explain'] for r in results))
+        self.assertEqual(Student.objects.count(), 0)
+
+    def test_kept_dataset_is_topped_up_not_grown(self):
+        for students in (20, 30, 30):
+            call_command('benchmark_student_list', students=students, repeat=1, deep_page=2, keep=True, stdout=io.StringIO())
+            self.assertEqual(Student.objects.count(), students)
+
+    def test_route_benchmark_covers_every_route_and_flags_regressions(self):
+        tmp = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, tmp)
+        self.enterContext(override_settings(MEDIA_ROOT=tmp))
+        output = os.path.join(tmp, 'routes.json')
+        call_command('benchmark_routes', students='30', requests=2, output=output, stdout=io.StringIO())
+        with open(output) as f:
+            report = json.load(f)
+        self.assertEqual(missing_routes(), [])
+        self.assertEqual({r['url_name'] for r in report['results']}, {s.url_name for s in SCENARIOS})
+        self.assertEqual([r['key'] for r in report['results'] if r['errors']], [])
+        self.assertTrue(all(r['requests'] == 2 and r['p95_ms'] >= r['p50_ms'] for r in report['results']))
+        self.assertEqual(Student.objects.count(), 0)
+
+        row = report['results'][0]
+        self.assertEqual(compare([row], report, 0.25), [])
+        slower = dict(row, p95_ms=row['p95_ms'] * 2 + 1, queries=row['queries'] + 1)
+        regressions = compare([slower], report, 0.25)
+        self.assertTrue(any('p95' in r for r in regressions))
+        self.assertTrue(any('queries' in r for r in regressions))
+
+
+class SearchTests(TestCase):
+    def setUp(self):
+        self.joan = Student.objects.create(first_name='Joan', last_name='Smith', email='jsmith@uni.edu', gpa='3.00')
+        self.jo = Student.objects.create(first_name='Jo', last_name='Smithers', email='jo.s@uni.edu', gpa='3.00')
+        self.kim = Student.objects.create(first_name='Kim', last_name='Lee', email='kim@uni.edu', gpa='3.00')
+
+    def search(self, query):
+        return list(search_students(Student.objects.all(), query).order_by('-search_rank', 'id'))
+
+    def test_prefix_matching_and_ranking(self):
+        self.assertEqual(self.search('smith'), [self.joan, self.jo])
+        self.assertEqual(self.search('jo'), [self.jo, self.joan])
+        self.assertEqual(self.search('SMI'), [self.joan, self.jo])
+
+    def test_every_term_must_match(self):
+        self.assertEqual(self.search('jo smithers'), [self.jo])
+        self.assertEqual(self.search('kim smith'), [])
+
+    def test_tokens_follow_saves_and_deletes(self):
+        self.kim.last_name = 'Smithson'
+        self.kim.save()
+        self.assertIn(self.kim, self.search('smiths'))
+        self.assertNotIn(self.kim, self.search('lee'))
+        self.kim.delete()
+        self.assertFalse(StudentSearchToken.objects.filter(token='smithson').exists())
+
+    def test_imported_students_are_searchable(self):
+        StudentCSVImporter().run(make_csv(['Zed,Quartz,zed@uni.edu,3.0,,,,']))
+        self.assertEqual([s.email for s in self.search('quar')], ['zed@uni.edu'])
+
+    def test_list_view_orders_by_relevance(self):
+        User.objects.create_user('admin', password='pass')
+        self.client.login(username='admin', password='pass')
+        response = self.client.get(reverse('student_list'), {'q': 'jo'})
+        self.assertEqual(list(response.context['students']), [self.jo, self.joan])
+
+
+class ValidationTests(TestCase):
+    def setUp(self):
+        self.ann = Student.objects.create(first_name='Ann', last_name='Lee', email='ann@example.com', gpa='3.60')
+
+    def record(self, **values):
+        return {'first_name': 'Bob', 'last_name': 'Ray', 'email': 'bob@example.com', 'gpa': '3.10', **values}
+
+    def test_batch_checks_every_email_in_one_query(self):
+        records = [self.record(email=f's{i}@example.com') for i in range(50)]
+        records += [self.record(email='ann@example.com'), self.record(email='S3@example.com')]
+        with self.assertNumQueries(1):
+            results = validate_students(records)
+        self.assertEqual([i for i, (_, errors) in enumerate(results) if errors], [50, 51])
+        self.assertEqual(results[50][1]['email'][0]['code'], 'unique')
+        self.assertEqual(results[51][1]['email'][0]['code'], 'duplicate')
+        data, errors = validate_students([self.record(email='ann@example.com', phone=' ')], [self.ann])[0]
+        self.assertEqual((errors, data['gpa'], data['phone']), ({}, Decimal('3.10'), None))
+        self.assertNotIn('enrollment_date', data)
+
+    def test_form_and_batch_apply_the_same_rules(self):
+        invalid = {
+            'gpa': ['4.50', '3.555', 'abc'],
+            'email': ['not-an-email', 'ann@example.com'],
+            'first_name': ['   ', 'x' * 51],
+            'date_of_birth': ['2000-13-01'],
+        }
+        for name, values in invalid.items():
+            for value in values:
+                with self.subTest(name=name, value=value):
+                    form = StudentForm(data=self.record(**{name: value}))
+                    self.assertFalse(form.is_valid())
+                    _, errors = validate_students([self.record(**{name: value})])[0]
+                    self.assertEqual(list(errors), [name])
+                    self.assertEqual(form.errors.get_json_data()[name][0]['code'], errors[name][0]['code'])
+        form = StudentForm(data=self.record(enrollment_date=''))
+        self.assertTrue(form.is_valid(), form.errors)
+        student = form.save()
+        student.refresh_from_db()
+        self.assertEqual(student.enrollment_date, timezone.now().date())
+
+
+class APITests(TestCase):
+    def setUp(self):
+        cache.clear()
+        User.objects.create_user('admin', password='pass')
+        self.client.login(username='admin', password='pass')
+        self.ann = Student.objects.create(first_name='Ann', last_name='Lee', email='ann@example.com', gpa='3.60', address='x' * 500)
+        self.bob = Student.objects.create(first_name='Bob', last_name='Ray', email='bob@example.com', gpa='2.10')
+
+    def send(self, method, name, data, **kwargs):
+        return getattr(self.client, method)(reverse(name, **kwargs), json.dumps(data), content_type='application/json')
+
+    def test_requires_login(self):
+        self.client.logout()
+        self.assertEqual(self.client.get(reverse('api_students')).status_code, 401)
+
+    def test_token_writes_skip_csrf_and_session_writes_need_it(self):
+        client = self.client_class(enforce_csrf_checks=True)
+        payload = json.dumps({'first_name': 'Cat', 'last_name': 'Fox', 'email': 'cat@example.com', 'gpa': '3.00'})
+        out = io.StringIO()
+        call_command('create_api_token', 'admin', name='sync script', stdout=out)
+        key = re.search(r'Token (\S+)"', out.getvalue()).group(1)
+
+        response = client.post(reverse('api_students'), payload, content_type='application/json', headers={'Authorization': f'Token {key}'})
+        self.assertEqual(response.status_code, 201)
+        self.assertIsNotNone(APIToken.objects.get().last_used_at)
+        response = client.get(reverse('api_students'), headers={'Authorization': 'Token wrong'})
+        self.assertEqual(response.status_code, 401)
+
+        client.login(username='admin', password='pass')
+        response = client.post(reverse('api_students'), payload, content_type='application/json')
+        self.assertEqual(response.status_code, 403)
+        self.assertIn('CSRF', response.json()['error'])
+        csrf_token = client.get(reverse('student_list')).cookies['csrftoken'].value
+        payload = json.dumps({'first_name': 'Dan', 'last_name': 'Fox', 'email': 'dan@example.com', 'gpa': '3.00'})
+        response = client.post(reverse('api_students'), payload, content_type='application/json', headers={'X-CSRFToken': csrf_token})
+        self.assertEqual(response.status_code, 201)
+
+    def test_list_with_sparse_fields_filters_and_cursor(self):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(reverse('api_students'), {'fields': 'id,gpa,performance_level', 'sort': 'gpa', 'per_page': 1})
+        data = response.json()
+        self.assertEqual(data['results'], [{'id': self.bob.id, 'gpa': '2.10', 'performance_level': 'Average'}])
+        self.assertNotIn('address', queries[-1]['sql'])
+        data = self.client.get(reverse('api_students'), {'fields': 'email', 'sort': 'gpa', 'per_page': 1, 'cursor': data['next']}).json()
+        self.assertEqual(data['results'], [{'email': 'ann@example.com'}])
+        self.assertIsNone(data['next'])
+        data = self.client.get(reverse('api_students'), {'performance': 'excellent', 'fields': 'id'}).json()
+        self.assertEqual((data['count'], data['results']), (1, [{'id': self.ann.id}]))
+        self.assertEqual(self.client.get(reverse('api_students'), {'fields': 'password'}).status_code, 400)
+
+    def test_conditional_get(self):
+        response = self.client.get(reverse('api_student', args=[self.ann.id]))
+        self.assertEqual(response.json()['email'], 'ann@example.com')
+        with self.assertNumQueries(3):  # session, user, updated_at lookup
+            cached = self.client.get(reverse('api_student', args=[self.ann.id]), HTTP_IF_NONE_MATCH=response['ETag'])
+        self.assertEqual(cached.status_code, 304)
+        listing = self.client.get(reverse('api_students'))
+        self.assertEqual(self.client.get(reverse('api_students'), HTTP_IF_NONE_MATCH=listing['ETag']).status_code, 304)
+
+    def test_create_update_delete(self):
+        response = self.send('post', 'api_students', {'first_name': 'Cat', 'last_name': 'Fox', 'email': 'cat@example.com', 'gpa': '3.10'})
+        self.assertEqual(response.status_code, 201)
+        cat_id = response.json()['id']
+        response = self.send('patch', 'api_student', {'gpa': '3.90'}, args=[cat_id])
+        self.assertEqual(response.json()['performance_level'], 'Excellent')
+        response = self.send('put', 'api_student', {'gpa': '3.90'}, args=[cat_id])
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.json()['errors']['email'], [{'message': 'This field is required.', 'code': 'required'}])
+        response = self.send('patch', 'api_student', {'email': 'ann@example.com'}, args=[cat_id])
+        self.assertIn('email', response.json()['errors'])
+        self.assertEqual(self.client.delete(reverse('api_student', args=[cat_id])).status_code, 204)
+        self.assertFalse(Student.objects.filter(id=cat_id).exists())
+
+    def test_bulk_endpoints(self):
+        response = self.send('post', 'api_students_bulk', [
+            {'first_name': 'Cat', 'last_name': 'Fox', 'email': 'cat@example.com', 'gpa': '3.10'},
+            {'first_name': 'Dan', 'last_name': 'Roe', 'email': 'dan@example.com', 'gpa': '1.10'},
+        ])
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(Student.objects.count(), 4)
+        response = self.send('post', 'api_students_bulk', [{'first_name': 'E', 'last_name': 'F', 'email': 'bad', 'gpa': '1'}])
+        self.assertEqual(list(response.json()['errors']), ['0'])
+
+        response = self.send('patch', 'api_students_bulk', [{'id': self.ann.id, 'gpa': '3.00'}, {'id': self.bob.id, 'phone': '555'}])
+        self.assertEqual(response.status_code, 200)
+        self.ann.refresh_from_db()
+        self.bob.refresh_from_db()
+        self.assertEqual((self.ann.gpa, self.ann.address, self.bob.phone, self.bob.gpa), (Decimal('3.00'), 'x' * 500, '555', Decimal('2.10')))
+
+        response = self.send('delete', 'api_students_bulk', [self.ann.id, self.bob.id])
+        self.assertEqual(response.json(), {'deleted': 2})
+
+
+@override_settings(STUDENT_CHANGES_SETTLE_SECONDS=0)
+class ChangeLogTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        User.objects.create_user('admin', password='pass')
+        self.client.login(username='admin', password='pass')
+        self.ann = Student.objects.create(first_name='Ann', last_name='Lee', email='ann@example.com', gpa='3.60')
+        self.bob = Student.objects.create(first_name='Bob', last_name='Ray', email='bob@example.com', gpa='2.10')
+
+    def log(self):
+        return list(StudentChange.objects.order_by('id').values_list('action', 'student_id'))
+
+    def test_records_single_and_bulk_writes(self):
+        self.ann.gpa = '3.70'
+        self.ann.save()
+        StudentCSVImporter(mode=MODE_UPSERT).run(make_csv(
+            ['Bob,Ray,bob@example.com,2.50', 'Cat,Fox,cat@example.com,3.90'], header='first_name,last_name,email,gpa'))
+        cat = Student.objects.get(email='cat@example.com')
+        with CaptureQueriesContext(connection) as queries:
+            self.client.post(reverse('bulk_delete'), {'student_ids': [self.ann.id, cat.id]})
+        inserts = [q for q in queries if q['sql'].startswith('INSERT') and 'studentchange' in q['sql']]
+        self.assertEqual(len(inserts), 1)
+        log = self.log()
+        self.assertEqual(log[:5], [
+            ('create', self.ann.id), ('create', self.bob.id), ('update', self.ann.id), ('create', cat.id), ('update', self.bob.id),
+        ])
+        self.assertCountEqual(log[5:], [('delete', self.ann.id), ('delete', cat.id)])
+
+    def test_json_feed_pages_by_cursor(self):
+        ann_id = self.ann.id
+        self.ann.delete()
+        self.bob.phone = '555'
+        self.bob.save()
+        data = self.client.get(reverse('api_student_changes'), {'limit': 2, 'fields': 'id,email'}).json()
+        # The first two entries are Ann's create and Bob's create.
+        self.assertEqual([(c['action'], c['student']) for c in data['changes']], [
+            ('create', {'id': self.bob.id, 'email': 'bob@example.com'}),
+        ])
+        self.assertTrue(data['has_more'])
+        data = self.client.get(reverse('api_student_changes'), {'after': data['next_cursor'], 'fields': 'id'}).json()
+        self.assertEqual([(c['action'], c['student_id'], c['student']) for c in data['changes']], [
+            ('delete', ann_id, None), ('update', self.bob.id, {'id': self.bob.id}),
+        ])
+        self.assertFalse(data['has_more'])
+        empty = self.client.get(reverse('api_student_changes'), {'after': data['next_cursor']}).json()
+        self.assertEqual((empty['changes'], empty['next_cursor']), ([], data['next_cursor']))
+        self.assertEqual(self.client.get(reverse('api_student_changes'), {'after': 'x'}).status_code, 400)
+
+    def test_csv_feed_and_since(self):
+        StudentChange.objects.update(changed_at=timezone.now() - timedelta(hours=1))
+        since = timezone.now() - timedelta(minutes=1)
+        self.bob.delete()
+        response = self.client.get(reverse('api_student_changes'), {'format': 'csv', 'since': since.isoformat()})
+        lines = response.content.decode().splitlines()
+        self.assertTrue(lines[0].startswith('Change ID,Action,Changed At,ID,First Name'))
+        self.assertEqual(len(lines), 2)
+        self.assertIn(',delete,', lines[1])
+        self.assertEqual(response['X-Next-Cursor'], str(StudentChange.objects.latest('id').id))
+        self.assertEqual(response['X-Has-More'], 'false')
+
+    def test_holds_back_recent_changes(self):
+        with override_settings(STUDENT_CHANGES_SETTLE_SECONDS=60):
+            data = self.client.get(reverse('api_student_changes')).json()
+        self.assertEqual((data['changes'], data['next_cursor']), ([], 0))
+
+
+@override_settings(STUDENT_CHANGES_SETTLE_SECONDS=0)
+class SoftDeleteTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.media_root)
+        self.enterContext(override_settings(MEDIA_ROOT=self.media_root))
+        self.client.force_login(User.objects.create_user('admin'))
+        self.students = [
+            Student.objects.create(first_name=f'S{i}', last_name='Lee', email=f's{i}@example.com', gpa='3.00')
+            for i in range(5)
+        ]
+        self.ids = [s.id for s in self.students]
+
+    def test_bulk_delete_hides_rows_and_restore_brings_them_back(self):
+        get_stats()
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.post(reverse('bulk_delete'), {'student_ids': self.ids[:3]})
+        self.assertEqual(Student.objects.count(), 2)
+        self.assertEqual(Student.all_objects.filter(deleted_at__isnull=False).count(), 3)
+        self.assertEqual(get_stats()['total'], 2)
+        self.assertEqual(self.client.get(reverse('student_detail', args=[self.ids[0]])).status_code, 404)
+        self.assertEqual(StudentChange.objects.filter(action=StudentChange.DELETE).count(), 3)
+
+        response = self.client.post(reverse('student_create'), {
+            'first_name': 'New', 'last_name': 'Lee', 'email': 's0@example.com', 'gpa': '3.00',
+        })
+        self.assertContains(response, 'deleted student that has not been purged')
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.assertEqual(restore_students(self.ids[:2]), 2)
+        self.assertEqual(Student.objects.count(), 4)
+        self.assertEqual(get_stats()['total'], 4)
+
+    def test_upsert_rejects_deleted_email_without_counting_it_unchanged(self):
+        soft_delete_students(Student.objects.filter(id=self.ids[0]))
+        rows = ['S0,Lee,s0@example.com,3.50', 'S1,Lee,s1@example.com,3.00', 'New,Lee,new@example.com,2.00']
+        importer = StudentCSVImporter(mode=MODE_UPSERT).run(make_csv(rows, header='first_name,last_name,email,gpa'))
+        self.assertEqual((importer.created, importer.updated, importer.unchanged), (1, 0, 1))
+        self.assertEqual(importer.errors, [(2, 'email: This email belongs to a deleted student that has not been purged yet.')])
+        self.assertIn('Updated 0, 1 unchanged. 1 errors.', importer.summary())
+
+    def test_delete_does_not_load_rows(self):
+        # session, user, savepoint, id/gpa lookup, UPDATE, change log, release
+        with self.assertNumQueries(7):
+            self.client.post(reverse('bulk_delete'), {'student_ids': self.ids})
+        self.assertFalse(Student.objects.exists())
+
+    def test_purge_removes_old_rows_and_their_files(self):
+        default_storage.save('student_profiles/s0.png', io.BytesIO(b'png'))
+        default_storage.save('student_thumbs/s0.jpg', io.BytesIO(b'jpg'))
+        Student.objects.filter(id=self.ids[0]).update(
+            profile_picture='student_profiles/s0.png', profile_thumbnails={'avatar': 'student_thumbs/s0.jpg'},
+        )
+        batch = EmailBatch.objects.create(subject='Hi', message='Hello')
+        QueuedEmail.objects.create(batch=batch, student=self.students[0], to_email='s0@example.com')
+        self.client.post(reverse('bulk_delete'), {'student_ids': self.ids[:4]})
+        Student.all_objects.filter(id__in=self.ids[:3]).update(deleted_at=timezone.now() - timedelta(days=40))
+
+        with mock.patch('students.deletion.time.sleep') as sleep:
+            call_command('purge_students', '--batch-size', '2', '--pause', '0', stdout=io.StringIO())
+        self.assertEqual(sleep.call_count, 1)
+        self.assertEqual(list(Student.all_objects.order_by('id').values_list('id', flat=True)), self.ids[3:])
+        self.assertFalse(default_storage.exists('student_profiles/s0.png'))
+        self.assertFalse(default_storage.exists('student_thumbs/s0.jpg'))
+        self.assertIsNone(QueuedEmail.objects.get().student_id)
+        self.assertFalse(StudentSearchToken.objects.filter(student_id__in=self.ids[:3]).exists())
+        self.assertEqual(purge_students(pause=0), 0)
+
+
+class BulkEditTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        User.objects.create_user('admin', password='pass')
+        self.client.login(username='admin', password='pass')
+        self.ann = Student.objects.create(first_name='Ann', last_name='Lee', email='ann@example.com', gpa='3.90', phone='123')
+        self.bob = Student.objects.create(first_name='Bob', last_name='Ray', email='bob@example.com', gpa='2.10', phone='456')
+        self.cat = Student.objects.create(first_name='Cat', last_name='Fox', email='cat@example.com', gpa='1.00', phone='789')
+
+    def test_selected_students_in_one_update(self):
+        get_stats()
+        response = self.client.post(reverse('bulk_edit'), {'student_ids': [self.ann.id, self.bob.id]})
+        self.assertContains(response, '2 selected students')
+        data = {'student_ids': [self.ann.id, self.bob.id], 'gpa_action': 'adjust', 'gpa': '0.25',
+                'phone_action': 'clear', 'apply': '1'}
+        with CaptureQueriesContext(connection) as queries, self.captureOnCommitCallbacks(execute=True):
+            response = self.client.post(reverse('bulk_edit'), data)
+        self.assertRedirects(response, reverse('student_list'), fetch_redirect_response=False)
+        self.assertEqual(len([q for q in queries if q['sql'].startswith('UPDATE "students_student"')]), 1)
+        self.ann.refresh_from_db()
+        self.bob.refresh_from_db()
+        self.cat.refresh_from_db()
+        self.assertEqual((self.ann.gpa, self.ann.phone, self.ann.performance_level), (Decimal('4.00'), None, 'excellent'))
+        self.assertEqual((self.bob.gpa, self.bob.phone), (Decimal('2.35'), None))
+        self.assertEqual((self.cat.gpa, self.cat.phone), (Decimal('1.00'), '789'))
+        self.assertEqual(get_stats()['excellent'], 1)
+        self.assertEqual(get_stats()['avg_gpa'], Decimal('2.45'))
+        self.assertEqual(
+            sorted(StudentChange.objects.filter(action='update').values_list('student_id', flat=True)),
+            [self.ann.id, self.bob.id],
+        )
+
+    def test_current_filter_scope(self):
+        response = self.client.get(reverse('bulk_edit'), {'scope': 'filter', 'max_gpa': '2.5'})
+        self.assertContains(response, 'All 2 students matching')
+        response = self.client.post(reverse('bulk_edit'), {
+            'scope': 'filter', 'max_gpa': '2.5', 'q': '', 'enrollment_date': '2024-09-01', 'apply': '1',
+        })
+        self.assertRedirects(response, reverse('student_list') + '?max_gpa=2.5', fetch_redirect_response=False)
+        dates = dict(Student.objects.values_list('email', 'enrollment_date'))
+        self.assertEqual(str(dates['bob@example.com']), '2024-09-01')
+        self.assertEqual(str(dates['cat@example.com']), '2024-09-01')
+        self.assertNotEqual(str(dates['ann@example.com']), '2024-09-01')
+
+    def test_rejects_empty_and_invalid_edits(self):
+        response = self.client.post(reverse('bulk_edit'), {'student_ids': [self.ann.id], 'apply': '1'})
+        self.assertContains(response, 'Choose at least one change')
+        response = self.client.post(reverse('bulk_edit'), {'student_ids': [self.ann.id], 'gpa_action': 'set', 'gpa': '5', 'apply': '1'})
+        self.assertContains(response, 'GPA must be between')
+        self.ann.refresh_from_db()
+        self.assertEqual(self.ann.gpa, Decimal('3.90'))
+        self.assertRedirects(self.client.post(reverse('bulk_edit')), reverse('student_list'), fetch_redirect_response=False)
+
+
+class BulkEmailTests(TestCase):
+    def setUp(self):
+        User.objects.create_user('admin', password='pass')
+        self.client.login(username='admin', password='pass')
+        self.students = [
+            Student.objects.create(first_name='S', last_name=str(i), email=f's{i}@example.com', gpa='3.00')
+            for i in range(3)
+        ]
+        self.ids = [s.id for s in self.students]
+
+    def test_compose_queue_and_deliver(self):
+        response = self.client.post(reverse('bulk_email'), {'student_ids': self.ids})
+        self.assertContains(response, '3 selected students')
+        response = self.client.post(reverse('bulk_email'), {'student_ids': self.ids, 'subject': 'Hi', 'message': 'Body', 'send': '1'})
+        batch = EmailBatch.objects.get()
+        self.assertRedirects(response, reverse('email_batch_detail', args=[batch.id]))
+        self.assertEqual(len(mail.outbox), 0)
+
+        opened = []
+        original_open = EmailBackend.open
+        with mock.patch.object(EmailBackend, 'open', autospec=True, side_effect=lambda b: opened.append(b) or original_open(b)):
+            self.assertEqual(process_queue(rate_limit=0), 3)
+        self.assertEqual(len(opened), 1)
+        self.assertEqual(sorted(m.to[0] for m in mail.outbox), ['s0@example.com', 's1@example.com', 's2@example.com'])
+        status = self.client.get(reverse('email_batch_detail', args=[batch.id]), {'format': 'json'}).json()
+        self.assertEqual(status, {'total': 3, 'pending': 0, 'sent': 3, 'failed': 0, 'done': True})
+
+    def test_failures_are_retried_then_marked_failed(self):
+        self.client.post(reverse('bulk_email'), {'student_ids': self.ids[:1], 'subject': 'Hi', 'message': 'Body', 'send': '1'})
+        with mock.patch.object(EmailBackend, 'send_messages', side_effect=OSError('connection refused')):
+            for attempt in range(EMAIL_MAX_ATTEMPTS):
+                QueuedEmail.objects.update(next_attempt_at=timezone.now())
+                self.assertEqual(process_queue(rate_limit=0), 1)
+        email = QueuedEmail.objects.get()
+        self.assertEqual((email.status, email.attempts, email.last_error), (QueuedEmail.FAILED, 3, 'connection refused'))
+        self.assertEqual(process_queue(rate_limit=0), 0)
+
+    def test_connection_failure_counts_as_attempt(self):
+        self.client.post(reverse('bulk_email'), {'student_ids': self.ids, 'subject': 'Hi', 'message': 'Body', 'send': '1'})
+        with mock.patch.object(EmailBackend, 'open', side_effect=OSError('connection refused')):
+            for attempt in range(EMAIL_MAX_ATTEMPTS):
+                QueuedEmail.objects.update(next_attempt_at=timezone.now())
+                self.assertEqual(process_queue(rate_limit=0), 3)
+        self.assertEqual(set(QueuedEmail.objects.values_list('status', 'attempts', 'claim')), {(QueuedEmail.FAILED, 3, '')})
+        self.assertEqual(len(mail.outbox), 0)
+
+    def test_sent_but_unrecorded_rows_stay_claimed(self):
+        self.client.post(reverse('bulk_email'), {'student_ids': self.ids[:1], 'subject': 'Hi', 'message': 'Body', 'send': '1'})
+        original_update = QuerySet.update
+
+        def update(queryset, **fields):
+            if fields.get('status') == QueuedEmail.SENT:
+                raise OperationalError('database is locked')
+            return original_update(queryset, **fields)
+
+        with mock.patch.object(QuerySet, 'update', autospec=True, side_effect=update), self.assertLogs('students.mailer', 'ERROR') as logs:
+            self.assertEqual(process_queue(rate_limit=0), 1)
+        self.assertIn('was sent but could not be marked sent', logs.output[-1])
+        email = QueuedEmail.objects.get()
+        self.assertEqual((email.status, email.attempts, email.last_error), (QueuedEmail.SENDING, 0, ''))
+        self.assertNotEqual(email.claim, '')
+        self.assertEqual(len(mail.outbox), 1)
+        self.assertEqual(process_queue(rate_limit=0), 0)
+
+    def test_sent_rows_are_marked_before_the_batch_ends(self):
+        self.client.post(reverse('bulk_email'), {'student_ids': self.ids, 'subject': 'Hi', 'message': 'Body', 'send': '1'})
+        original_send = EmailBackend.send_messages
+
+        def send_then_crash(backend, messages):
+            if len(mail.outbox) == 2:
+                raise KeyboardInterrupt
+            return original_send(backend, messages)
+
+        with mock.patch.object(EmailBackend, 'send_messages', autospec=True, side_effect=send_then_crash):
+            with self.assertRaises(KeyboardInterrupt):
+                process_queue(rate_limit=0)
+        statuses = sorted(QueuedEmail.objects.values_list('status', flat=True))
+        self.assertEqual(statuses, sorted([QueuedEmail.SENT, QueuedEmail.SENT, QueuedEmail.SENDING]))
+
+
+class JobTests(TestCase):
+    def setUp(self):
+        media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, media_root)
+        self.enterContext(override_settings(MEDIA_ROOT=media_root))
+        self.user = User.objects.create_user('admin', password='pass')
+        self.client.force_login(self.user)
+
+    def test_import_is_queued_and_reports_progress(self):
+        rows = [f'First{i},Last{i},student{i}@example.com,3.{i},,,,' for i in range(5)] + ['x,y,bad,3,,,,']
+        self.client.post(reverse('import_csv'), {'csv_file': make_csv(rows), 'mode': 'create'})
+        job = Job.objects.get()
+        self.assertEqual((job.kind, job.status, job.created_by), (Job.IMPORT, Job.QUEUED, self.user))
+        self.assertEqual(Student.objects.count(), 0)
+        response = self.client.get(reverse('import_csv'))
+        self.assertContains(response, reverse('job_detail', args=[job.id]))
+
+        upload = job.input_file.name
+        self.assertEqual(process_jobs(workers=0), 1)
+        status = self.client.get(reverse('job_detail', args=[job.id]), {'format': 'json'}).json()
+        self.assertEqual((status['status'], status['percent'], status['done']), ('succeeded', 100, True))
+        self.assertEqual((status['result']['created'], status['result']['errors']), (5, 1))
+        self.assertEqual(Student.objects.count(), 5)
+        self.assertFalse(default_storage.exists(upload))
+        report = self.client.get(status['download_url'])
+        self.assertIn(b'email: Enter a valid email address.', b''.join(report.streaming_content))
+
+    def test_bad_upload_fails_the_job(self):
+        self.client.post(reverse('import_csv'), {'csv_file': make_csv(['a,b'], header='first_name,last_name'), 'mode': 'create'})
+        upload = Job.objects.get().input_file.name
+        process_jobs(workers=0)
+        job = Job.objects.get()
+        self.assertEqual((job.status, job.error), (Job.FAILED, 'Missing required column(s): email, gpa'))
+        self.assertEqual(job.input_file.name, '')
+        self.assertFalse(default_storage.exists(upload))
+
+    def test_crashed_import_deletes_the_upload(self):
+        self.client.post(reverse('import_csv'), {'csv_file': make_csv(['Ann,Lee,ann@example.com,3.00,,,,']), 'mode': 'create'})
+        upload = Job.objects.get().input_file.name
+        with mock.patch.object(StudentCSVImporter, 'run', side_effect=RuntimeError('disk full')), self.assertLogs('students.jobs', 'ERROR'):
+            process_jobs(workers=0)
+        job = Job.objects.get()
+        self.assertEqual((job.status, job.error, job.input_file.name), (Job.FAILED, 'disk full', ''))
+        self.assertFalse(default_storage.exists(upload))
+
+    def test_export_job_writes_a_downloadable_file(self):
+        Student.objects.create(first_name='Ann', last_name='Lee', email='ann@example.com', gpa='3.50')
+        response = self.client.post(reverse('export_job'), {'gzip': '1'})
+        job = Job.objects.get()
+        self.assertRedirects(response, reverse('job_detail', args=[job.id]))
+        self.assertContains(self.client.get(reverse('job_detail', args=[job.id])), 'Export #%d' % job.id)
+        self.assertEqual(self.client.get(reverse('job_download', args=[job.id])).status_code, 404)
+
+        process_jobs(workers=0)
+        job.refresh_from_db()
+        self.assertEqual((job.status, job.processed, job.total), (Job.SUCCEEDED, 1, 1))
+        response = self.client.get(reverse('job_download', args=[job.id]))
+        self.assertIn('students.csv.gz', response['Content-Disposition'])
+        self.assertIn('ann@example.com', gzip.decompress(b''.join(response.streaming_content)).decode('utf-8'))
+
+        name = job.result_file.name
+        with self.captureOnCommitCallbacks(execute=True):
+            job.delete()
+        self.assertFalse(default_storage.exists(name))
+
+    def test_stale_jobs_are_reclaimed_then_failed(self):
+        job = Job.objects.create(kind=Job.EXPORT)
+        first = claim_next()
+        self.assertEqual((first.id, first.status, first.attempts), (job.id, Job.RUNNING, 1))
+        self.assertIsNone(claim_next())
+
+        for attempt in range(2, JOB_MAX_ATTEMPTS + 1):
+            Job.objects.update(heartbeat_at=timezone.now() - timedelta(seconds=JOB_STALE_TIMEOUT + 1))
+            reclaimed = claim_next()
+            self.assertEqual(reclaimed.attempts, attempt)
+            self.assertNotEqual(reclaimed.claim, first.claim)
+        Job.objects.update(heartbeat_at=timezone.now() - timedelta(seconds=JOB_STALE_TIMEOUT + 1))
+        self.assertIsNone(claim_next())
+        job.refresh_from_db()
+        self.assertEqual(job.status, Job.FAILED)
+
+
+class ThumbnailTests(TestCase):
+    def setUp(self):
+        self.media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.media_root)
+        self.enterContext(override_settings(MEDIA_ROOT=self.media_root, STUDENT_THUMBNAILS_ASYNC=False))
+        User.objects.create_user('admin', password='pass')
+        self.client.login(username='admin', password='pass')
+
+    def upload(self, color):
+        from PIL import Image
+
+        output = io.BytesIO()
+        Image.new('RGB', (800, 600), color).save(output, format='PNG')
+        return SimpleUploadedFile('face.png', output.getvalue(), content_type='image/png')
+
+    def media_files(self):
+        return sorted(
+            os.path.relpath(os.path.join(root, name), self.media_root)
+            for root, _, names in os.walk(self.media_root) for name in names
+        )
+
+    def test_thumbnails_generated_served_and_cleaned_up(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            student = Student.objects.create(
+                first_name='Ann', last_name='Lee', email='ann@example.com', gpa='3.00', profile_picture=self.upload('red'),
+            )
+        student.refresh_from_db()
+        self.assertEqual(sorted(student.profile_thumbnails), ['avatar', 'detail', 'print'])
+        first_files = self.media_files()
+        self.assertEqual(len(first_files), 4)
+
+        response = self.client.get(student.thumbnail_urls['avatar'])
+        self.assertEqual(response['Content-Type'], 'image/jpeg')
+        self.assertIn('immutable', response['Cache-Control'])
+        from PIL import Image
+        self.assertEqual(Image.open(io.BytesIO(b''.join(response.streaming_content))).size, (128, 128))
+        self.assertEqual(self.client.get(reverse('student_thumbnail', args=['missing.jpg'])).status_code, 404)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            student.profile_picture = self.upload('blue')
+            student.save()
+        student.refresh_from_db()
+        second_files = self.media_files()
+        self.assertEqual(len(second_files), 4)
+        self.assertFalse(set(first_files) & set(second_files))
+
+        with self.captureOnCommitCallbacks(execute=True):
+            student.delete()
+        self.assertEqual(self.media_files(), [])
+
+    def test_falls_back_to_original_until_generated(self):
+        student = Student.objects.create(
+            first_name='Bob', last_name='Ray', email='bob@example.com', gpa='3.00', profile_picture=self.upload('green'),
+        )
+        self.assertEqual(student.thumbnail_urls['detail'], student.profile_picture.url)
+        self.assertEqual(Student(first_name='No', last_name='Pic').thumbnail_urls, {})
+
+
+@override_settings(STUDENT_METRICS_ENABLED=True)
+class InstrumentationTests(TestCase):
+    def setUp(self):
+        instrumentation.clear_records()
+        self.addCleanup(instrumentation.clear_records)
+        self.user = User.objects.create_user('admin', password='pass')
+        self.client.login(username='admin', password='pass')
+        for i in range(3):
+            Student.objects.create(first_name='S', last_name=str(i), email=f's{i}@example.com', gpa='3.00')
+
+    def test_records_queries_templates_and_size(self):
+        response = self.client.get(reverse('student_list'))
+        entry = instrumentation.get_records()[-1]
+        self.assertEqual(entry['url_name'], 'student_list')
+        self.assertEqual(entry['status'], 200)
+        self.assertGreater(entry['queries'], 0)
+        self.assertGreater(entry['template_ms'], 0)
+        self.assertEqual(entry['response_bytes'], len(response.content))
+
+    def test_duplicate_queries_are_flagged(self):
+        student = Student.objects.first()
+        for _ in range(2):
+            self.client.get(reverse('student_detail', args=[student.id]))
+        summary = instrumentation.summarize(instrumentation.get_records())
+        self.assertEqual(summary['student_detail']['requests'], 2)
+
+        recorder = instrumentation.RequestMetrics()
+        with connection.execute_wrapper(recorder):
+            for s in Student.objects.all():
+                Student.objects.get(id=s.id)
+                Student.objects.get(id=s.id)
+        self.assertEqual(recorder.duplicates(), 3)
+        self.assertEqual(recorder.similar()[0], 6)
+
+    def test_endpoint_is_staff_only_and_summarizes(self):
+        self.client.get(reverse('student_list'))
+        self.assertEqual(self.client.get(reverse('request_metrics')).status_code, 403)
+        self.user.is_staff = True
+        self.user.save()
+        data = self.client.get(reverse('request_metrics'), {'records': 1}).json()
+        self.assertIn('student_list', data['summary'])
+        self.assertNotIn('request_metrics', data['summary'])
+        self.assertEqual(instrumentation.percentile([5, 1, 4, 2, 3], 50), 3)
+        self.assertEqual(instrumentation.percentile(list(range(1, 101)), 99), 99)
+
+        path = os.path.join(tempfile.mkdtemp(), 'metrics.json')
+        self.addCleanup(shutil.rmtree, os.path.dirname(path))
+        with open(path, 'w') as f:
+            json.dump(data, f)
+        out = io.StringIO()
+        call_command('request_metrics', path, stdout=out)
+        self.assertIn('student_list', out.getvalue())
+
+
+class FragmentCacheTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        caching.reset_cache_stats()
+        User.objects.create_user('admin', password='pass')
+        self.client.login(username='admin', password='pass')
+        self.ann = Student.objects.create(first_name='Ann', last_name='Lee', email='ann@example.com', gpa='3.00')
+
+    def test_detail_fragment_is_reused_until_the_student_changes(self):
+        url = reverse('student_detail', args=[self.ann.id])
+        self.client.get(url)
+        self.assertContains(self.client.get(url), 'ann@example.com')
+        self.assertEqual(caching.cache_stats()['student_detail'], {'hits': 1, 'misses': 1, 'hit_ratio': 0.5})
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.ann.email = 'ann.lee@example.com'
+            self.ann.save()
+        self.assertContains(self.client.get(url), 'ann.lee@example.com')
+        self.assertEqual(caching.cache_stats()['student_detail']['misses'], 2)
+
+    def test_print_pdf_skips_queries_on_a_hit_and_bulk_paths_invalidate(self):
+        url = reverse('print_student_list_pdf')
+        first = self.client.get(url).content
+        with CaptureQueriesContext(connection) as hit:
+            self.assertEqual(self.client.get(url).content, first)
+        self.assertFalse(any('students_student' in q['sql'] for q in hit.captured_queries))
+
+        version = caching.table_version()
+        with self.captureOnCommitCallbacks(execute=True):
+            StudentCSVImporter(mode=MODE_UPSERT).run(make_csv(['Bo,Ray,bo@example.com,2.50,,,,']))
+        self.assertNotEqual(caching.table_version(), version)
+        self.assertIn(b'(Bo Ray)', pdf_text_streams(self.client.get(url).content))
+
+    def test_list_fragments_follow_table_version(self):
+        self.client.get(reverse('student_list'))
+        self.client.get(reverse('student_list'))
+        self.assertEqual(caching.cache_stats()['list_stats']['hits'], 1)
+        student_version = caching.student_version(self.ann.id)
+        with self.captureOnCommitCallbacks(execute=True):
+            Student.objects.create(first_name='Cy', last_name='Day', email='cy@example.com', gpa='3.90')
+        self.assertEqual(caching.student_version(self.ann.id), student_version)
+        self.assertContains(self.client.get(reverse('student_list')), '<h3>2</h3>')
+
+    def test_list_stats_follow_a_recompute_that_corrects_drift(self):
+        self.client.get(reverse('student_list'))
+        version = caching.table_version()
+        # Bypasses the signals, so neither the counters nor the versions move.
+        Student.objects.filter(id=self.ann.id).update(gpa='3.90')
+        self.assertContains(self.client.get(reverse('student_list')), '<h3>3.00</h3>')
+        invalidate_stats()
+        self.assertContains(self.client.get(reverse('student_list')), '<h3>3.90</h3>')
+        self.assertEqual(caching.table_version(), version)
+
+        generation = stats_generation()
+        compute_stats()
+        self.assertEqual(stats_generation(), generation)
+
+
+def selected_columns(sql):
+    # Student columns in the SELECT list of a captured query.
+    return set(re.findall(r'"students_student"\."(\w+)"', sql[:sql.index(' FROM ')]))
+
+
+def student_selects(queries):
+    return [q['sql'] for q in queries.captured_queries if q['sql'].startswith('SELECT') and 'FROM "students_student"' in q['sql']]
+
+
+class ProjectionTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.client.force_login(User.objects.create_user('admin'))
+        Student.objects.bulk_create([
+            Student(first_name=f'F{i}', last_name=f'L{i}', email=f's{i}@example.com', gpa='3.20', address='x' * 1000)
+            for i in range(15)
+        ])
+
+    def test_list_page_reads_only_displayed_columns(self):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(reverse('student_list'))
+        self.assertContains(response, 's14@example.com')
+        # session, user, stats, COUNT, page, recent activity
+        self.assertEqual(len(queries), 6)
+        recent, page = [sql for sql in student_selects(queries) if 'LIMIT' in sql]
+        self.assertEqual(selected_columns(page), set(LIST_FIELDS) | {'created_at'})
+        self.assertEqual(selected_columns(recent), set(RECENT_FIELDS))
+
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(reverse('student_list'), {'pagination': 'keyset', 'sort': 'gpa'})
+        self.assertIsNotNone(response.context['keyset_page'].next_cursor)
+        # session, user, page (stats and recent activity are cached)
+        self.assertEqual(len(queries), 3)
+        self.assertEqual(selected_columns(student_selects(queries)[0]), set(LIST_FIELDS))
+
+    def test_print_and_export_read_their_columns(self):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(reverse('print_student_list'))
+            b''.join(response.streaming_content)
+        rows = [sql for sql in student_selects(queries) if 'GROUP BY' not in sql]
+        self.assertEqual([selected_columns(sql) for sql in rows], [set(PRINT_FIELDS)])
+
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(reverse('export_csv'))
+            b''.join(response.streaming_content)
+        self.assertEqual([selected_columns(sql) for sql in student_selects(queries)], [{name for name, _ in EXPORT_COLUMNS}])
+
+
+class PrintTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        User.objects.create_user('admin', password='pass')
+        self.client.login(username='admin', password='pass')
+        Student.objects.bulk_create([
+            Student(first_name='S', last_name=f'Last{i:03d}', email=f's{i}@example.com', gpa='3.60', address='Long address')
+            for i in range(60)
+        ])
+
+    def test_html_streams_only_printed_columns(self):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(reverse('print_student_list'))
+            html = b''.join(response.streaming_content).decode('utf-8')
+        self.assertEqual(html.count('<tr>'), 61)
+        self.assertIn('S Last059', html)
+        self.assertIn('Excellent', html)
+        self.assertLess(html.index('Last000'), html.index('Last059'))
+        student_queries = [q['sql'] for q in queries.captured_queries if 'students_student' in q['sql']]
+        self.assertTrue(student_queries)
+        self.assertFalse(any('address' in sql for sql in student_queries))
+
+    def test_pdf_is_paginated(self):
+        response = self.client.get(reverse('print_student_list_pdf'))
+        self.assertEqual(response['Content-Type'], 'application/pdf')
+        pdf = response.content
+        self.assertTrue(pdf.startswith(b'%PDF-1.4') and pdf.rstrip().endswith(b'%%EOF'))
+        self.assertIn(b'/Count 2', pdf)
+        text = pdf_text_streams(pdf)
+        self.assertIn(b'(S Last059)', text)
+        self.assertIn(b'Page 2 of 2', text)
+
+
+@skipUnless(find_spec('numpy'), 'NumPy is not installed')
+@override_settings(STUDENT_SNAPSHOT_ENABLED=True)
+class SnapshotTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        snapshot._snapshot = None
+        self.addCleanup(setattr, snapshot, '_snapshot', None)
+        gpas = ['3.50', '3.49', '3.00', '2.99', '2.15', '2.00', '1.99', '0.00']
+        Student.objects.bulk_create([
+            Student(first_name=f'F{i}', last_name=['lee', 'Kim', 'Lee', 'Ábel'][i % 4], email=f's{i}@example.com', gpa=gpa,
+                    phone='555-0100' if i % 2 else None, enrollment_date=date(2020, 1, i + 1),
+                    date_of_birth=date(2000, 1, 1) if i % 3 else None)
+            for i, gpa in enumerate(gpas)
+        ])
+
+    def test_matches_the_database(self):
+        current = snapshot.get_snapshot()
+        filters = [
+            {}, {'min_gpa': '2.15'}, {'max_gpa': '2.15'}, {'min_gpa': '2.1', 'max_gpa': '3.495'},
+            {'performance': 'Good'}, {'performance': 'needs_improvement', 'min_gpa': '1'},
+        ]
+        for params in filters:
+            with self.subTest(**params):
+                self.assertEqual(len(current.select(**params)), filter_students(Student.objects.all(), **params).count())
+        self.assertEqual(current.stats(), get_stats())
+        self.assertEqual(current.stats(current.select(performance='poor'))['avg_gpa'], Decimal('1.00'))
+        self.assertEqual(current.percentiles([0, 50, 100]), [Decimal('0.00'), Decimal('2.15'), Decimal('3.50')])
+        self.assertEqual(current.percentiles([50], current.select(min_gpa='5')), [None])
+
+        fields = ['id', 'first_name', 'email', 'phone', 'gpa', 'performance_level', 'enrollment_date', 'date_of_birth']
+        by_gpa = current.order(current.select(), '-gpa')
+        self.assertEqual(list(current.rows(by_gpa, fields)), list(Student.objects.order_by('-gpa').values_list(*fields)))
+        names = [name for name, in current.rows(current.order(current.select(), 'last_name'), ['last_name'])]
+        self.assertEqual(names, ['Kim', 'Kim', 'lee', 'Lee', 'lee', 'Lee', 'Ábel', 'Ábel'])
+        with self.assertRaises(ValueError):
+            current.order(current.select(), 'address')
+        with self.assertRaises(ValueError):
+            current.select(min_gpa='high')
+
+    def test_benchmark_tops_up_a_kept_dataset(self):
+        for _ in range(2):
+            out = io.StringIO()
+            call_command('benchmark_snapshot', students=10, repeat=1, keep=True, stdout=out)
+            self.assertEqual(Student.objects.count(), 18)
+        self.assertIn('Added 0, reusing 10', out.getvalue())
+        self.assertIn('percentiles', out.getvalue())
+
+    def test_sync_and_async_list_count_from_snapshot(self):
+        User.objects.create_user('admin', password='pass')
+        self.client.login(username='admin', password='pass')
+        self.addCleanup(reload_urlconf)
+        select = snapshot.StudentSnapshot.select
+        for async_enabled in (False, True):
+            with self.subTest(async_enabled=async_enabled), override_settings(STUDENT_ASYNC_VIEWS=async_enabled):
+                reload_urlconf()
+                view = resolve(reverse('student_list')).func.__wrapped__
+                self.assertIs(view, (async_views.student_list if async_enabled else views.student_list).__wrapped__)
+                with mock.patch.object(snapshot.StudentSnapshot, 'select', autospec=True, side_effect=select) as spy:
+                    response = self.client.get(reverse('student_list'), {'min_gpa': '2.15'})
+                    self.assertEqual(response.context['page_obj'].paginator.count, 5)
+                    response = self.client.get(reverse('student_list'), {'min_gpa': '2.15', 'pagination': 'keyset'})
+                    self.assertEqual(response.context['total_count'], 5)
+                self.assertEqual(spy.call_count, 2)
+
+    def test_reloads_after_changes(self):
+        current = snapshot.get_snapshot()
+        with self.assertNumQueries(0):
+            self.assertIs(snapshot.get_snapshot(), current)
+        with self.captureOnCommitCallbacks(execute=True):
+            Student.objects.create(first_name='Ann', last_name='Zed', email='ann@example.com', gpa='4.00')
+        reloaded = snapshot.get_snapshot()
+        self.assertEqual(len(reloaded), 9)
+        self.assertLess(reloaded.nbytes / len(reloaded), 100)
+
+    def test_views_use_the_snapshot(self):
+        self.client.force_login(User.objects.create_user('admin'))
+        snapshot.get_snapshot()
+        get_stats()
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(reverse('print_student_list'))
+            html = b''.join(response.streaming_content).decode('utf-8')
+        self.assertEqual(html.count('<tr>'), 9)
+        self.assertLess(html.index('F1 Kim'), html.index('F0 lee'))
+        self.assertFalse([q for q in queries.captured_queries if 'students_student' in q['sql']])
+
+        response = self.client.get(reverse('student_list'), {'min_gpa': '2.15', 'max_gpa': '3.49'})
+        self.assertEqual(response.context['page_obj'].paginator.count, 4)
+        response = self.client.get(reverse('api_students'), {'performance': 'needs_improvement'})
+        self.assertEqual(response.json()['count'], 5)
+
+
+@override_settings(STUDENT_CHANGES_SETTLE_SECONDS=0, STUDENT_ROLLUP_THREAD=False)
+class RollupTests(TestCase):
+    def setUp(self):
+        self.ann = Student.objects.create(first_name='Ann', last_name='Lee', email='ann@example.com', gpa='3.50',
+                                          enrollment_date=date(2020, 9, 15), date_of_birth=date(2000, 5, 1))
+        self.bob = Student.objects.create(first_name='Bob', last_name='Ray', email='bob@example.com', gpa='2.50',
+                                          enrollment_date=date(2020, 9, 1))
+        self.cat = Student.objects.create(first_name='Cat', last_name='Fox', email='cat@example.com', gpa='3.00',
+                                          enrollment_date=date(2021, 1, 10), date_of_birth=date(1990, 1, 1))
+
+    def rollups(self):
+        return sorted(StudentRollup.objects.values_list('dimension', 'bucket', 'students', 'gpa_sum'))
+
+    def test_incremental_refresh_matches_rebuild(self):
+        self.assertEqual(refresh_rollups(), 3)
+        trend = enrollment_trend()
+        self.assertEqual(trend['labels'], ['2020-09', '2020-10', '2020-11', '2020-12', '2021-01'])
+        self.assertEqual(trend['students'], [2, 0, 0, 0, 1])
+        self.assertEqual(trend['avg_gpa'], [Decimal('3.00'), None, None, None, Decimal('3.00')])
+
+        self.bob.enrollment_date = date(2021, 1, 5)
+        self.bob.save()
+        self.cat.delete()
+        Student.objects.create(first_name='Dan', last_name='Roe', email='dan@example.com', gpa='2.00',
+                               enrollment_date=date(2019, 12, 1), date_of_birth=date(2008, 11, 30))
+        self.client.force_login(User.objects.create_user('admin'))
+        self.client.post(reverse('bulk_edit'), {'student_ids': [self.ann.id], 'gpa_action': 'set', 'gpa': '4.00', 'apply': '1'})
+        self.assertEqual(refresh_rollups(), 4)
+        self.assertEqual(refresh_rollups(), 0)
+        incremental = self.rollups()
+        rebuild_rollups()
+        self.assertEqual(incremental, self.rollups())
+        self.assertEqual(enrollment_trend('2020-01', '2021-12')['students'][-4:], [0, 0, 0, 1])
+
+        ages = age_distribution(today=date(2026, 10, 18))
+        counts = dict(zip(ages['labels'], ages['students']))
+        self.assertEqual((counts['Under 18'], counts['24-26'], counts['31+'], counts['Unknown']), (1, 1, 0, 1))
+
+    def test_endpoints_read_only_the_rollups(self):
+        refresh_rollups()
+        self.client.force_login(User.objects.create_user('admin'))
+        with CaptureQueriesContext(connection) as queries:
+            for name in ['enrollment_trend_data', 'cohort_gpa_data', 'age_distribution_data']:
+                self.assertEqual(self.client.get(reverse(name)).status_code, 200)
+        self.assertFalse([q for q in queries if '"students_student"' in q['sql']])
+        cohorts = self.client.get(reverse('cohort_gpa_data')).json()
+        self.assertEqual((cohorts['labels'], cohorts['students'], cohorts['avg_gpa']), (['2020', '2021'], [2, 1], ['3.00', '3.00']))
+        self.assertEqual(self.client.get(reverse('enrollment_trend_data'), {'from': '2020'}).status_code, 400)
+
+
+@override_settings(STUDENT_READ_REPLICAS=['replica'])
+class ReplicaRoutingTests(TestCase):
+    def setUp(self):
+        self.addCleanup(replicas._down_until.clear)
+        self.factory = RequestFactory()
+
+    def test_routes_student_reads_of_wrapped_views(self):
+        @replicas.read_replica()
+        def view(request):
+            return JsonResponse({
+                'student': Student.objects.all().db,
+                'user': User.objects.all().db,
+                'pinned': replicas.pin_database(Student.objects.all()).db,
+            })
+
+        @replicas.read_replica()
+        async def async_view(request):
+            return HttpResponse(Student.objects.all().db)
+
+        with mock.patch.object(replicas, 'is_healthy', return_value=True):
+            data = json.loads(view(self.factory.get('/')).content)
+            self.assertEqual(data, {'student': 'replica', 'user': 'default', 'pinned': 'replica'})
+            self.assertEqual(async_to_sync(async_view)(self.factory.get('/')).content, b'replica')
+            self.assertEqual(json.loads(view(self.factory.post('/')).content)['student'], 'default')
+            pinned = self.factory.get('/')
+            pinned.COOKIES[replicas.PIN_COOKIE] = '1'
+            self.assertEqual(json.loads(view(pinned).content)['student'], 'default')
+        self.assertEqual(Student.objects.all().db, 'default')
+
+    def test_skips_replica_that_fails_to_connect(self):
+        broken = mock.Mock()
+        broken.ensure_connection.side_effect = OperationalError('down')
+        with mock.patch.object(replicas, 'connections', {'replica': broken}), self.assertLogs('students.replicas', 'WARNING'):
+            self.assertIsNone(replicas.choose_replica(self.factory.get('/')))
+            self.assertIsNone(replicas.choose_replica(self.factory.get('/')))
+        self.assertEqual(broken.ensure_connection.call_count, 1)
+
+    def test_pins_session_to_primary_after_writes(self):
+        User.objects.create_user('admin', password='pass')
+        self.client.login(username='admin', password='pass')
+        student = Student.objects.create(first_name='Ann', last_name='Lee', email='ann@example.com', gpa='3.00')
+        with mock.patch.object(replicas, 'is_healthy', return_value=False):
+            self.assertNotIn(replicas.PIN_COOKIE, self.client.get(reverse('student_list')).cookies)
+            response = self.client.post(reverse('bulk_export'), {'student_ids': [student.id]})
+            self.assertNotIn(replicas.PIN_COOKIE, response.cookies)
+            response = self.client.post(reverse('student_update', args=[student.id]), {})
+            self.assertEqual(response.cookies[replicas.PIN_COOKIE]['max-age'], replicas.REPLICA_PIN_SECONDS)
+
+
+class AsyncViewTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.addCleanup(cache.clear)
+        self.addCleanup(reload_urlconf)
+        self.enterContext(override_settings(STUDENT_ASYNC_VIEWS=True))
+        reload_urlconf()
+        self.user = User.objects.create_user('admin', password='pass')
+        self.ann = Student.objects.create(first_name='Ann', last_name='Lee', email='ann@example.com', gpa='3.60')
+        self.bob = Student.objects.create(first_name='Bob', last_name='Ray', email='bob@example.com', gpa='2.10')
+
+    async def test_list_detail_and_chart_data(self):
+        self.assertIs(resolve(reverse('student_list')).func.__wrapped__, async_views.student_list.__wrapped__)
+        response = await self.async_client.get(reverse('student_list'))
+        self.assertEqual(response.status_code, 302)
+
+        await self.async_client.aforce_login(self.user)
+        response = await self.async_client.get(reverse('student_list'), {'performance': 'excellent'})
+        self.assertEqual([s.email for s in response.context['students']], ['ann@example.com'])
+        self.assertEqual(response.context['page_obj'].paginator.count, 1)
+        self.assertEqual(response.context['stats']['total'], 2)
+
+        response = await self.async_client.get(reverse('student_list'), {'pagination': 'keyset', 'q': 'bob'})
+        self.assertEqual([s.email for s in response.context['keyset_page']], ['bob@example.com'])
+        self.assertEqual(response.context['total_count'], 1)
+
+        response = await self.async_client.get(reverse('student_detail', args=[self.ann.id]))
+        self.assertContains(response, 'ann@example.com')
+        response = await self.async_client.get(reverse('student_detail', args=[self.bob.id + 100]))
+        self.assertEqual(response.status_code, 404)
+
+        response = await self.async_client.get(reverse('chart_data'))
+        self.assertEqual(json.loads(response.content), {'labels': ['Excellent', 'Good', 'Average', 'Poor'], 'values': [1, 0, 1, 0]})
+
+    async def test_exports_stream_asynchronously_over_asgi(self):
+        await self.async_client.aforce_login(self.user)
+        response = await self.async_client.get(reverse('export_csv'), {'gzip': '1'})
+        self.assertTrue(response.is_async)
+        content = gzip.decompress(b''.join([chunk async for chunk in response.streaming_content])).decode('utf-8')
+        self.assertEqual(len(content.splitlines()), 3)
+
+        response = await self.async_client.post(reverse('bulk_export'), {'student_ids': [self.bob.id]})
+        lines = b''.join([chunk async for chunk in response.streaming_content]).decode('utf-8').splitlines()
+        self.assertEqual(lines, ['ID,First Name,Last Name,Email,Phone,GPA', f'{self.bob.id},Bob,Ray,bob@example.com,,2.10'])
+
+        response = await self.async_client.post(reverse('bulk_export'), {'student_ids': [self.bob.id], 'gzip': '1'})
+        content = gzip.decompress(b''.join([chunk async for chunk in response.streaming_content])).decode('utf-8')
+        self.assertIn('bob@example.com', content)
+
+    def test_async_views_serve_wsgi_requests_too(self):
+        self.client.force_login(self.user)
+        response = self.client.get(reverse('export_csv'))
+        self.assertFalse(response.is_async)
+        self.assertEqual(len(b''.join(response.streaming_content).splitlines()), 3)
+        response = self.client.get(reverse('student_list'))
+        self.assertEqual(len(response.context['students']), 2)
+
+
+class ASGIBenchmarkTests(TransactionTestCase):
+    def test_asgi_driver_serves_async_views(self):
+        output = os.path.join(tempfile.mkdtemp(), 'routes.json')
+        self.addCleanup(shutil.rmtree, os.path.dirname(output))
+        call_command(
+            'benchmark_routes', students='20', requests=4, driver=['asgi'],
+            scenario=['list', 'detail', 'chart_data', 'export'], output=output, stdout=io.StringIO(),
+        )
+        with open(output) as f:
+            report = json.load(f)
+        self.assertEqual(
+            sorted(r['key'] for r in report['results']),
+            sorted(f'asgi:{s}' for s in ('list', 'detail', 'chart_data', 'export')),
+        )
+        self.assertEqual([r['key'] for r in report['results'] if r['errors'] or r['requests'] != 4], [])
+        self.assertEqual(resolve(reverse('student_list')).func.__wrapped__.__module__, 'students.views')
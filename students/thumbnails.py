@@ -0,0 +1,106 @@
+"""
+Profile picture derivatives.
+
+Every uploaded profile picture gets square, fixed-size JPEG derivatives
+(see THUMBNAIL_SIZES) named after a hash of their content, so they can be
+served with year-long cache headers. They are generated after the save
+commits, in a background thread unless STUDENT_THUMBNAILS_ASYNC is off,
+and removed along with the original when the picture is replaced or the
+student deleted. Until they exist templates fall back to the original.
+"""
+import hashlib
+import io
+import logging
+import os
+import threading
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.db import connection, transaction
+from django.urls import reverse
+
+from .caching import bump_versions
+from .models import Student
+
+logger = logging.getLogger(__name__)
+
+THUMBNAIL_DIR = 'student_thumbs'
+# Rendered at twice the CSS size for high-density screens and print.
+THUMBNAIL_SIZES = {
+    'avatar': 128,
+    'print': 300,
+    'detail': 400,
+}
+THUMBNAIL_QUALITY = 85
+THUMBNAIL_MAX_AGE = 365 * 24 * 60 * 60
+
+
+def thumbnail_url(name):
+    return reverse('student_thumbnail', args=[os.path.basename(name)])
+
+
+def render_thumbnail(image, size):
+    from PIL import ImageOps
+
+    thumb = ImageOps.fit(image, (size, size))
+    if thumb.mode != 'RGB':
+        thumb = thumb.convert('RGB')
+    output = io.BytesIO()
+    thumb.save(output, format='JPEG', quality=THUMBNAIL_QUALITY, optimize=True, progressive=True)
+    return output.getvalue()
+
+
+def generate_thumbnails(student_id, picture_name):
+    from PIL import Image, ImageOps
+
+    with default_storage.open(picture_name, 'rb') as f:
+        image = ImageOps.exif_transpose(Image.open(f))
+        image.load()
+
+    thumbnails = {}
+    for label, size in THUMBNAIL_SIZES.items():
+        content = render_thumbnail(image, size)
+        digest = hashlib.sha256(content).hexdigest()[:16]
+        name = f'{THUMBNAIL_DIR}/{student_id}-{label}-{digest}.jpg'
+        if not default_storage.exists(name):
+            name = default_storage.save(name, ContentFile(content))
+        thumbnails[label] = name
+
+    # Only attach them if the picture wasn't replaced while we were working.
+    updated = Student.objects.filter(id=student_id, profile_picture=picture_name).update(profile_thumbnails=thumbnails)
+    if updated:
+        bump_versions([student_id])
+    else:
+        delete_files(thumbnails.values())
+    return thumbnails
+
+
+def delete_files(names):
+    for name in names:
+        if name and default_storage.exists(name):
+            default_storage.delete(name)
+
+
+def run_in_background(student_id, picture_name):
+    try:
+        generate_thumbnails(student_id, picture_name)
+    except Exception:
+        logger.exception('Could not generate thumbnails for student %s', student_id)
+    finally:
+        connection.close()
+
+
+def schedule_thumbnails(student_id, picture_name):
+    def start():
+        if getattr(settings, 'STUDENT_THUMBNAILS_ASYNC', True):
+            threading.Thread(target=run_in_background, args=(student_id, picture_name), daemon=True).start()
+        else:
+            generate_thumbnails(student_id, picture_name)
+    transaction.on_commit(start)
+
+
+def schedule_cleanup(names):
+    names = [name for name in names if name]
+    if names:
+        transaction.on_commit(lambda: delete_files(names))
@@ -1,6 +1,10 @@
 from django.urls import path
+from django.conf import settings
 from django.contrib.auth import views as auth_views
-from . import views
+from . import api, async_views, views
+
+# The read-heavy views have native async versions for ASGI deployments
+reads = async_views if getattr(settings, 'STUDENT_ASYNC_VIEWS', False) else views
 
 urlpatterns = [
     # Auth Routes
@@ -9,27 +13,44 @@ urlpatterns = [
     path('register/', views.register, name='register'),
 
     # App Routes
-    path('', views.student_list, name='student_list'),
+    path('', reads.student_list, name='student_list'),
     path('new/', views.student_create, name='student_create'),
     path('edit/<int:id>/', views.student_update, name='student_update'),
     path('delete/<int:id>/', views.student_delete, name='student_delete'),
-    path('detail/<int:id>/', views.student_detail, name='student_detail'),
+    path('detail/<int:id>/', reads.student_detail, name='student_detail'),
+    path('thumbnails/<str:name>', views.student_thumbnail, name='student_thumbnail'),
     
     # Export/Import
-    path('export/', views.export_students_csv, name='export_csv'),
+    path('export/', reads.export_students_csv, name='export_csv'),
     path('import/', views.import_students_csv, name='import_csv'),
+    path('import/report/', views.import_error_report, name='import_error_report'),
+    path('export/background/', views.export_job, name='export_job'),
+    path('jobs/<int:id>/', views.job_detail, name='job_detail'),
+    path('jobs/<int:id>/download/', views.job_download, name='job_download'),
     
     # Bulk Operations
     path('bulk-delete/', views.bulk_delete, name='bulk_delete'),
-    path('bulk-export/', views.bulk_export, name='bulk_export'),
+    path('bulk-edit/', views.bulk_edit, name='bulk_edit'),
+    path('bulk-export/', reads.bulk_export, name='bulk_export'),
+    path('bulk-email/', views.bulk_email, name='bulk_email'),
     
     # Email
     path('send-email/<int:id>/', views.send_email_to_student, name='send_email'),
+    path('email-batches/<int:id>/', views.email_batch_detail, name='email_batch_detail'),
     
     # API
-    path('api/chart-data/', views.chart_data, name='chart_data'),
+    path('api/chart-data/', reads.chart_data, name='chart_data'),
+    path('api/chart-data/enrollments/', views.enrollment_trend_data, name='enrollment_trend_data'),
+    path('api/chart-data/cohorts/', views.cohort_gpa_data, name='cohort_gpa_data'),
+    path('api/chart-data/ages/', views.age_distribution_data, name='age_distribution_data'),
+    path('api/v1/students/', api.student_collection, name='api_students'),
+    path('api/v1/students/bulk/', api.student_bulk, name='api_students_bulk'),
+    path('api/v1/students/changes/', api.student_changes, name='api_student_changes'),
+    path('api/v1/students/<int:id>/', api.student_resource, name='api_student'),
+    path('metrics/', views.request_metrics, name='request_metrics'),
     
     # Print
     path('print/', views.print_student_list, name='print_student_list'),
+    path('print/pdf/', views.print_student_list_pdf, name='print_student_list_pdf'),
     path('print/<int:id>/', views.print_student_detail, name='print_student_detail'),
 ]
\ No newline at end of file
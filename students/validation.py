@@ -0,0 +1,158 @@
+"""
+Validation rules for Student records, shared by StudentForm, the CSV
+import and the API.
+
+clean_student() checks a record field by field with cleaners built once
+per process from the model's field definitions: required fields, text
+lengths, email syntax, dates (any DATE_INPUT_FORMATS) and the GPA scale
+at two decimal places. validate_students() runs it over a whole batch
+and checks every email in the batch in one query, where
+ModelForm.validate_unique() makes one per record. Errors are returned
+per field in the shape of ErrorDict.get_json_data():
+``{field: [{'message': ..., 'code': ...}]}``.
+
+Blank values clean to None, except that fields with a model default
+(enrollment_date) are left out of the data, so the default or the
+current value is kept.
+"""
+import functools
+from decimal import Decimal, InvalidOperation
+
+from django import forms
+from django.core.exceptions import ValidationError
+from django.core.validators import MaxLengthValidator, validate_email
+
+from .models import Student
+
+STUDENT_FIELDS = ['first_name', 'last_name', 'email', 'phone', 'address', 'gpa', 'date_of_birth', 'enrollment_date']
+REQUIRED_FIELDS = ['first_name', 'last_name', 'email', 'gpa']
+TEXT_FIELDS = ['first_name', 'last_name', 'email', 'phone', 'address']
+DATE_FIELDS = ['date_of_birth', 'enrollment_date']
+GPA_MIN = Decimal('0.00')
+GPA_MAX = Decimal('4.00')
+GPA_PLACES = Decimal('0.01')
+REQUIRED_MESSAGE = 'This field is required.'
+UNIQUE_EMAIL_MESSAGE = 'A student with this email already exists.'
+DELETED_EMAIL_MESSAGE = 'This email belongs to a deleted student that has not been purged yet.'
+DUPLICATE_EMAIL_MESSAGE = 'This email appears more than once in the batch.'
+
+
+def error(message, code):
+    return {'message': message, 'code': code}
+
+
+def error_messages(errors):
+    # Flat 'field: message' strings, for reports without per-field slots.
+    return [f'{name}: {e["message"]}' for name, field_errors in errors.items() for e in field_errors]
+
+
+def text_cleaner(validators):
+    def clean(value):
+        value = '' if value is None else str(value).strip()
+        if value:
+            for validator in validators:
+                validator(value)
+        return value
+    return clean
+
+
+def clean_gpa(value):
+    value = '' if value is None else str(value).strip()
+    if not value:
+        return ''
+    try:
+        gpa = Decimal(value)
+    except InvalidOperation:
+        raise ValidationError('Enter a number.', code='invalid')
+    if not gpa.is_finite():
+        raise ValidationError('Enter a number.', code='invalid')
+    if not GPA_MIN <= gpa <= GPA_MAX:
+        raise ValidationError(f'Ensure this value is between {GPA_MIN} and {GPA_MAX}.', code='out_of_range')
+    if gpa != gpa.quantize(GPA_PLACES):
+        raise ValidationError('Ensure that there are no more than 2 decimal places.', code='max_decimal_places')
+    return gpa.quantize(GPA_PLACES)
+
+
+@functools.cache
+def field_cleaners():
+    # name -> function(value) returning the cleaned value ('' when blank)
+    # or raising ValidationError. Built on first use and kept.
+    cleaners = {}
+    for name in TEXT_FIELDS:
+        max_length = Student._meta.get_field(name).max_length
+        validators = [MaxLengthValidator(max_length)] if max_length else []
+        if name == 'email':
+            validators.append(validate_email)
+        cleaners[name] = text_cleaner(validators)
+    cleaners['gpa'] = clean_gpa
+    for name in DATE_FIELDS:
+        cleaners[name] = forms.DateField(required=False).to_python
+    return cleaners
+
+
+@functools.cache
+def defaulted_fields():
+    return {name for name in STUDENT_FIELDS if Student._meta.get_field(name).has_default()}
+
+
+def clean_student(record, fields=STUDENT_FIELDS):
+    # Returns (data, errors) for `fields` of the record (a mapping).
+    cleaners = field_cleaners()
+    data, errors = {}, {}
+    for name in fields:
+        try:
+            value = cleaners[name](record.get(name))
+        except ValidationError as e:
+            errors[name] = [error(message, e.code or 'invalid') for message in e.messages]
+            continue
+        if value in ('', None):
+            if name in REQUIRED_FIELDS:
+                errors[name] = [error(REQUIRED_MESSAGE, 'required')]
+            elif name not in defaulted_fields():
+                data[name] = None
+            continue
+        data[name] = value
+    return data, errors
+
+
+def taken_emails(emails):
+    # Lower-cased email -> (id, deleted) of the student holding it, in one
+    # query. Soft-deleted students keep their email until they are purged.
+    if not emails:
+        return {}
+    rows = Student.all_objects.filter(email__in=emails).order_by().values_list('email', 'id', 'deleted_at')
+    return {email.lower(): (student_id, deleted_at is not None) for email, student_id, deleted_at in rows}
+
+
+def email_error(taken, email, instance=None):
+    # The error for `email` given taken_emails(), or None if it is free.
+    owner = taken.get(email.lower())
+    if owner is None or (instance is not None and owner[0] == instance.pk):
+        return None
+    return error(DELETED_EMAIL_MESSAGE if owner[1] else UNIQUE_EMAIL_MESSAGE, 'unique')
+
+
+def validate_students(records, instances=None, seen_emails=None, check_database=True):
+    # Returns [(data, errors)] for the records, each validated in full.
+    # `instances` holds the student each record updates (None to create).
+    # Emails repeated in the batch, or in `seen_emails` (lower-cased,
+    # updated in place across batches), are rejected; with check_database,
+    # so are emails held by other students.
+    instances = instances or [None] * len(records)
+    seen_emails = set() if seen_emails is None else seen_emails
+    results = [clean_student(record) for record in records]
+    for data, errors in results:
+        if errors:
+            continue
+        key = data['email'].lower()
+        if key in seen_emails:
+            errors['email'] = [error(DUPLICATE_EMAIL_MESSAGE, 'duplicate')]
+        seen_emails.add(key)
+
+    if check_database:
+        taken = taken_emails([data['email'] for data, errors in results if not errors])
+        for (data, errors), instance in zip(results, instances):
+            problem = None if errors else email_error(taken, data['email'], instance)
+            if problem:
+                errors['email'] = [problem]
+    return results
@@ -1,18 +1,36 @@
 from django.shortcuts import render, redirect, get_object_or_404
+from django.template.loader import render_to_string
 from django.contrib import messages
-from django.db.models import Q, Avg, Count
 from django.core.paginator import Paginator
-from .models import Student
-from .forms import StudentForm, ImportCSVForm, FilterForm
+from .models import Student, EmailBatch, QueuedEmail, Job, PERFORMANCE_CHOICES, PERFORMANCE_LEVELS
+from .forms import StudentForm, ImportCSVForm, FilterForm, BulkEditForm
 from django.contrib.auth.decorators import login_required
 from django.contrib.auth.forms import UserCreationForm
 from django.contrib.auth import login
-from django.http import HttpResponse, JsonResponse
+from django.http import HttpResponse, JsonResponse, FileResponse, Http404
+from django.utils.cache import patch_cache_control
+from django.urls import reverse
 from django.core.mail import send_mail
+from django.core.files.storage import default_storage
 from django.conf import settings
-import csv
-import io
+from .jobs import enqueue_export, enqueue_import, job_status, download_name
+from .stats import get_stats, stats_generation
+from .replicas import read_replica
+from .bulk import bulk_edit_students
+from .deletion import soft_delete_students
+from .rollups import age_distribution, cohort_gpa, enrollment_trend, start_refresher
+from .filters import filter_students
+from .snapshot import filtered_count, snapshot_enabled
+from .caching import cached_fragment, cache_stats
+from .printing import iter_print_rows, render_pdf, stream_print_html
+from .thumbnails import THUMBNAIL_DIR, THUMBNAIL_MAX_AGE
+from .instrumentation import METRICS_BUFFER_SIZE, get_records, summarize
+from .mailer import enqueue_bulk_email, batch_status
+from .pagination import clean_sort, clean_per_page, cached_count, keyset_page, DEFAULT_SORT, DEFAULT_PER_PAGE
+from .exporters import stream_students_csv, EXPORT_COLUMNS, BULK_EXPORT_COLUMNS
+import re
 from datetime import datetime, timedelta
+from urllib.parse import urlencode
 
 def register(request):
     if request.method == 'POST':
@@ -29,73 +47,90 @@ def register(request):
     return render(request, 'register.html', {'form': form})
 
 # READ with sorting, filtering, and pagination
-@login_required
-def student_list(request):
+def list_params(request):
+    # Cleaned list options, shared with async_views.student_list
     query = request.GET.get('q', '')
-    sort_by = request.GET.get('sort', '-created_at')
-    min_gpa = request.GET.get('min_gpa', '')
-    max_gpa = request.GET.get('max_gpa', '')
-    performance = request.GET.get('performance', '')
-    page_number = request.GET.get('page', 1)
-    per_page = request.GET.get('per_page', '10')
-    
-    students = Student.objects.all()
-    
-    # Search filter
-    if query:
-        students = students.filter(
-            Q(first_name__icontains=query) | 
-            Q(last_name__icontains=query) |
-            Q(email__icontains=query)
-        )
-    
-    # GPA range filter
-    if min_gpa:
-        students = students.filter(gpa__gte=float(min_gpa))
-    if max_gpa:
-        students = students.filter(gpa__lte=float(max_gpa))
-    
-    # Performance filter
-    if performance == 'excellent':
-        students = students.filter(gpa__gte=3.5)
-    elif performance == 'good':
-        students = students.filter(gpa__gte=3.0, gpa__lt=3.5)
-    elif performance == 'needs_improvement':
-        students = students.filter(gpa__lt=3.0)
-    
-    # Apply sorting
-    students = students.order_by(sort_by)
-    
-    # Calculate statistics
-    stats = Student.objects.aggregate(
-        total=Count('id'),
-        avg_gpa=Avg('gpa'),
-        excellent=Count('id', filter=Q(gpa__gte=3.5)),
-        good=Count('id', filter=Q(gpa__gte=3.0, gpa__lt=3.5)),
-        average=Count('id', filter=Q(gpa__gte=2.0, gpa__lt=3.0)),
-        poor=Count('id', filter=Q(gpa__lt=2.0))
+    return {
+        'query': query,
+        'sort_by': clean_sort(request.GET.get('sort', DEFAULT_SORT)),
+        # Searches are ranked by relevance unless the user picked a sort column
+        'by_relevance': bool(query) and 'sort' not in request.GET,
+        'min_gpa': request.GET.get('min_gpa', ''),
+        'max_gpa': request.GET.get('max_gpa', ''),
+        'performance': request.GET.get('performance', ''),
+        'page_number': request.GET.get('page', 1),
+        'per_page': clean_per_page(request.GET.get('per_page', DEFAULT_PER_PAGE)),
+        # Keyset pagination: seek past a cursor instead of COUNT + OFFSET
+        'keyset': request.GET.get('pagination') == 'keyset',
+        'cursor': request.GET.get('cursor'),
+    }
+
+def is_filtered(params):
+    return any([params['query'], params['min_gpa'], params['max_gpa'], params['performance']])
+
+def list_queryset(params):
+    students = filter_students(
+        Student.objects.for_list(params['sort_by']), params['query'], params['min_gpa'], params['max_gpa'], params['performance']
     )
-    
-    # Recent activity
-    recent_students = Student.objects.all().order_by('-created_at')[:5]
-    recently_updated = Student.objects.all().order_by('-updated_at')[:5]
-    
-    # Pagination
-    paginator = Paginator(students, int(per_page))
-    students_page = paginator.get_page(page_number)
-    
-    context = {
+    if params['keyset']:
+        return students
+    if params['by_relevance']:
+        return students.order_by('-search_rank', params['sort_by'])
+    return students.order_by(params['sort_by'])
+
+def recent_activity():
+    # Lazy: only evaluated when the cached recent activity fragment misses
+    return Student.objects.for_recent().order_by('-created_at')[:5]
+
+def list_context(params, students_page, stats, total_count):
+    keyset = params['keyset']
+    filters = {
+        'q': params['query'], 'min_gpa': params['min_gpa'], 'max_gpa': params['max_gpa'],
+        'performance': params['performance'], 'per_page': params['per_page'],
+        'pagination': 'keyset' if keyset else '',
+    }
+    # Appended to links after another parameter, so it starts with '&'
+    filter_params = '&' + urlencode({name: value for name, value in filters.items() if value})
+    return {
         'students': students_page,
-        'query': query,
-        'sort_by': sort_by,
+        'query': params['query'],
+        'sort_by': params['sort_by'],
         'stats': stats,
-        'recent_activity': recent_students,
-        'page_obj': students_page,
-        'filter_params': f"&q={query}&min_gpa={min_gpa}&max_gpa={max_gpa}&performance={performance}",
-        'sort_params': f"&sort={sort_by}",
+        'stats_generation': stats_generation(),
+        'recent_activity': recent_activity(),
+        'page_obj': None if keyset else students_page,
+        'keyset': keyset,
+        'keyset_page': students_page if keyset else None,
+        'total_count': total_count,
+        'filter_params': filter_params,
+        'sort_params': f"&sort={params['sort_by']}",
+        'performance_choices': PERFORMANCE_CHOICES,
+        'thresholds': {code: minimum for code, _, minimum in PERFORMANCE_LEVELS},
     }
+
+@login_required
+@read_replica()
+def student_list(request):
+    params = list_params(request)
+    students = list_queryset(params)
+    
+    # Calculate statistics
+    stats = get_stats()
     
-    return render(request, 'student_list.html', context)
+    filters = [params['query'], params['min_gpa'], params['max_gpa'], params['performance']]
+    if params['keyset']:
+        students_page = keyset_page(students, params['sort_by'], params['per_page'], params['cursor'])
+        total_count = filtered_count(students, *filters) if is_filtered(params) else stats['total']
+    else:
+        # Pagination
+        paginator = Paginator(students, params['per_page'])
+        if snapshot_enabled() and not params['query']:
+            # Counted from the in-memory snapshot instead of a COUNT query
+            paginator.count = filtered_count(students, *filters)
+        students_page = paginator.get_page(params['page_number'])
+        total_count = None
+    
+    return render(request, 'student_list.html', list_context(params, students_page, stats, total_count))
 
 # CREATE
 @login_required
@@ -129,31 +164,28 @@ def student_update(request, id):
 def student_delete(request, id):
     student = get_object_or_404(Student, id=id)
     if request.method == 'POST':
-        student.delete()
+        soft_delete_students(Student.objects.filter(id=student.id))
         messages.error(request, 'Student deleted successfully.')
         return redirect('student_list')
     return render(request, 'student_confirm_delete.html', {'student': student})
 
 # DETAIL VIEW
 @login_required
+@read_replica()
 def student_detail(request, id):
     student = get_object_or_404(Student, id=id)
     return render(request, 'student_detail.html', {'student': student})
 
 # EXPORT TO CSV
 @login_required
+@read_replica()
 def export_students_csv(request):
-    response = HttpResponse(content_type='text/csv')
-    response['Content-Disposition'] = 'attachment; filename="students.csv"'
-    
-    writer = csv.writer(response)
-    writer.writerow(['ID', 'First Name', 'Last Name', 'Email', 'Phone', 'GPA', 'Date of Birth', 'Enrollment Date'])
-    
-    students = Student.objects.all().values_list('id', 'first_name', 'last_name', 'email', 'phone', 'gpa', 'date_of_birth', 'enrollment_date')
-    for student in students:
-        writer.writerow(student)
-    
-    return response
+    return stream_students_csv(
+        Student.objects.order_by('id'),
+        EXPORT_COLUMNS,
+        'students.csv',
+        gzip=request.GET.get('gzip') == '1',
+    )
 
 # IMPORT FROM CSV
 @login_required
@@ -167,33 +199,24 @@ def import_students_csv(request):
                 messages.error(request, 'Please upload a CSV file.')
                 return redirect('import_csv')
             
-            decoded_file = csv_file.read().decode('utf-8')
-            io_string = io.StringIO(decoded_file)
-            reader = csv.DictReader(io_string)
-            
-            success_count = 0
-            error_count = 0
-            
-            for row in reader:
-                try:
-                    Student.objects.create(
-                        first_name=row.get('first_name', ''),
-                        last_name=row.get('last_name', ''),
-                        email=row.get('email', ''),
-                        phone=row.get('phone', ''),
-                        address=row.get('address', ''),
-                        gpa=float(row.get('gpa', 0)),
-                    )
-                    success_count += 1
-                except Exception as e:
-                    error_count += 1
-            
-            messages.success(request, f'Successfully imported {success_count} students. {error_count} errors.')
-            return redirect('student_list')
+            # The upload is imported by a background worker; the page polls its progress
+            job = enqueue_import(csv_file, form.cleaned_data['mode'], user=request.user)
+            request.session['import_job'] = job.id
+            return redirect('import_csv')
     else:
         form = ImportCSVForm()
     
-    return render(request, 'import_csv.html', {'form': form})
+    job = Job.objects.filter(id=request.session.get('import_job'), kind=Job.IMPORT).first()
+    context = {'form': form, 'job': job, 'status': job_status(job) if job else None}
+    return render(request, 'import_csv.html', context)
+
+@login_required
+def import_error_report(request):
+    job = Job.objects.filter(id=request.session.get('import_job'), kind=Job.IMPORT).first()
+    if job is None or not job.result_file or not default_storage.exists(job.result_file.name):
+        messages.error(request, 'No import error report is available.')
+        return redirect('import_csv')
+    return FileResponse(job.result_file.open('rb'), as_attachment=True, filename=download_name(job))
 
 # BULK DELETE
 @login_required
@@ -201,14 +224,51 @@ def bulk_delete(request):
     if request.method == 'POST':
         student_ids = request.POST.getlist('student_ids')
         if student_ids:
-            Student.objects.filter(id__in=student_ids).delete()
-            messages.success(request, f'Successfully deleted {len(student_ids)} students.')
+            deleted = soft_delete_students(Student.objects.filter(id__in=student_ids))
+            messages.success(request, f'Successfully deleted {deleted} students.')
         else:
             messages.error(request, 'No students selected.')
     return redirect('student_list')
 
+# BULK EDIT
+@login_required
+def bulk_edit(request):
+    # The list page posts a selection, or links here with its filters and
+    # scope=filter; the edit form posts 'apply' with the same scope.
+    data = request.POST if request.method == 'POST' else request.GET
+    scope = 'filter' if data.get('scope') == 'filter' else 'selected'
+    student_ids = data.getlist('student_ids')
+    filters = {name: data.get(name, '') for name in ['q', 'min_gpa', 'max_gpa', 'performance']}
+    if scope == 'filter':
+        try:
+            students = filter_students(
+                Student.objects.all(), filters['q'], filters['min_gpa'], filters['max_gpa'], filters['performance']
+            )
+        except ValueError:
+            messages.error(request, 'Invalid GPA filter.')
+            return redirect('student_list')
+    elif student_ids:
+        students = Student.objects.filter(id__in=student_ids)
+    else:
+        messages.error(request, 'No students selected.')
+        return redirect('student_list')
+
+    form = BulkEditForm(request.POST if 'apply' in request.POST else None)
+    if form.is_bound and form.is_valid():
+        updated = bulk_edit_students(students, form.updates())
+        messages.success(request, f'Updated {updated} students.')
+        if scope == 'filter':
+            return redirect(reverse('student_list') + '?' + urlencode({k: v for k, v in filters.items() if v}))
+        return redirect('student_list')
+
+    count = len(student_ids) if scope == 'selected' else cached_count(students)
+    return render(request, 'bulk_edit.html', {
+        'form': form, 'scope': scope, 'student_ids': student_ids, 'filters': filters, 'count': count,
+    })
+
 # BULK EXPORT
 @login_required
+@read_replica(['POST'])
 def bulk_export(request):
     if request.method == 'POST':
         student_ids = request.POST.getlist('student_ids')
@@ -216,19 +276,70 @@ def bulk_export(request):
             messages.error(request, 'No students selected.')
             return redirect('student_list')
         
-        response = HttpResponse(content_type='text/csv')
-        response['Content-Disposition'] = 'attachment; filename="selected_students.csv"'
-        
-        writer = csv.writer(response)
-        writer.writerow(['ID', 'First Name', 'Last Name', 'Email', 'Phone', 'GPA'])
-        
-        students = Student.objects.filter(id__in=student_ids).values_list('id', 'first_name', 'last_name', 'email', 'phone', 'gpa')
-        for student in students:
-            writer.writerow(student)
-        
-        return response
+        return stream_students_csv(
+            Student.objects.filter(id__in=student_ids).order_by('id'),
+            BULK_EXPORT_COLUMNS,
+            'selected_students.csv',
+            gzip=request.POST.get('gzip') == '1',
+        )
     return redirect('student_list')
 
+# BACKGROUND EXPORT
+@login_required
+def export_job(request):
+    if request.method != 'POST':
+        return redirect('student_list')
+    job = enqueue_export(user=request.user, gzip=request.POST.get('gzip') == '1')
+    return redirect('job_detail', id=job.id)
+
+@login_required
+def job_detail(request, id):
+    job = get_object_or_404(Job, id=id)
+    status = job_status(job)
+    if request.GET.get('format') == 'json':
+        return JsonResponse(status)
+    return render(request, 'job_detail.html', {'job': job, 'status': status})
+
+@login_required
+def job_download(request, id):
+    job = get_object_or_404(Job, id=id)
+    if not job.result_file or not default_storage.exists(job.result_file.name):
+        raise Http404('This job has no file to download.')
+    return FileResponse(job.result_file.open('rb'), as_attachment=True, filename=download_name(job))
+
+# BULK EMAIL
+@login_required
+def bulk_email(request):
+    if request.method != 'POST':
+        return redirect('student_list')
+    student_ids = request.POST.getlist('student_ids')
+    if not student_ids:
+        messages.error(request, 'No students selected.')
+        return redirect('student_list')
+    
+    # The list page posts only the selection; the compose form posts 'send'
+    if 'send' not in request.POST:
+        return render(request, 'bulk_email.html', {'student_ids': student_ids})
+    
+    subject = request.POST.get('subject', '')
+    message = request.POST.get('message', '')
+    if not subject or not message:
+        messages.error(request, 'Subject and message are required!')
+        return render(request, 'bulk_email.html', {'student_ids': student_ids, 'subject': subject, 'message': message})
+    
+    batch = enqueue_bulk_email(Student.objects.filter(id__in=student_ids), subject, message, user=request.user)
+    messages.success(request, f'Queued {batch.emails.count()} emails for delivery.')
+    return redirect('email_batch_detail', id=batch.id)
+
+@login_required
+def email_batch_detail(request, id):
+    batch = get_object_or_404(EmailBatch, id=id)
+    status = batch_status(batch)
+    if request.GET.get('format') == 'json':
+        return JsonResponse(status)
+    failures = batch.emails.filter(status=QueuedEmail.FAILED).order_by('id')[:50]
+    return render(request, 'email_batch.html', {'batch': batch, 'status': status, 'failures': failures})
+
 # SEND EMAIL
 @login_required
 def send_email_to_student(request, id):
@@ -264,49 +375,102 @@ def send_email_to_student(request, id):
 
 # CHART DATA API
 @login_required
+@read_replica()
 def chart_data(request):
-    stats = Student.objects.aggregate(
-        excellent=Count('id', filter=Q(gpa__gte=3.5)),
-        good=Count('id', filter=Q(gpa__gte=3.0, gpa__lt=3.5)),
-        average=Count('id', filter=Q(gpa__gte=2.0, gpa__lt=3.0)),
-        poor=Count('id', filter=Q(gpa__lt=2.0))
-    )
-    
-    data = {
-        'labels': ['Excellent', 'Good', 'Average', 'Poor'],
-        'values': [
-            stats['excellent'],
-            stats['good'],
-            stats['average'],
-            stats['poor']
-        ]
+    return JsonResponse(chart_payload(get_stats()))
+
+def chart_payload(stats):
+    return {
+        'labels': [label for _, label in PERFORMANCE_CHOICES],
+        'values': [stats[code] for code, _ in PERFORMANCE_CHOICES]
     }
-    return JsonResponse(data)
+
+# ANALYTICS API (read only from the rollup tables; see rollups.py)
+@login_required
+@read_replica()
+def enrollment_trend_data(request):
+    start_refresher()
+    start = request.GET.get('from', '')
+    end = request.GET.get('to', '')
+    if any(value and not re.fullmatch(r'\d{4}-\d{2}', value) for value in (start, end)):
+        return JsonResponse({'error': 'from and to must be months as YYYY-MM.'}, status=400)
+    return JsonResponse(enrollment_trend(start, end))
+
+@login_required
+@read_replica()
+def cohort_gpa_data(request):
+    start_refresher()
+    return JsonResponse(cohort_gpa())
+
+@login_required
+@read_replica()
+def age_distribution_data(request):
+    start_refresher()
+    return JsonResponse(age_distribution())
 
 # PRINT VIEW
 @login_required
+@read_replica()
 def print_student_list(request):
-    students = Student.objects.all().order_by('last_name')
-    stats = Student.objects.aggregate(
-        total=Count('id'),
-        avg_gpa=Avg('gpa'),
-        excellent=Count('id', filter=Q(gpa__gte=3.5)),
-        good=Count('id', filter=Q(gpa__gte=3.0, gpa__lt=3.5)),
-        average=Count('id', filter=Q(gpa__gte=2.0, gpa__lt=3.0)),
-        poor=Count('id', filter=Q(gpa__lt=2.0))
-    )
     context = {
-        'students': students,
-        'stats': stats,
+        'stats': get_stats(),
         'today': datetime.now().strftime('%B %d, %Y')
     }
-    return render(request, 'print_student_list.html', context)
+    # Rows are streamed in chunks from a values_list() iterator
+    return stream_print_html(context, request)
+
+@login_required
+@read_replica()
+def print_student_list_pdf(request):
+    today = datetime.now().strftime('%B %d, %Y')
+    # Cached until any student changes (or the date does)
+    pdf = cached_fragment(
+        'print_student_list_pdf',
+        lambda: render_pdf(iter_print_rows(), get_stats(), today),
+        vary_on=[today],
+    )
+    response = HttpResponse(pdf, content_type='application/pdf')
+    response['Content-Disposition'] = f'inline; filename="students-{datetime.now():%Y-%m-%d}.pdf"'
+    return response
+
+@login_required
+def student_thumbnail(request, name):
+    path = f'{THUMBNAIL_DIR}/{name}'
+    if not name.endswith('.jpg') or not default_storage.exists(path):
+        raise Http404('Thumbnail not found.')
+    # Names are content hashes, so a cached copy can never go stale
+    response = FileResponse(default_storage.open(path, 'rb'), content_type='image/jpeg')
+    patch_cache_control(response, private=True, max_age=THUMBNAIL_MAX_AGE, immutable=True)
+    return response
 
 @login_required
+@read_replica()
 def print_student_detail(request, id):
     student = get_object_or_404(Student, id=id)
     context = {
         'student': student,
         'today': datetime.now().strftime('%B %d, %Y')
     }
-    return render(request, 'print_student_detail.html', context)
+    page = cached_fragment(
+        'print_student_detail',
+        lambda: render_to_string('print_student_detail.html', context, request),
+        student_id=student.id,
+        vary_on=[context['today']],
+    )
+    return HttpResponse(page)
+
+# Request metrics (staff only)
+@login_required
+def request_metrics(request):
+    if not request.user.is_staff:
+        return JsonResponse({'error': 'Staff only.'}, status=403)
+    records = get_records()
+    data = {
+        'enabled': getattr(settings, 'STUDENT_METRICS_ENABLED', False),
+        'buffer_size': METRICS_BUFFER_SIZE,
+        'summary': summarize(records),
+        'fragment_cache': cache_stats(),
+    }
+    if request.GET.get('records'):
+        data['records'] = records
+    return JsonResponse(data)